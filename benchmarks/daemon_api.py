@@ -0,0 +1,106 @@
+"""
+Access checks for the daemon's HTTP API.
+
+Starts a daemon on a throwaway project and sends it the requests a web
+page could make through the browser (a text/plain cross-origin POST, a
+DNS-rebound Host), requests without the token, and download jobs that
+try to write outside downloads/. Each must be refused, and only the
+well-formed request may create a job.
+
+    python -m benchmarks.daemon_api
+"""
+
+import http.client
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+from modules.daemon import token_path
+
+_RUN_DAEMON = (
+    "import sys\n"
+    "from modules.daemon import serve\n"
+    "serve(sys.argv[1], port=0, on_ready=lambda address: print(address, flush=True))\n"
+)
+
+
+def _report(name, ok, started, detail):
+    print(f"{'PASS' if ok else 'FAIL'}  {name:<38} {time.perf_counter() - started:6.2f}s  {detail}")
+    return ok
+
+
+def _request(address, method, path, headers, body=None):
+    parts = urlsplit(address)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    project_root = tempfile.mkdtemp(prefix="demux-daemon-")
+    with open(os.path.join(project_root, "config.json"), "w") as f:
+        json.dump({"upload_dedup": False}, f)
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, "-c", _RUN_DAEMON, project_root], cwd=repo_root,
+                               stdout=subprocess.PIPE, text=True)
+    results = []
+    try:
+        address = process.stdout.readline().strip()
+        host = urlsplit(address).netloc
+        mode = stat.S_IMODE(os.stat(token_path(project_root)).st_mode)
+        with open(token_path(project_root)) as f:
+            token = f.read()
+        auth = {"Host": host, "Authorization": f"Bearer {token}"}
+        job = json.dumps({"type": "download", "url": "http://127.0.0.1:9/file.bin"})
+
+        checks = [
+            ("text/plain cross-origin POST", 403, "POST", "/jobs",
+             {"Host": host, "Origin": "http://evil.example", "Content-Type": "text/plain"}, job),
+            ("text/plain POST with the token", 403, "POST", "/jobs", dict(auth, **{"Content-Type": "text/plain"}), job),
+            ("cross-origin POST with the token", 403, "POST", "/jobs",
+             dict(auth, **{"Origin": "http://evil.example", "Content-Type": "application/json"}), job),
+            ("foreign Host (DNS rebinding)", 403, "GET", "/jobs",
+             dict(auth, Host=f"evil.example:{urlsplit(address).port}"), None),
+            ("no token", 401, "GET", "/jobs", {"Host": host}, None),
+            ("wrong token", 401, "GET", "/health", {"Host": host, "Authorization": "Bearer nope"}, None),
+            ("absolute output_path", 400, "POST", "/jobs", dict(auth, **{"Content-Type": "application/json"}),
+             json.dumps({"type": "download", "url": "http://127.0.0.1:9/x", "output_path": "/tmp/x"})),
+            ("output_path escaping downloads/", 400, "POST", "/jobs",
+             dict(auth, **{"Content-Type": "application/json"}),
+             json.dumps({"type": "download", "url": "http://127.0.0.1:9/x", "output_path": "a/../../x"})),
+            ("JSON POST with the token", 202, "POST", "/jobs",
+             dict(auth, **{"Content-Type": "application/json; charset=utf-8"}), job),
+        ]
+        started = time.perf_counter()
+        results.append(_report("token file is private", mode == 0o600, started, oct(mode)))
+        for name, expected, method, path, headers, body in checks:
+            started = time.perf_counter()
+            status, payload = _request(address, method, path, headers, body)
+            results.append(_report(name, status == expected, started, f"{status} {payload.get('error', '')}"))
+
+        started = time.perf_counter()
+        _, listing = _request(address, "GET", "/jobs", auth)
+        results.append(_report("only the accepted request made a job", len(listing["jobs"]) == 1, started,
+                               f"{len(listing['jobs'])} job(s)"))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        token_removed = not os.path.exists(token_path(project_root))
+        shutil.rmtree(project_root, ignore_errors=True)
+    results.append(_report("token file removed on exit", token_removed, time.perf_counter(), ""))
+
+    print(f"{sum(results)}/{len(results)} scenarios passed")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+"""
+Fault-injection run for the retry and circuit-breaker layer.
+
+Drives the real downloader and upload services against local stand-ins
+that reset connections, truncate bodies and answer 5xx/429, and prints
+what happened in each scenario. The Vikingfiles scenario checks that a
+rerun after a failed part resumes from the upload journal.
+
+    python -m benchmarks.faults
+
+tests/test_faults.py runs the same scenarios under pytest.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from modules import resilience
+from modules.downloader import download_file
+from modules.uploader.registry import get_service
+from modules.uploader.services import vikingfiles
+from .servers import FaultPlan, RedirectEngine, RedirectSession, origin, put_sink
+from .standin import standin
+
+CONFIG = {
+    "pixeldrain_api_key": "bench",
+    "max_retries": 4,
+    "retry_base_delay": 0.05,
+    "retry_max_delay": 5,
+    "breaker_failure_threshold": 5,
+    "breaker_cooldown": 30,
+    "upload_dedup": False,
+}
+
+
+def _report(name, ok, started, detail):
+    print(f"{'PASS' if ok else 'FAIL'}  {name:<38} {time.perf_counter() - started:6.2f}s  {detail}")
+    return ok
+
+
+def _download_scenario(project_root, data, faults, name):
+    plan = FaultPlan(faults)
+    started = time.perf_counter()
+    with origin(data, plan) as server:
+        path = download_file(project_root, f"{server.url}/{name}.bin", connections=1)
+    ok = path is not None and hashlib.sha256(open(path, "rb").read()).digest() == hashlib.sha256(data).digest()
+    return _report(f"download, faults {faults}", ok, started, f"{plan.requests} requests")
+
+
+def _upload_scenario(file_path, faults, then="ok", expect_success=True, label=None):
+    plan = FaultPlan(faults, then)
+    received = []
+    service = get_service("Pixeldrain")
+    started = time.perf_counter()
+    with put_sink(plan, received) as server:
+        service._session = RedirectSession(server.url)
+        success, message = service.upload_file(file_path, CONFIG)
+        service.close()
+    ok = success == expect_success
+    if expect_success:
+        ok = ok and received and received[-1][2] == os.path.getsize(file_path)
+    return _report(label or f"upload, faults {faults}", ok, started, f"{plan.requests} requests; {message[:60]}")
+
+
+def _async_upload_scenario(file_path, faults, expect_success=True, label=None):
+    """An upload on the async engine: 5xx/429 answers are retried, anything else comes back as (False, message)"""
+    plan = FaultPlan(faults)
+    started = time.perf_counter()
+    with standin(faults=plan) as server:
+        engine = RedirectEngine(server.url)
+        try:
+            success, message = get_service("Catbox").run_async(file_path, CONFIG, engine=engine)
+        except Exception as e:
+            success, message = None, f"raised {e!r}"
+        finally:
+            engine.close()
+    return _report(label or f"async upload, faults {faults}", success is expect_success, started,
+                   f"{plan.requests} requests; {message[:60]}")
+
+
+def _journal_resume_scenario(project_root, file_path, part_size=1024 * 1024):
+    """
+    Fail one Vikingfiles part, then rerun: the rerun must reuse the journal,
+    send only the parts that are still missing and go on to complete-upload.
+    """
+    journal_dir = os.path.join(project_root, "journals")
+    parts = -(-os.path.getsize(file_path) // part_size)
+    started = time.perf_counter()
+
+    # get-upload-url and part 1 go through, part 2 gets a 503 and isn't retried
+    first_seen, seen = [], []
+    with standin(part_size, FaultPlan(["ok", "ok", "503"]), first_seen) as server:
+        first = vikingfiles.upload(file_path, max_workers=1, max_retries=0, journal_dir=journal_dir,
+                                   session=RedirectSession(server.url))
+    with standin(part_size, seen=seen) as server:
+        second = vikingfiles.upload(file_path, max_workers=1, journal_dir=journal_dir,
+                                    session=RedirectSession(server.url))
+
+    sent = sorted(int(path.rsplit("/", 1)[1]) for method, path in seen if method == "PUT")
+    steps = [path for _, path in seen if not path.startswith("/vikingfiles-part/")]
+    journal_left = any(files for _, _, files in os.walk(journal_dir))
+    ok = (not first[0] and second[0] and steps == ["/api/complete-upload"]
+          and sent == list(range(2, parts + 1)) and not journal_left)
+    return _report("vikingfiles, rerun resumes from journal", ok, started,
+                   f"rerun sent parts {sent[0] if sent else '-'}..{sent[-1] if sent else '-'} of {parts}; {second[1][:40]}")
+
+
+def _breaker_scenario(file_path):
+    """A host that keeps failing opens the breaker, which then fails the next upload at once"""
+    down = _upload_scenario(file_path, [], then="503", expect_success=False,
+                            label="upload, host down (breaker opens)")
+    started = time.perf_counter()
+    success, message = get_service("Pixeldrain").upload_file(file_path, CONFIG)
+    fast = _report("upload, breaker open fails fast", not success and "unavailable" in message
+                   and time.perf_counter() - started < 0.5, started, message[:60])
+    return down and fast
+
+
+class Workspace:
+    """Throwaway project with a config and a random file, shared by the scenarios"""
+
+    def __init__(self, size_mb=8):
+        self.project_root = tempfile.mkdtemp(prefix="demux-faults-")
+        with open(os.path.join(self.project_root, "config.json"), "w") as f:
+            json.dump(dict(CONFIG, download_connections=1), f)
+        self.data = os.urandom(size_mb * 1024 * 1024)
+        self.file_path = os.path.join(self.project_root, "upload.bin")
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+
+    def close(self):
+        shutil.rmtree(self.project_root, ignore_errors=True)
+
+
+# name -> callable(workspace) returning whether the scenario passed
+SCENARIOS = {
+    "download-faults": lambda ws: _download_scenario(ws.project_root, ws.data, ["reset", "503", "truncate", "429:1"], "a"),
+    "download-truncations": lambda ws: _download_scenario(ws.project_root, ws.data, ["truncate"] * 3, "b"),
+    "upload-faults": lambda ws: _upload_scenario(ws.file_path, ["503", "reset", "429:1"]),
+    "upload-401": lambda ws: _upload_scenario(ws.file_path, ["401"], expect_success=False,
+                                              label="upload, 401 is not retried"),
+    "async-upload-faults": lambda ws: _async_upload_scenario(ws.file_path, ["500", "429:1"]),
+    "async-upload-401": lambda ws: _async_upload_scenario(ws.file_path, ["401"], expect_success=False,
+                                                          label="async upload, 401 is not retried"),
+    "vikingfiles-journal-resume": lambda ws: _journal_resume_scenario(ws.project_root, ws.file_path),
+    "circuit-breaker": lambda ws: _breaker_scenario(ws.file_path),
+}
+
+
+def run_scenario(name, workspace):
+    """Run one scenario with fresh circuit breakers; returns whether it passed"""
+    resilience._breakers.clear()
+    try:
+        return SCENARIOS[name](workspace)
+    finally:
+        resilience._breakers.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    workspace = Workspace(args.size_mb)
+    try:
+        results = [run_scenario(name, workspace) for name in SCENARIOS]
+    finally:
+        workspace.close()
+
+    print(f"{sum(results)}/{len(results)} scenarios passed")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+"""
+Before/after benchmark for multipart upload bodies (Gofile, Catbox, Mixdrop).
+
+Compares requests_toolbelt's MultipartEncoder over an open file with the
+streaming MultipartBody against a local sink.
+
+    python -m benchmarks.multipart_body [--size-mb 512] [--block-kb 1024]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import requests
+from modules.utils import MultipartBody
+from .servers import put_sink
+
+
+def _measure(label, url, make_body, size):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    body, content_type, cleanup = make_body()
+    try:
+        response = requests.post(url, data=body, headers={"Content-Type": content_type})
+        response.raise_for_status()
+    finally:
+        cleanup()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    print(f"{label:<22} {size / wall / 1e6:10.1f} MB/s {cpu / (size / 1e9):10.2f} CPU s/GB")
+    return wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--block-kb", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    try:
+        from requests_toolbelt.multipart.encoder import MultipartEncoder
+    except ImportError:
+        MultipartEncoder = None
+        print("requests_toolbelt is not installed; measuring MultipartBody only")
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            tmp.write(block)
+        path = tmp.name
+
+    fields = {"reqtype": "fileupload"}
+    try:
+        with put_sink() as server:
+            def encoder_body():
+                f = open(path, "rb")
+                encoder = MultipartEncoder(fields={**fields, "file": ("bench.bin", f, "application/octet-stream")})
+                return encoder, encoder.content_type, f.close
+
+            def streaming_body():
+                body = MultipartBody(fields, "file", "bench.bin", path, block_size=args.block_kb * 1024)
+                return body, body.content_type, lambda: None
+
+            before = _measure("MultipartEncoder", f"{server.url}/put", encoder_body, size) if MultipartEncoder else None
+            after = _measure("MultipartBody", f"{server.url}/put", streaming_body, size)
+            if before:
+                print(f"speedup: {before / after:.2f}x")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
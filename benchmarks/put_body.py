@@ -0,0 +1,64 @@
+"""
+Before/after benchmark for raw-PUT upload bodies (Pixeldrain, Buzzheavier).
+
+Compares the per-read TqdmUploadWrapper with the memory-mapped
+MmapUploadBody against a local PUT sink.
+
+    python -m benchmarks.put_body [--size-mb 512] [--block-kb 1024]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import requests
+from modules.utils import TqdmUploadWrapper, MmapUploadBody
+from .servers import put_sink
+
+
+def _measure(label, url, make_body, size):
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    body, cleanup = make_body()
+    try:
+        response = requests.put(url, data=body)
+        response.raise_for_status()
+    finally:
+        cleanup()
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    print(f"{label:<22} {size / wall / 1e6:10.1f} MB/s {cpu / (size / 1e9):10.2f} CPU s/GB")
+    return wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--block-kb", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            tmp.write(block)
+        path = tmp.name
+
+    try:
+        with put_sink() as server:
+            def wrapper_body():
+                f = open(path, "rb")
+                return TqdmUploadWrapper(f, size, "wrapper"), f.close
+
+            def mmap_body():
+                return MmapUploadBody(path, block_size=args.block_kb * 1024), lambda: None
+
+            before = _measure("TqdmUploadWrapper", f"{server.url}/put", wrapper_body, size)
+            after = _measure("MmapUploadBody", f"{server.url}/put", mmap_body, size)
+            print(f"speedup: {before / after:.2f}x")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
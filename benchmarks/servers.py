@@ -0,0 +1,239 @@
+"""Local stand-in HTTP servers used by the benchmarks"""
+
+import hashlib
+import json
+import re
+import sys
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+from modules.async_transfer import AsyncTransferEngine
+from modules.resilience import ResilientSession
+
+READ_SIZE = 1024 * 1024
+
+
+class FaultPlan:
+    """
+    Faults to inject, one per incoming request, in order.
+
+    Each entry is one of:
+      "ok"        serve the request normally
+      "reset"     drop the connection without a response
+      "truncate"  send the headers and half the body, then drop the connection
+      "503", ...  answer with that status code
+      "429:N"     answer 429 with Retry-After: N
+    Once the plan is used up, every request is served normally, unless
+    `then` names a fault to repeat forever (e.g. "503" for a host that is down).
+    """
+
+    def __init__(self, faults=(), then="ok"):
+        self._faults = deque(faults)
+        self._lock = threading.Lock()
+        self.then = then
+        self.requests = 0
+
+    def next(self):
+        with self._lock:
+            self.requests += 1
+            return self._faults.popleft() if self._faults else self.then
+
+
+class FaultInjectingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    faults = None
+    # Optional list that gets (method, path without query) per request
+    seen = None
+
+    def log_message(self, *args):
+        pass
+
+    def _inject(self):
+        """Apply the next planned fault; returns "truncate", True if it was handled, else False"""
+        if self.seen is not None:
+            self.seen.append((self.command, self.path.split("?")[0]))
+        fault = self.faults.next() if self.faults else "ok"
+        if fault == "ok":
+            return False
+        if fault == "truncate":
+            return fault
+        self.close_connection = True
+        if fault == "reset":
+            return True
+        # Read the body first, or the client may see a broken pipe instead of the status
+        self._discard_body()
+        status, _, retry_after = fault.partition(":")
+        self.send_response(int(status))
+        if retry_after:
+            self.send_header("Retry-After", retry_after)
+        self.send_header("Content-Length", "0")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        return True
+
+    def _discard_body(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+
+class _SinkHandler(FaultInjectingHandler):
+    received = None
+
+    def _drain_body(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        received = 0
+        digest = hashlib.sha256()
+        while remaining > 0:
+            chunk = self.rfile.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            received += len(chunk)
+            remaining -= len(chunk)
+        if self.received is not None:
+            self.received.append((self.command, self.path, received, digest.hexdigest()))
+        return received
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        if self._inject():
+            return
+        self._reply({"id": "bench", "received": self._drain_body()})
+
+    def do_POST(self):
+        if self._inject():
+            return
+        self._reply({"status": "ok", "received": self._drain_body()})
+
+
+class _OriginHandler(FaultInjectingHandler):
+    data = b""
+    etag = '"bench"'
+
+    def _send_headers(self, status, length, extra=()):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.etag)
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers(200, len(self.data))
+
+    def do_GET(self):
+        fault = self._inject()
+        if fault is True:
+            return
+        start, end = 0, len(self.data) - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if match and (if_range is None or if_range == self.etag):
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else end
+            body = self.data[start:end + 1]
+            self._send_headers(206, len(body), [("Content-Range", f"bytes {start}-{end}/{len(self.data)}")])
+        else:
+            body = self.data
+            self._send_headers(200, len(body))
+        if fault == "truncate":
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-request (aborted parts, injected faults) are part of the scenarios
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class LocalServer:
+    """Runs a handler class on 127.0.0.1 in a background thread"""
+
+    def __init__(self, handler_class, port=0):
+        self._server = _QuietHTTPServer(("127.0.0.1", port), handler_class)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def serve_forever(self):
+        """Serve on the calling thread (for running a stand-in as its own process)"""
+        self._server.serve_forever()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def put_sink(faults=None, received=None):
+    """
+    Server that accepts and discards PUT/POST bodies.
+
+    :param faults: Optional FaultPlan applied to incoming requests.
+    :param received: Optional list that gets (method, path, size, sha256) per body.
+    """
+    handler = type("SinkHandler", (_SinkHandler,), {"faults": faults, "received": received})
+    return LocalServer(handler)
+
+
+def origin(data, faults=None):
+    """Server that serves `data` at every path, with byte ranges and an ETag"""
+    handler = type("OriginHandler", (_OriginHandler,), {"faults": faults, "data": data})
+    return LocalServer(handler)
+
+
+def _redirect(base_url, url):
+    parts = urlsplit(url)
+    target = f"{base_url}{parts.path or '/'}"
+    if parts.query:
+        target += f"?{parts.query}"
+    return target
+
+
+class RedirectSession(ResilientSession):
+    """
+    Session that sends every request to a local stand-in instead of the real host.
+
+    The path and query are kept, so the stand-in sees the same endpoints.
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, _redirect(self.base_url, url), *args, **kwargs)
+
+
+class RedirectEngine(AsyncTransferEngine):
+    """AsyncTransferEngine that sends every request to a local stand-in, like RedirectSession"""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip("/")
+
+    async def request(self, method, url, **kwargs):
+        return await super().request(method, _redirect(self.base_url, url), **kwargs)
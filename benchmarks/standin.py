@@ -0,0 +1,203 @@
+"""
+Local stand-in for every upload service and a Range-capable download origin.
+
+Emulates each protocol the way modules/uploader/services uses it, so the
+real service code can be benchmarked without touching live hosts. Point
+a service at it with servers.RedirectSession: only the path and query of
+the original URL are kept.
+
+    GET  /getServer                 Gofile server lookup
+    POST /uploadfile, /uploadFile   Gofile multipart upload
+    POST /user/api.php              Catbox multipart upload (plain-text link)
+    POST /api                       Mixdrop multipart upload
+    PUT  /api/file/<name>           Pixeldrain raw upload
+    POST /api/get-upload-url        Vikingfiles step 1 (presigned part URLs)
+    PUT  /vikingfiles-part/<n>      Vikingfiles step 2 (one part, returns an ETag)
+    POST /api/complete-upload       Vikingfiles step 3
+    PUT  /<name>                    Buzzheavier raw upload
+    GET  /origin/<bytes>            Download origin with byte ranges
+
+Run on its own (prints the base URL, then serves until killed):
+
+    python -m benchmarks.standin [--port 0] [--part-mb 16]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from urllib.parse import parse_qs
+from .servers import LocalServer, READ_SIZE, FaultInjectingHandler
+
+ORIGIN_BLOCK = os.urandom(READ_SIZE)
+PART_URL_BASE = "https://vikingfiles-parts.invalid"
+
+
+class ServiceStandInHandler(FaultInjectingHandler):
+    part_size = 16 * 1024 * 1024
+
+    def _read_body(self, keep=0):
+        """Drain the request body; returns (size, first `keep` bytes, last 64 bytes)"""
+        remaining = int(self.headers.get("Content-Length", 0))
+        size, head, tail = 0, b"", b""
+        while remaining > 0:
+            chunk = self.rfile.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            if len(head) < keep:
+                head += chunk[:keep - len(head)]
+            tail = (tail + chunk[-64:])[-64:]
+            size += len(chunk)
+            remaining -= len(chunk)
+        return size, head, tail
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _multipart(self):
+        """Drain a multipart body and check it is well formed; returns (size, form fields or None)"""
+        match = re.search(r"boundary=([^;]+)", self.headers.get("Content-Type", ""))
+        if not match:
+            self._read_body()
+            return None, None
+        boundary = match.group(1).strip('"').encode()
+        size, head, tail = self._read_body(keep=4096)
+        if not tail.endswith(b"--" + boundary + b"--\r\n"):
+            return None, None
+        fields = dict(re.findall(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n', head))
+        return size, {k.decode(): v.decode() for k, v in fields.items()}
+
+    def _bad_request(self, message):
+        self._send(400, {"status": "error", "message": message})
+
+    def do_GET(self):
+        if self._inject() is True:
+            return
+        if self.path.startswith("/getServer"):
+            self._send(200, {"status": "ok", "data": {"server": "store1"}})
+        elif self.path.startswith("/origin/"):
+            self._serve_origin(int(self.path.rsplit("/", 1)[1].split("?")[0]))
+        else:
+            self._send(404, {"status": "error"})
+
+    def do_HEAD(self):
+        if self.path.startswith("/origin/"):
+            size = int(self.path.rsplit("/", 1)[1].split("?")[0])
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", f'"origin-{size}"')
+            self.end_headers()
+        else:
+            self._send(404, {"status": "error"})
+
+    def _serve_origin(self, size):
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"origin-{size}"')
+        self.end_headers()
+        block = memoryview(ORIGIN_BLOCK)
+        position = start
+        while position <= end:
+            offset = position % len(block)
+            length = min(len(block) - offset, end - position + 1)
+            self.wfile.write(block[offset:offset + length])
+            position += length
+
+    def do_PUT(self):
+        if self._inject() is True:
+            return
+        if self.path.startswith("/vikingfiles-part/"):
+            size, _, _ = self._read_body()
+            etag = '"' + hashlib.md5(f"{self.path}:{size}".encode()).hexdigest() + '"'
+            self._send(200, b"", headers=[("ETag", etag)])
+        elif self.path.startswith("/api/file/"):
+            size, _, _ = self._read_body()
+            self._send(201, {"success": True, "id": f"standin{size}"})
+        else:
+            size, _, _ = self._read_body()
+            self._send(201, {"code": 201, "data": {"id": f"standin{size}"}})
+
+    def do_POST(self):
+        if self._inject() is True:
+            return
+        path = self.path.split("?")[0]
+        if path == "/api/get-upload-url":
+            size, head, _ = self._read_body(keep=1024)
+            form = parse_qs(head.decode())
+            file_size = int(form.get("size", ["0"])[0])
+            parts = max(1, -(-file_size // self.part_size))
+            urls = [f"{PART_URL_BASE}/vikingfiles-part/{n}?X-Amz-Expires=3600" for n in range(1, parts + 1)]
+            self._send(200, {"uploadId": "standin", "key": "standin", "partSize": self.part_size, "urls": urls})
+        elif path == "/api/complete-upload":
+            self._read_body()
+            self._send(200, {"url": "https://vikingfile.com/f/standin"})
+        elif path in ("/uploadfile", "/uploadFile"):
+            size, fields = self._multipart()
+            if size is None:
+                return self._bad_request("malformed multipart body")
+            self._send(200, {"status": "ok", "data": {"downloadPage": f"https://gofile.io/d/standin{size}"}})
+        elif path == "/user/api.php":
+            size, fields = self._multipart()
+            if size is None or fields.get("reqtype") != "fileupload":
+                return self._bad_request("malformed multipart body")
+            self._send(200, f"https://files.catbox.moe/standin{size}".encode(), "text/plain")
+        elif path == "/api":
+            size, fields = self._multipart()
+            if size is None or not fields.get("email") or not fields.get("key"):
+                return self._bad_request("malformed multipart body")
+            self._send(200, {"success": True, "result": {"url": f"https://mixdrop.ag/f/standin{size}"}})
+        else:
+            self._read_body()
+            self._send(404, {"status": "error"})
+
+
+def standin(part_size=None, faults=None, seen=None):
+    """
+    In-process stand-in server (use as a context manager, like servers.put_sink).
+
+    :param seen: Optional list that gets (method, path) per request.
+    """
+    attrs = {"faults": faults, "seen": seen}
+    if part_size:
+        attrs["part_size"] = part_size
+    return LocalServer(type("StandInHandler", (ServiceStandInHandler,), attrs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the upload services")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--part-mb", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    server = LocalServer(type("StandInHandler", (ServiceStandInHandler,), {"part_size": args.part_mb * 1024 * 1024}),
+                         port=args.port)
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
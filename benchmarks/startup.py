@@ -0,0 +1,101 @@
+"""
+Startup-time benchmark for the CLI entry points.
+
+Runs each entry point in a fresh interpreter, keeps the fastest of
+--repeat runs and checks it against the millisecond budgets in
+startup_budget.json. --top lists the slowest imports of each case, as
+reported by python -X importtime.
+
+    python -m benchmarks.startup [--repeat 5] [--top 10]
+    python -m benchmarks.startup --history startup.jsonl   # also log the run and compare to the last one
+
+Cases over budget are flagged and make the run exit with status 1.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+# name -> interpreter arguments, run from the project root
+CASES = {
+    "interpreter": ["-c", "pass"],
+    "cli-help": ["main.py", "--help"],
+    "batch-import": ["-c", "import modules.batch"],
+    "one-service": ["-c", "from modules.uploader.registry import get_service; get_service('Gofile')"],
+    "all-services": ["-c", "from modules.uploader.registry import get_services; get_services()"],
+    "menu": ["-c", "import main; import rich.console, rich.panel, modules.selection, modules.settings, modules.progress"],
+}
+
+
+def _run(args):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def _slowest_imports(args, top):
+    """(cumulative ms, module) of the top-level imports that took longest"""
+    output = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Top-level imports are the ones not indented under another
+        if cumulative.strip().isdigit() and not name.startswith("   "):
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case; the fastest is kept (default: 5)")
+    parser.add_argument("--only", help=f"Comma-separated cases (default: all of {','.join(CASES)})")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="Budget JSON file (case -> milliseconds)")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports of each case")
+    parser.add_argument("--history", help="JSON lines file to append this run to and compare against")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(CASES)
+    budget = {}
+    if os.path.exists(args.budget):
+        with open(args.budget) as f:
+            budget = json.load(f)
+    previous = {}
+    if args.history and os.path.exists(args.history):
+        with open(args.history) as f:
+            lines = [line for line in f if line.strip()]
+        if lines:
+            previous = json.loads(lines[-1])["results"]
+
+    results = {}
+    over = 0
+    print(f"{'case':<14} {'ms':>8} {'budget':>8} {'last':>8}  status")
+    for name in names:
+        case = CASES[name]
+        _run(case)  # warm the page cache and .pyc files
+        best = min(_run(case) for _ in range(max(1, args.repeat)))
+        results[name] = round(best, 1)
+        limit = budget.get(name)
+        status = "" if limit is None else ("ok" if best <= limit else "OVER BUDGET")
+        over += status == "OVER BUDGET"
+        last = f"{previous[name]:.0f}" if name in previous else "-"
+        print(f"{name:<14} {best:8.0f} {limit if limit is not None else '-':>8} {last:>8}  {status}")
+        for cumulative, module in _slowest_imports(case, args.top) if args.top else ():
+            print(f"{'':<14} {cumulative:8.1f}  {module}")
+
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps({"time": time.time(), "python": sys.version.split()[0], "results": results}) + "\n")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Throughput benchmark for every upload service and the downloader.
+
+Runs the real service code against the local stand-in (benchmarks.standin)
+for each file size and reports MB/s, CPU seconds per GB and peak RSS. Each
+measurement runs in a fresh worker process, so CPU time and peak RSS belong
+to that transfer alone and the stand-in server's work is not counted.
+
+    python -m benchmarks.suite [--sizes 16,128] [--only gofile,download]
+    python -m benchmarks.suite --save-baseline        # record this machine's numbers
+    python -m benchmarks.suite                        # compare against them
+
+Results more than --tolerance worse than the saved baseline are flagged
+and make the run exit with status 1.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ["gofile", "catbox", "mixdrop", "pixeldrain", "buzzheavier", "vikingfiles", "download"]
+SERVICE_CONFIG = {
+    "gofile_api_key": "standin",
+    "catbox_api_key": "standin",
+    "pixeldrain_api_key": "standin",
+    "buzzheavier_api_key": "standin",
+    "mixdrop_email": "standin@example.com",
+    "mixdrop_api_key": "standin",
+    "vikingfiles_api_key": "standin",
+    "upload_dedup": False,
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MB = 1024 * 1024
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(scenario, url, file_path, size, project_root):
+    """Run one transfer in this process and return its measurements"""
+    from .servers import RedirectSession
+
+    with open(os.path.join(project_root, "config.json"), "w") as f:
+        json.dump(SERVICE_CONFIG, f)
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if scenario == "download":
+        from modules.downloader import download_file
+        ok = download_file(project_root, f"{url}/origin/{size}", "download.bin") is not None
+        message = "downloaded" if ok else "download failed"
+    else:
+        from modules.uploader.registry import get_service
+        service = get_service(scenario)
+        service._session = RedirectSession(url)
+        ok, message = service.upload_file(file_path, SERVICE_CONFIG, project_root)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    return {"ok": bool(ok), "message": message, "wall": wall, "cpu": cpu, "rss_mb": _peak_rss_mb()}
+
+
+def _measure(scenario, url, file_path, size, workdir):
+    result_path = os.path.join(workdir, "result.json")
+    project_root = os.path.join(workdir, scenario)
+    os.makedirs(project_root, exist_ok=True)
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--worker", scenario, "--url", url,
+         "--file", file_path, "--size-bytes", str(size), "--project-root", project_root, "--result", result_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False,
+    )
+    try:
+        with open(result_path) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return {"ok": False, "message": "worker crashed"}
+    finally:
+        shutil.rmtree(project_root, ignore_errors=True)
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+    gigabytes = size / 1e9
+    result["mbps"] = size / result["wall"] / 1e6
+    result["cpu_s_per_gb"] = result["cpu"] / gigabytes
+    return result
+
+
+def _make_file(path, size):
+    block = os.urandom(MB)
+    with open(path, "wb") as f:
+        for offset in range(0, size, MB):
+            f.write(block[:min(MB, size - offset)])
+
+
+def _regressions(current, baseline, tolerance):
+    """Metrics of one result that are worse than the baseline by more than tolerance"""
+    flagged = []
+    if current["mbps"] < baseline["mbps"] * (1 - tolerance):
+        flagged.append(f"MB/s {baseline['mbps']:.0f}->{current['mbps']:.0f}")
+    if current["cpu_s_per_gb"] > baseline["cpu_s_per_gb"] * (1 + tolerance):
+        flagged.append(f"CPU {baseline['cpu_s_per_gb']:.2f}->{current['cpu_s_per_gb']:.2f}")
+    if current.get("rss_mb") and baseline.get("rss_mb") and current["rss_mb"] > baseline["rss_mb"] * (1 + tolerance):
+        flagged.append(f"RSS {baseline['rss_mb']:.0f}->{current['rss_mb']:.0f}")
+    return flagged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="16,128", help="Comma-separated file sizes in MB (default: 16,128)")
+    parser.add_argument("--only", help=f"Comma-separated scenarios (default: all of {','.join(SCENARIOS)})")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the fastest is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging (default: 0.15)")
+    parser.add_argument("--part-mb", type=int, default=16, help="Vikingfiles part size served by the stand-in")
+    worker = parser.add_argument_group("worker (internal)")
+    worker.add_argument("--worker", help=argparse.SUPPRESS)
+    worker.add_argument("--url", help=argparse.SUPPRESS)
+    worker.add_argument("--file", help=argparse.SUPPRESS)
+    worker.add_argument("--size-bytes", type=int, help=argparse.SUPPRESS)
+    worker.add_argument("--project-root", help=argparse.SUPPRESS)
+    worker.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        result = run_worker(args.worker, args.url, args.file, args.size_bytes, args.project_root)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    scenarios = [s.strip().lower() for s in args.only.split(",")] if args.only else SCENARIOS
+    sizes = [int(s) * MB for s in args.sizes.split(",")]
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.standin", "--part-mb", str(args.part_mb)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    workdir = tempfile.mkdtemp(prefix="demux-bench-")
+    results = {}
+    regressions = 0
+    try:
+        url = server.stdout.readline().strip()
+        print(f"{'scenario':<12} {'size':>7} {'MB/s':>9} {'CPU s/GB':>9} {'peak RSS':>9}  vs baseline")
+        for size in sizes:
+            file_path = os.path.join(workdir, f"bench-{size // MB}MB.bin")
+            _make_file(file_path, size)
+            for scenario in scenarios:
+                runs = [_measure(scenario, url, file_path, size, workdir) for _ in range(max(1, args.repeat))]
+                ok_runs = [run for run in runs if run["ok"]]
+                key = f"{scenario}:{size // MB}MB"
+                if not ok_runs:
+                    print(f"{scenario:<12} {size // MB:>5}MB  FAILED: {runs[-1]['message']}")
+                    regressions += 1
+                    continue
+                best = max(ok_runs, key=lambda run: run["mbps"])
+                results[key] = {name: best[name] for name in ("mbps", "cpu_s_per_gb", "rss_mb")}
+                note = ""
+                if key in baseline:
+                    flagged = _regressions(best, baseline[key], args.tolerance)
+                    note = "REGRESSION " + ", ".join(flagged) if flagged else "ok"
+                    regressions += bool(flagged)
+                rss = f"{best['rss_mb']:.0f}MB" if best["rss_mb"] else "n/a"
+                print(f"{scenario:<12} {size // MB:>5}MB {best['mbps']:9.1f} {best['cpu_s_per_gb']:9.2f} {rss:>9}  {note}")
+            os.remove(file_path)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,11 +2,7 @@
 """DEMUX - Download & Upload File Manager"""
 
 import os
-from rich.console import Console
-from rich.panel import Panel
-from modules.selection import select_item
-
-console = Console()
+import sys
 
 DEMUX_LOGO = """
  ██████╗ ███████╗███╗   ███╗██╗   ██╗██╗  ██╗
@@ -20,13 +16,17 @@ DEMUX_LOGO = """
 MENU_ITEMS = [
     ("download", "Download"),
     ("upload", "Upload"),
+    ("transload", "Transload (download + upload)"),
     ("settings", "Settings"),
     ("exit", "Exit"),
 ]
 
 
-def show_menu():
+def show_menu(console):
     """Display main menu with Rich panel and colored pick selection"""
+    from rich.panel import Panel
+    from modules.selection import select_item
+
     console.print(Panel(DEMUX_LOGO, style="bold yellow", expand=False))
     
     menu_labels = [item[1] for item in MENU_ITEMS]
@@ -42,24 +42,33 @@ def show_menu():
 
 def main():
     """Main application loop"""
-    from modules.downloader import handle_download_cli
-    from modules.uploader.core import handle_upload_cli
-    from modules.settings import handle_settings_cli
+    # Each flow is imported when it is first picked, so the menu comes up fast
+    from rich.console import Console
+    from modules.settings import get_config
+    from modules.progress import configure_from_config
     
+    console = Console()
     project_root = os.path.dirname(os.path.abspath(__file__))
+    configure_from_config(get_config(project_root))
     
     while True:
         try:
-            action = show_menu()
+            action = show_menu(console)
             
             if action == "exit":
                 console.print("\n[bold red]Exiting DEMUX.[/bold red]")
                 break
             elif action == "download":
+                from modules.downloader import handle_download_cli
                 handle_download_cli(project_root)
             elif action == "upload":
+                from modules.uploader.core import handle_upload_cli
                 handle_upload_cli(project_root)
+            elif action == "transload":
+                from modules.transload import handle_transload_cli
+                handle_transload_cli(project_root)
             elif action == "settings":
+                from modules.settings import handle_settings_cli
                 handle_settings_cli(project_root)
             
             input("\nPress Enter to return to menu...")
@@ -73,4 +82,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # Headless commands skip the interactive UI and its imports entirely
+    if len(sys.argv) > 1:
+        from modules.batch import run_cli
+        sys.exit(run_cli(sys.argv[1:], os.path.dirname(os.path.abspath(__file__))))
     main()
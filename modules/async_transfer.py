@@ -0,0 +1,273 @@
+"""asyncio transfer core shared by the downloader and the upload services"""
+
+import asyncio
+import atexit
+import json
+import os
+import threading
+import aiohttp
+from .uploader.dedup import feed_hasher
+from .utils import multipart_envelope
+from .bandwidth import throttle_async
+from .metrics import count_bytes, trace_config
+from . import progress
+from .resilience import RETRYABLE_STATUS, HTTPStatusError, note_failure
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+DEFAULT_MAX_CONCURRENCY = 100
+
+
+class TransferResponse:
+    """Buffered response of a finished transfer (status, headers and body text)"""
+
+    def __init__(self, url, status, headers, text, reason=None):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.text = text
+        self.reason = reason
+
+    @property
+    def status_code(self):
+        """Same as status, under the name requests uses"""
+        return self.status
+
+    @property
+    def ok(self):
+        return self.status < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        """:raises HTTPStatusError: If the status is 4xx/5xx."""
+        if not self.ok:
+            raise HTTPStatusError(self)
+
+
+async def file_chunks(file_path, offset=0, length=None, chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None):
+    """
+    Async generator streaming a byte range of a file in chunks.
+
+    Reads are small and sequential, so they are done inline rather than
+    bouncing every chunk through a thread pool.
+    """
+    remaining = os.path.getsize(file_path) - offset if length is None else length
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            await throttle_async(len(chunk))
+            count_bytes(len(chunk))
+            progress.advance(len(chunk))
+            feed_hasher(offset, chunk)
+            offset += len(chunk)
+            remaining -= len(chunk)
+            if on_progress:
+                on_progress(len(chunk))
+            yield chunk
+            await asyncio.sleep(0)
+
+
+def multipart_body(fields, file_field, file_path, file_name=None, chunk_size=DEFAULT_CHUNK_SIZE, on_progress=None):
+    """
+    Build a streaming multipart/form-data body with an exact length.
+
+    :param fields: Plain form fields sent before the file.
+    :param file_field: Name of the file field.
+    :return: A tuple (content_type, content_length, async_iterable)
+    """
+    content_type, head, tail = multipart_envelope(fields, file_field, file_name or os.path.basename(file_path))
+    length = len(head) + os.path.getsize(file_path) + len(tail)
+
+    async def body():
+        yield head
+        async for chunk in file_chunks(file_path, chunk_size=chunk_size, on_progress=on_progress):
+            yield chunk
+        yield tail
+
+    return content_type, length, body()
+
+
+class TransferTask:
+    """Handle for a transfer running on the engine's event loop"""
+
+    def __init__(self, future):
+        self.future = future
+
+    def cancel(self):
+        """Cancel the transfer; it stops at its next await point"""
+        return self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class AsyncTransferEngine:
+    """
+    Runs many HTTP transfers concurrently on a single asyncio event loop.
+
+    The loop lives in a background thread so synchronous code can submit
+    coroutines and wait for them. All transfers share one aiohttp session,
+    whose connector keeps connections alive between transfers to the same
+    host. Each submitted task can have its own timeout and be cancelled.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, chunk_size=DEFAULT_CHUNK_SIZE, connect_timeout=30):
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        self.connect_timeout = connect_timeout
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return self
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="async-transfer", daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+            return self
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.connect_timeout * 2)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config()])
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+    async def _guarded(self, coro_func, args, kwargs, timeout):
+        async with self._semaphore:
+            coro = coro_func(self, *args, **kwargs)
+            if timeout:
+                return await asyncio.wait_for(coro, timeout)
+            return await coro
+
+    def submit(self, coro_func, *args, timeout=None, **kwargs):
+        """
+        Schedule coro_func(self, *args, **kwargs) on the event loop.
+
+        :param timeout: Optional per-task timeout in seconds (raises asyncio.TimeoutError).
+        :return: A TransferTask.
+        """
+        self.start()
+        coro = self._guarded(coro_func, args, kwargs, timeout)
+        return TransferTask(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    def run(self, coro_func, *args, timeout=None, **kwargs):
+        """Synchronous wrapper: submit a coroutine and wait for its result"""
+        task = self.submit(coro_func, *args, timeout=timeout, **kwargs)
+        try:
+            return task.result()
+        except KeyboardInterrupt:
+            task.cancel()
+            raise
+
+    async def request(self, method, url, **kwargs):
+        """Perform a request and buffer its (small) response body"""
+        try:
+            async with self._session.request(method, url, **kwargs) as response:
+                text = await response.text()
+                result = TransferResponse(str(response.url), response.status, response.headers, text, response.reason)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            note_failure(e)
+            raise
+        if result.status in RETRYABLE_STATUS:
+            note_failure(result)
+        return result
+
+    async def put_file(self, url, file_path, headers=None, offset=0, length=None, on_progress=None, chunk_size=None):
+        """PUT a file (or a byte range of it) as a raw streamed body"""
+        if length is None:
+            length = os.path.getsize(file_path) - offset
+        headers = dict(headers or {})
+        headers['Content-Length'] = str(length)
+        body = file_chunks(file_path, offset, length, chunk_size or self.chunk_size, on_progress)
+        return await self.request('PUT', url, data=body, headers=headers)
+
+    async def post_multipart(self, url, fields, file_field, file_path, headers=None, on_progress=None, chunk_size=None):
+        """POST a file as multipart/form-data, streamed with an exact Content-Length"""
+        content_type, length, body = multipart_body(fields, file_field, file_path,
+                                                     chunk_size=chunk_size or self.chunk_size, on_progress=on_progress)
+        headers = dict(headers or {})
+        headers['Content-Type'] = content_type
+        headers['Content-Length'] = str(length)
+        return await self.request('POST', url, data=body, headers=headers)
+
+    async def download(self, url, output_path, headers=None, on_progress=None, hasher=None):
+        """
+        Stream a URL into output_path.
+
+        The file's own bytes are asked for (Accept-Encoding: identity); a
+        server that compresses anyway is decoded, with no known total.
+
+        Disk writes and hashing run in the loop's executor, one chunk at a
+        time and in order, so a slow disk or a large hash holds up this
+        download only and not every transfer on the loop; the next chunk is
+        received while the previous one is written.
+
+        :param hasher: Optional hashlib object updated with the body as it is written.
+        :return: The TransferResponse of the download (text is empty).
+        """
+        headers = {'Accept-Encoding': 'identity', **(headers or {})}
+        loop = asyncio.get_running_loop()
+        async with self._session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            encoded = response.headers.get('Content-Encoding', 'identity').lower() != 'identity'
+            progress.update(completed=0, total=None if encoded else response.content_length)
+            with open(output_path, 'wb') as f:
+                def write(chunk):
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+
+                pending = None
+                try:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        await throttle_async(len(chunk))
+                        count_bytes(len(chunk))
+                        progress.advance(len(chunk))
+                        if pending is not None:
+                            await pending
+                        pending = loop.run_in_executor(None, write, chunk)
+                        if on_progress:
+                            on_progress(len(chunk))
+                    if pending is not None:
+                        await pending
+                finally:
+                    # A write already handed to the executor can't be stopped; let it finish before the file closes
+                    if pending is not None and not pending.done():
+                        await asyncio.wait([pending])
+            return TransferResponse(str(response.url), response.status, response.headers, "")
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def get_engine():
+    """Shared engine used by the synchronous wrappers"""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            _default_engine = AsyncTransferEngine()
+            atexit.register(_default_engine.close)
+        return _default_engine.start()
@@ -0,0 +1,211 @@
+"""Token-bucket bandwidth scheduler shared by every download and upload"""
+
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+
+# Relative share of the aggregate limit each priority class gets while several are busy
+PRIORITIES = {"high": 4, "normal": 2, "low": 1}
+DEFAULT_PRIORITY = "normal"
+
+# A class counts as busy if it asked for bandwidth this recently
+ACTIVE_WINDOW = 1.0
+BURST_SECONDS = 0.25
+MIN_BURST = 64 * 1024
+
+_current_throttle = contextvars.ContextVar("bandwidth_throttle", default=None)
+
+
+class TokenBucket:
+    """
+    Classic token bucket that hands out reservations instead of blocking.
+
+    reserve() always debits the bucket (possibly into debt) and returns how
+    long the caller has to wait before sending, so the same bucket serves
+    threads (time.sleep) and coroutines (asyncio.sleep).
+
+    :param rate: Bytes per second; 0 or None means unlimited.
+    """
+
+    def __init__(self, rate):
+        self.rate = 0
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self.set_rate(rate)
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def set_rate(self, rate, now=None):
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.rate = max(0, rate or 0)
+        self.burst = max(MIN_BURST, self.rate * BURST_SECONDS)
+        self._tokens = min(self._tokens, self.burst)
+
+    def reserve(self, nbytes, now=None):
+        """Take nbytes from the bucket; returns the seconds to wait before sending them"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self._tokens -= nbytes
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class BandwidthScheduler:
+    """
+    Aggregate, per-key and per-priority bandwidth limits.
+
+    Every transfer reserves the bytes it is about to move against the
+    aggregate limit (split between the busy priority classes by their
+    PRIORITIES weight) and against the limit of each of its keys, e.g. a
+    service name or a hostname. The longest of those waits wins.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total_rate = 0
+        self._classes = {priority: TokenBucket(0) for priority in PRIORITIES}
+        self._last_active = {priority: 0.0 for priority in PRIORITIES}
+        self._limits = {}
+
+    @property
+    def limited(self):
+        return bool(self._total_rate or self._limits)
+
+    def configure(self, total_rate=0, limits=None):
+        """
+        Set the limits in bytes per second (0 = unlimited).
+
+        Buckets whose rate is unchanged keep their state, so reconfiguring
+        with the same values while transfers run is harmless.
+
+        :param limits: Dict of key (service name or host) -> bytes per second.
+        """
+        limits = {key.lower(): rate for key, rate in (limits or {}).items() if rate}
+        with self._lock:
+            self._total_rate = max(0, total_rate or 0)
+            for key in list(self._limits):
+                if key not in limits:
+                    del self._limits[key]
+            for key, rate in limits.items():
+                bucket = self._limits.get(key)
+                if bucket is None:
+                    self._limits[key] = TokenBucket(rate)
+                elif bucket.rate != rate:
+                    bucket.set_rate(rate)
+
+    def reserve(self, nbytes, keys=(), priority=DEFAULT_PRIORITY):
+        """Reserve nbytes for a transfer; returns the seconds to wait before sending them"""
+        if priority not in PRIORITIES:
+            priority = DEFAULT_PRIORITY
+        now = time.monotonic()
+        with self._lock:
+            delay = 0.0
+            if self._total_rate:
+                self._last_active[priority] = now
+                busy = [p for p, last in self._last_active.items() if now - last < ACTIVE_WINDOW]
+                weights = sum(PRIORITIES[p] for p in busy)
+                for p in busy:
+                    share = self._total_rate * PRIORITIES[p] / weights
+                    if self._classes[p].rate != share:
+                        self._classes[p].set_rate(share, now)
+                delay = self._classes[priority].reserve(nbytes, now)
+            for key in keys:
+                bucket = self._limits.get(key.lower()) if key else None
+                if bucket is not None:
+                    delay = max(delay, bucket.reserve(nbytes, now))
+        return delay
+
+
+class Throttle:
+    """A transfer's handle on the scheduler: its keys and priority class"""
+
+    def __init__(self, scheduler, keys=(), priority=DEFAULT_PRIORITY):
+        self.scheduler = scheduler
+        self.keys = tuple(key for key in keys if key)
+        self.priority = priority
+
+    def wait(self, nbytes):
+        delay = self.scheduler.reserve(nbytes, self.keys, self.priority)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, nbytes):
+        delay = self.scheduler.reserve(nbytes, self.keys, self.priority)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_scheduler = BandwidthScheduler()
+
+
+def get_scheduler():
+    """The process-wide scheduler all transfers draw from"""
+    return _scheduler
+
+
+def configure_from_config(config):
+    """
+    Apply the bandwidth settings of a config dict to the shared scheduler.
+
+    Limits are given in KiB/s: bandwidth_limit_kbps for the aggregate and
+    bandwidth_limits_kbps mapping service names or hosts to their own cap.
+    """
+    limits = config.get("bandwidth_limits_kbps") or {}
+    _scheduler.configure(
+        (config.get("bandwidth_limit_kbps") or 0) * 1024,
+        {key: (rate or 0) * 1024 for key, rate in limits.items()},
+    )
+    return _scheduler
+
+
+def current_throttle():
+    """Throttle bound to the transfer running in this context (or None)"""
+    return _current_throttle.get()
+
+
+def bind_throttle(throttle):
+    """Attach a throttle to the current context (used by helper threads)"""
+    return _current_throttle.set(throttle)
+
+
+@contextlib.contextmanager
+def limited(config, *keys, priority=None):
+    """
+    Run a transfer under the bandwidth limits of config.
+
+    Everything that moves body bytes in this context (download loops,
+    upload body streams) draws from the scheduler via throttle().
+
+    :param keys: Service names and/or hostnames the transfer counts against.
+    :param priority: Priority class (default: transfer_priority from config).
+    """
+    scheduler = configure_from_config(config)
+    throttle = None
+    if scheduler.limited:
+        throttle = Throttle(scheduler, keys, priority or config.get("transfer_priority") or DEFAULT_PRIORITY)
+    token = _current_throttle.set(throttle)
+    try:
+        yield throttle
+    finally:
+        _current_throttle.reset(token)
+
+
+def throttle(nbytes):
+    """Block until nbytes may be sent or received by the transfer bound to this context"""
+    current = _current_throttle.get()
+    if current is not None:
+        current.wait(nbytes)
+
+
+async def throttle_async(nbytes):
+    """Coroutine version of throttle()"""
+    current = _current_throttle.get()
+    if current is not None:
+        await current.wait_async(nbytes)
@@ -0,0 +1,306 @@
+"""Headless batch mode: queue many downloads/uploads without the interactive menu"""
+
+import argparse
+import json
+import os
+import sys
+import concurrent.futures
+from .settings import get_config
+from .bandwidth import PRIORITIES
+from . import progress
+
+
+def read_items(paths):
+    """
+    Read one item per line from files ('-' for stdin).
+
+    Blank lines and lines starting with '#' are skipped.
+    """
+    items = []
+    for path in paths or []:
+        handle = sys.stdin if path == "-" else open(path, "r")
+        try:
+            for line in handle:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    items.append(line)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+    return items
+
+
+class ResultWriter:
+    """Writes one JSON object per finished job"""
+
+    def __init__(self, output=None):
+        self._handle = open(output, "a") if output and output != "-" else sys.stdout
+
+    def write(self, result):
+        self._handle.write(json.dumps(result) + "\n")
+        self._handle.flush()
+
+    def close(self):
+        if self._handle is not sys.stdout:
+            self._handle.close()
+
+
+def _run_jobs(engine, jobs, writer):
+    """
+    Submit (coro_func, args, describe) jobs and report each result as it finishes.
+
+    describe(outcome, error) turns a job's return value (or error text)
+    into the JSON object that gets written.
+
+    :return: Number of failed jobs.
+    """
+    tasks = {}
+    for coro_func, args, describe in jobs:
+        task = engine.submit(coro_func, *args)
+        tasks[task.future] = (task, describe)
+
+    failures = 0
+    try:
+        for future in concurrent.futures.as_completed(tasks):
+            _, describe = tasks[future]
+            try:
+                result = describe(future.result(), None)
+            except concurrent.futures.CancelledError:
+                result = describe(None, "Cancelled")
+            except Exception as e:
+                result = describe(None, str(e) or type(e).__name__)
+            if result["status"] != "ok":
+                failures += 1
+            writer.write(result)
+    except KeyboardInterrupt:
+        for task, _ in tasks.values():
+            task.cancel()
+        raise
+    return failures
+
+
+def _target_names(urls):
+    """
+    File name in downloads/ for each URL, taken from the URL like the interactive download.
+
+    URLs that end in the same name (".../a/file.zip", ".../b/file.zip") would
+    share one .part file while they run, so later ones get numbered names
+    ("file-2.zip").
+    """
+    taken = set()
+    names = []
+    for url in urls:
+        name = os.path.basename(url.split('?')[0]) or "downloaded_file"
+        stem, ext = os.path.splitext(name)
+        candidate, number = name, 1
+        # Compared case-insensitively, for case-insensitive file systems
+        while candidate.lower() in taken:
+            number += 1
+            candidate = f"{stem}-{number}{ext}"
+        taken.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def run_download_batch(project_root, urls, jobs=4, output=None, overrides=None):
+    """
+    Download many URLs concurrently.
+
+    Each URL is fetched over one connection on the async engine, without
+    the resume manifest and segments of the interactive download: a file
+    that didn't finish starts over on the next run.
+
+    :param urls: List of URLs, each optionally followed by whitespace and an
+                 expected digest ("sha256:<hex>" or "blake2b:<hex>").
+    :param jobs: Maximum number of downloads in flight.
+    :param output: Path for JSON-lines results (stdout if None or '-').
+    :param overrides: Config values that apply to this run only (e.g. bandwidth limits, progress mode).
+    :return: Number of failed downloads.
+    """
+    from .async_transfer import AsyncTransferEngine
+    from .downloader import download_file_async
+
+    def describe(url):
+        def build(path, error):
+            if error:
+                return {"type": "download", "url": url, "status": "error", "error": error}
+            return {"type": "download", "url": url, "status": "ok", "path": path}
+        return build
+
+    config = get_config(project_root)
+    config.update(overrides or {})
+    progress.configure_from_config(config)
+    engine = AsyncTransferEngine(max_concurrency=jobs)
+    writer = ResultWriter(output)
+    try:
+        items = [item.split(None, 1) for item in urls]
+        names = _target_names([url for url, *_ in items])
+        jobs = [
+            (download_file_async, (project_root, url, name, None, config, *digest), describe(url))
+            for (url, *digest), name in zip(items, names)
+        ]
+        return _run_jobs(engine, jobs, writer)
+    finally:
+        writer.close()
+        engine.close()
+        progress.get_display().wait_idle()
+
+
+def run_upload_batch(project_root, files, service_names, jobs=4, output=None, force=False, overrides=None):
+    """
+    Upload every file to every given service concurrently.
+
+    :param files: List of file paths.
+    :param service_names: Service names as shown in the menu (case-insensitive).
+    :param jobs: Maximum number of uploads in flight.
+    :param output: Path for JSON-lines results (stdout if None or '-').
+    :param force: Upload even if the upload index already has a link for the file.
+    :param overrides: Config values that apply to this run only (e.g. bandwidth limits, progress mode).
+    :return: Number of failed uploads.
+    """
+    from .async_transfer import AsyncTransferEngine
+    from .uploader.registry import get_service
+    from .uploader.dedup import UploadIndex, reused_link
+
+    config = get_config(project_root)
+    config.update(overrides or {})
+    progress.configure_from_config(config)
+    index = None if force or not config.get("upload_dedup", True) else UploadIndex.for_project(project_root)
+    services = []
+    for name in service_names:
+        service = get_service(name)
+        if service is None or service.upload_async is None:
+            raise ValueError(f"Unknown upload service: {name}")
+        services.append(service)
+
+    def describe(path, service):
+        def build(outcome, error):
+            if error is None:
+                success, message = outcome
+                error = None if success else message
+            result = {"type": "upload", "path": path, "service": service.name}
+            if error:
+                result.update(status="error", error=error)
+            else:
+                link, reused = reused_link(message)
+                result.update(status="ok", link=link, reused=reused)
+            return result
+        return build
+
+    def upload_job(engine, path, service):
+        return service.upload_file_async(engine, path, config, project_root, index)
+
+    job_list = []
+    missing = 0
+    writer = ResultWriter(output)
+    for path in files:
+        if not os.path.isfile(path):
+            writer.write({"type": "upload", "path": path, "status": "error", "error": "File not found"})
+            missing += 1
+            continue
+        for service in services:
+            job_list.append((upload_job, (path, service), describe(path, service)))
+
+    engine = AsyncTransferEngine(max_concurrency=jobs)
+    try:
+        return missing + _run_jobs(engine, job_list, writer)
+    finally:
+        writer.close()
+        engine.close()
+        progress.get_display().wait_idle()
+
+
+def _add_run_arguments(parser):
+    parser.add_argument("--limit-kbps", type=int, metavar="KBPS",
+                        help="Aggregate bandwidth cap in KiB/s for this run (0 = unlimited)")
+    parser.add_argument("--priority", choices=sorted(PRIORITIES), help="Bandwidth priority class for this run")
+    parser.add_argument("--progress", choices=progress.MODES,
+                        help="Progress output: live bars, JSON lines on stderr, or quiet "
+                             "(default: live on a terminal, quiet otherwise)")
+
+
+def _run_overrides(args):
+    overrides = {}
+    if args.limit_kbps is not None:
+        overrides["bandwidth_limit_kbps"] = args.limit_kbps
+    if args.priority:
+        overrides["transfer_priority"] = args.priority
+    if args.progress:
+        overrides["progress_mode"] = args.progress
+    return overrides
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="DEMUX - Download & Upload File Manager")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    download = commands.add_parser(
+        "download", help="Download URLs without the interactive menu",
+        description="Download URLs concurrently into downloads/, one connection each. Batch downloads "
+                    "don't resume: a file that didn't finish starts over on the next run. URLs ending "
+                    "in the same file name get numbered names (file.zip, file-2.zip).",
+    )
+    download.add_argument("urls", nargs="*", help="URLs to download")
+    download.add_argument("--from", dest="sources", action="append", metavar="FILE",
+                          help="Read URLs from FILE, one per line, optionally followed by an expected "
+                               "sha256:<hex> or blake2b:<hex> digest ('-' for stdin); may be repeated")
+    download.add_argument("--jobs", "-j", type=int, default=4, help="Concurrent downloads (default: 4)")
+    download.add_argument("--output", "-o", help="Append JSON-lines results to this file (default: stdout)")
+    _add_run_arguments(download)
+
+    upload = commands.add_parser("upload", help="Upload files without the interactive menu")
+    upload.add_argument("files", nargs="*", help="Files to upload")
+    upload.add_argument("--services", "-s", required=True, help="Comma-separated services, e.g. gofile,pixeldrain")
+    upload.add_argument("--from", dest="sources", action="append", metavar="FILE",
+                        help="Read file paths from FILE, one per line ('-' for stdin); may be repeated")
+    upload.add_argument("--jobs", "-j", type=int, default=4, help="Concurrent uploads (default: 4)")
+    upload.add_argument("--output", "-o", help="Append JSON-lines results to this file (default: stdout)")
+    upload.add_argument("--force", action="store_true", help="Upload again even if the file was uploaded before")
+    _add_run_arguments(upload)
+
+    daemon = commands.add_parser("daemon", help="Keep running and take jobs over a local HTTP API")
+    daemon.add_argument("--port", type=int, help="Port on 127.0.0.1 to listen on (default: daemon_port from config)")
+    daemon.add_argument("--socket", metavar="PATH", help="Listen on a Unix socket instead of TCP")
+    daemon.add_argument("--jobs", "-j", type=int, help="Concurrent downloads and uploads (default: daemon_jobs from config)")
+
+    commands.add_parser("services", help="List the upload services and what they support, as JSON lines")
+    return parser
+
+
+def run_cli(argv, project_root):
+    """
+    Entry point for non-interactive invocations of main.py.
+
+    :return: Process exit code (0 if every job succeeded).
+    """
+    args = build_parser().parse_args(argv)
+    if args.command == "daemon":
+        from .daemon import run_daemon_cli
+        return run_daemon_cli(args, project_root)
+    if args.command == "services":
+        from .uploader.registry import capabilities_table
+
+        writer = ResultWriter()
+        for row in capabilities_table(get_config(project_root)):
+            writer.write(row)
+        return 0
+
+    items = (args.urls if args.command == "download" else args.files) + read_items(args.sources)
+    if not items:
+        print("Nothing to do: no inputs given.", file=sys.stderr)
+        return 2
+
+    try:
+        if args.command == "download":
+            failures = run_download_batch(project_root, items, args.jobs, args.output, _run_overrides(args))
+        else:
+            service_names = [name.strip() for name in args.services.split(",") if name.strip()]
+            failures = run_upload_batch(project_root, items, service_names, args.jobs, args.output, args.force,
+                                        _run_overrides(args))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("Cancelled.", file=sys.stderr)
+        return 130
+    return 1 if failures else 0
@@ -0,0 +1,504 @@
+"""
+Daemon mode: one long-running process that takes download, upload and
+transload jobs over a local HTTP API.
+
+The process keeps its AsyncTransferEngine (and with it aiohttp's
+keep-alive pool), the services' requests sessions and cached service
+state such as the Gofile server choice, so a stream of small jobs
+doesn't pay for interpreter startup and TLS handshakes every time.
+
+    POST   /jobs        {"type": "download", "url": ..., "digest": "sha256:<hex>"}
+                        {"type": "upload", "path": ..., "services": [...], "force": false}
+                        {"type": "transload", "url": ..., "services": [...], "file_name": null}
+    GET    /jobs        all jobs (?status=running to filter)
+    GET    /jobs/<id>   one job with its progress
+    DELETE /jobs/<id>   cancel a job
+    GET    /health      job counts and uptime
+
+Uploads to several services become one job per service. The API only
+listens on 127.0.0.1 or on a Unix socket, and every request must carry
+the token the daemon writes to daemon.token (mode 0600, next to
+config.json) when it starts:
+
+    Authorization: Bearer <token>
+
+So that a web page can't drive the API through the browser, requests
+with a foreign Host or Origin header and POSTs whose Content-Type isn't
+application/json are refused with 403. Downloads only write inside
+downloads/.
+"""
+
+import concurrent.futures
+import contextvars
+import hmac
+import itertools
+import json
+import os
+import secrets
+import signal
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from .settings import get_config
+from . import progress
+
+DEFAULT_PORT = 8765
+DEFAULT_JOBS = 8
+DEFAULT_TRANSLOAD_JOBS = 2
+# Finished jobs kept for status queries; older ones are forgotten first
+DEFAULT_KEEP_JOBS = 1000
+MAX_REQUEST_BYTES = 1024 * 1024
+JOB_TYPES = ("download", "upload", "transload")
+TOKEN_FILE = "daemon.token"
+
+
+class Job:
+    """One submitted job and what has happened to it so far"""
+
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.tasks = []
+        self.cancel = None
+
+    def to_dict(self):
+        data = {
+            "id": self.id, "type": self.kind, "status": self.status, "params": self.params,
+            "created": self.created, "started": self.started, "finished": self.finished,
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        data["progress"] = []
+        for task in list(self.tasks):
+            completed, total = task.snapshot()
+            data["progress"].append({"task": task.description, "completed": completed, "total": total})
+        return data
+
+
+class JobDaemon:
+    """
+    Runs submitted jobs on shared, long-lived transfer state.
+
+    Downloads and uploads run on one AsyncTransferEngine, at most jobs at a
+    time; transloads, which drive their own threads, run on a small pool of
+    their own. config.json is re-read only when it changes on disk.
+
+    :param jobs: Maximum downloads and uploads in flight.
+    :param transload_jobs: Maximum transloads in flight.
+    :param keep_jobs: Finished jobs kept for status queries.
+    """
+
+    def __init__(self, project_root, jobs=DEFAULT_JOBS, transload_jobs=DEFAULT_TRANSLOAD_JOBS,
+                 keep_jobs=DEFAULT_KEEP_JOBS):
+        from .async_transfer import AsyncTransferEngine
+
+        self.project_root = project_root
+        self.keep_jobs = keep_jobs
+        self.started = time.time()
+        self.engine = AsyncTransferEngine(max_concurrency=jobs).start()
+        self._transloads = concurrent.futures.ThreadPoolExecutor(max_workers=transload_jobs,
+                                                                 thread_name_prefix="daemon-transload")
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._config = None
+        self._config_mtime = None
+        self._index = None
+
+    def config(self):
+        """config.json, re-read only when its mtime changed"""
+        path = os.path.join(self.project_root, "config.json")
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        with self._lock:
+            if self._config is None or mtime != self._config_mtime:
+                self._config = get_config(self.project_root)
+                self._config_mtime = os.path.getmtime(path)
+                progress.configure_from_config(self._config)
+            return dict(self._config)
+
+    def _upload_index(self, config):
+        from .uploader.dedup import UploadIndex
+
+        with self._lock:
+            if self._index is None and config.get("upload_dedup", True):
+                self._index = UploadIndex.for_project(self.project_root)
+            return self._index
+
+    def submit(self, request):
+        """
+        Queue the job(s) a request describes.
+
+        :param request: Decoded JSON body of POST /jobs.
+        :return: List of the new Jobs.
+        :raises ValueError: If the request is malformed or names an unknown service.
+        """
+        from .integrity import parse_digest
+        from .uploader.registry import get_service
+
+        kind = request.get("type")
+        if kind not in JOB_TYPES:
+            raise ValueError(f"type must be one of {', '.join(JOB_TYPES)}")
+        config = self.config()
+
+        if kind == "download":
+            url = _required(request, "url")
+            digest = request.get("digest")
+            if digest:
+                parse_digest(digest)
+            output_path = _download_path(request.get("output_path"))
+            return [self._start_async(kind, {"url": url}, self._download_job, url, output_path, digest, config)]
+
+        services = request.get("services")
+        if isinstance(services, str):
+            services = [name.strip() for name in services.split(",") if name.strip()]
+        if not services:
+            raise ValueError("services must name at least one upload service")
+        found = []
+        for name in services:
+            service = get_service(name)
+            if service is None or (kind == "upload" and service.upload_async is None):
+                raise ValueError(f"Unknown upload service: {name}")
+            found.append(service)
+
+        if kind == "transload":
+            url = _required(request, "url")
+            params = {"url": url, "services": [s.name for s in found], "file_name": request.get("file_name")}
+            return [self._start_thread(kind, params, self._transload_job, params)]
+
+        path = _required(request, "path")
+        if not os.path.isfile(path):
+            raise ValueError(f"File not found: {path}")
+        index = None if request.get("force") else self._upload_index(config)
+        return [
+            self._start_async(kind, {"path": path, "service": service.name}, self._upload_job, service, path, index, config)
+            for service in found
+        ]
+
+    def _new_job(self, kind, params):
+        with self._lock:
+            job = Job(str(next(self._ids)), kind, params)
+            self._jobs[job.id] = job
+            self._forget_finished()
+        return job
+
+    def _forget_finished(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.keep_jobs)]:
+            del self._jobs[job.id]
+
+    def _start_async(self, kind, params, coro_func, *args):
+        job = self._new_job(kind, params)
+
+        async def run(engine):
+            job.status, job.started = "running", time.time()
+            with progress.collect() as tasks:
+                job.tasks = tasks
+                return await coro_func(engine, *args)
+
+        task = self.engine.submit(run)
+        job.cancel = task.cancel
+        task.future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _start_thread(self, kind, params, func, *args):
+        job = self._new_job(kind, params)
+
+        def run():
+            job.status, job.started = "running", time.time()
+            with progress.collect() as tasks:
+                job.tasks = tasks
+                return func(*args)
+
+        future = self._transloads.submit(contextvars.copy_context().run, run)
+        # A transload that has started runs to completion; only a queued one can be cancelled
+        job.cancel = future.cancel
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _finish(self, job, future):
+        try:
+            result = future.result()
+            if isinstance(result, tuple):
+                # Uploads return (success, message)
+                success, message = result
+                job.result, job.error = (message, None) if success else (None, message)
+            else:
+                # A download's path, or the per-service results of a transload
+                job.result = result
+                failed = [r for r in result if not r["success"]] if isinstance(result, list) else []
+                job.error = "; ".join(f"{r['service']}: {r['message']}" for r in failed) or None
+            job.status = "error" if job.error else "ok"
+        except concurrent.futures.CancelledError:
+            job.status, job.error = "cancelled", "Cancelled"
+        except Exception as e:
+            job.status, job.error = "error", str(e) or type(e).__name__
+        job.finished = time.time()
+
+    async def _download_job(self, engine, url, output_path, digest, config):
+        from .downloader import download_file_async
+
+        return await download_file_async(engine, self.project_root, url, output_path, None, config, digest)
+
+    async def _upload_job(self, engine, service, path, index, config):
+        return await service.upload_file_async(engine, path, config, self.project_root, index)
+
+    def _transload_job(self, params):
+        from .transload import transload
+
+        return transload(self.project_root, params["url"], params["services"], params["file_name"])
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, status=None):
+        with self._lock:
+            return [job for job in self._jobs.values() if status is None or job.status == status]
+
+    def cancel(self, job_id):
+        """:return: True if the job was still queued or running and has been told to stop"""
+        job = self.get(job_id)
+        if job is None or job.finished or job.cancel is None:
+            return False
+        return bool(job.cancel())
+
+    def health(self):
+        counts = {}
+        for job in self.jobs():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"status": "ok", "uptime": round(time.time() - self.started, 1), "jobs": counts}
+
+    def close(self):
+        for job in self.jobs():
+            if not job.finished and job.cancel:
+                job.cancel()
+        self._transloads.shutdown(wait=False, cancel_futures=True)
+        self.engine.close()
+
+
+def _required(request, key):
+    value = request.get(key)
+    if not value or not isinstance(value, str):
+        raise ValueError(f"{key} is required")
+    return value
+
+
+def _download_path(output_path):
+    """A download job's output_path, which must name a file inside downloads/"""
+    if output_path is None:
+        return None
+    if not isinstance(output_path, str) or not output_path:
+        raise ValueError("output_path must be a file name")
+    normalized = os.path.normpath(output_path)
+    if (os.path.isabs(output_path) or os.path.splitdrive(output_path)[0] or normalized == os.curdir
+            or normalized == os.pardir or normalized.startswith(os.pardir + os.sep)):
+        raise ValueError("output_path must be a relative path inside downloads/")
+    return normalized
+
+
+def token_path(project_root):
+    """Where a daemon for this project keeps its API token"""
+    return os.path.join(project_root, TOKEN_FILE)
+
+
+def _write_token(project_root):
+    """Create a new API token, readable by the owner only"""
+    token = secrets.token_urlsafe(32)
+    path = token_path(project_root)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        # O_CREAT's mode doesn't apply to a token file left behind by an earlier run
+        os.chmod(path, 0o600)
+        f.write(token)
+    return token
+
+
+def _remove_token(project_root, token):
+    # Another daemon for the same project may have replaced it since
+    path = token_path(project_root)
+    try:
+        with open(path) as f:
+            if f.read() == token:
+                os.remove(path)
+    except OSError:
+        pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    daemon = None
+    token = None
+    # Host header values accepted over TCP; None on a Unix socket, where the header means nothing
+    hosts = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        """Whether the request may go on; if not, it has been answered"""
+        host = (self.headers.get("Host") or "").lower()
+        origin = self.headers.get("Origin")
+        if self.hosts is not None and host not in self.hosts:
+            self._send(403, {"error": "Forbidden host"})
+        elif origin is not None and (self.hosts is None or origin.lower() not in {f"http://{h}" for h in self.hosts}):
+            self._send(403, {"error": "Cross-origin requests are not allowed"})
+        elif self.command == "POST" and self.headers.get_content_type() != "application/json":
+            self._send(403, {"error": "Content-Type must be application/json"})
+        elif not hmac.compare_digest(self.headers.get("Authorization", "").encode(), f"Bearer {self.token}".encode()):
+            self._send(401, {"error": "Missing or wrong token"})
+        else:
+            return True
+        return False
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        return [p for p in parts.path.split("/") if p], parse_qs(parts.query)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        path, query = self._route()
+        if path == ["health"]:
+            self._send(200, self.daemon.health())
+        elif path == ["jobs"]:
+            status = query.get("status", [None])[0]
+            self._send(200, {"jobs": [job.to_dict() for job in self.daemon.jobs(status)]})
+        elif len(path) == 2 and path[0] == "jobs":
+            job = self.daemon.get(path[1])
+            if job is None:
+                self._send(404, {"error": "No such job"})
+            else:
+                self._send(200, job.to_dict())
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        path, _ = self._route()
+        if path != ["jobs"]:
+            self._send(404, {"error": "Not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send(413, {"error": "Request too large"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+            jobs = self.daemon.submit(request)
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(202, {"jobs": [job.to_dict() for job in jobs]})
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        path, _ = self._route()
+        if len(path) != 2 or path[0] != "jobs":
+            self._send(404, {"error": "Not found"})
+        elif self.daemon.get(path[1]) is None:
+            self._send(404, {"error": "No such job"})
+        else:
+            self._send(200, {"cancelled": self.daemon.cancel(path[1])})
+
+    def log_message(self, format, *args):
+        # One line per request would drown the job output of a busy daemon
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(project_root, port=None, socket_path=None, jobs=None, on_ready=None):
+    """
+    Run the daemon until interrupted (Ctrl-C or SIGTERM).
+
+    A new API token is written to token_path(project_root) on start and
+    removed on exit.
+
+    :param port: TCP port on 127.0.0.1 (default: daemon_port from config).
+    :param socket_path: Listen on this Unix socket instead of TCP.
+    :param jobs: Maximum downloads and uploads in flight (default: daemon_jobs from config).
+    :param on_ready: Optional callable(address) fired once the API is listening.
+    """
+    config = get_config(project_root)
+    daemon = JobDaemon(
+        project_root,
+        jobs=jobs or config.get("daemon_jobs") or DEFAULT_JOBS,
+        transload_jobs=config.get("daemon_transload_jobs") or DEFAULT_TRANSLOAD_JOBS,
+        keep_jobs=config.get("daemon_keep_jobs") or DEFAULT_KEEP_JOBS,
+    )
+    token = _write_token(project_root)
+    handler = type("Handler", (_Handler,), {"daemon": daemon, "token": token})
+
+    try:
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = _UnixHTTPServer(socket_path, handler)
+            os.chmod(socket_path, 0o600)
+            address = socket_path
+        else:
+            if port is None:
+                port = config.get("daemon_port") or DEFAULT_PORT
+            server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+            server.daemon_threads = True
+            port = server.server_address[1]
+            handler.hosts = frozenset({f"127.0.0.1:{port}", f"localhost:{port}"})
+            address = f"http://127.0.0.1:{port}"
+    except OSError:
+        _remove_token(project_root, token)
+        daemon.close()
+        raise
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, stop)
+    if on_ready:
+        on_ready(address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        _remove_token(project_root, token)
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+    return 0
+
+
+def run_daemon_cli(args, project_root):
+    """Entry point for main.py daemon"""
+    def ready(address):
+        print(f"DEMUX daemon listening on {address} (token in {token_path(project_root)})",
+              file=sys.stderr, flush=True)
+
+    try:
+        return serve(project_root, args.port, args.socket, args.jobs, on_ready=ready)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
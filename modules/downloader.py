@@ -1,8 +1,20 @@
 import os
+import json
+import time
+import threading
+import contextvars
 import requests
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from rich.panel import Panel
-from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+from .settings import get_config
+from .write_pipeline import WritePipeline, preallocate
+from .bandwidth import limited
+from .resilience import RetryPolicy, IncompleteTransfer, CircuitOpenError, call, call_async
+from .metrics import mount_instrumented, transfer
+from .progress import track
+from .integrity import ALGORITHMS, IntegrityError, OrderedHasher, hash_algorithm, new_hash, parse_digest, record_checksum, verify
 
 console = Console()
 
@@ -11,16 +23,20 @@ def handle_download_cli(project_root):
     console.print(Panel("Download File", style="bold cyan", expand=False))
     
     try:
-        url = input("\nEnter the direct URL of the file to download: ").strip()
-        if not url:
+        urls = input("\nEnter the direct URL of the file to download (several mirrors: separate with spaces): ").split()
+        if not urls:
             console.print("[bold red]✗ URL cannot be empty.[/bold red]")
             return
+        url, mirrors = urls[0], urls[1:]
 
         default_filename = os.path.basename(url.split('?')[0]) or "downloaded_file"
         custom_filename = input(f"Enter custom filename (or press Enter for '{default_filename}'): ").strip()
         
         output_path = custom_filename if custom_filename else None
-        download_file(project_root, url, output_path)
+        expected_digest = input("Expected checksum, e.g. sha256:<hex> (or press Enter to skip): ").strip() or None
+        if expected_digest:
+            parse_digest(expected_digest)
+        download_file(project_root, url, output_path, expected_digest=expected_digest, mirrors=mirrors)
 
     except KeyboardInterrupt:
         console.print("[bold red]\n✗ Operation cancelled by user.[/bold red]")
@@ -28,7 +44,254 @@ def handle_download_cli(project_root):
         console.print(f"[bold red]✗ Error: {e}[/bold red]")
 
 
-def download_file(project_root, url, output_path=None):
+MIN_SEGMENT_SIZE = 1024 * 1024
+MANIFEST_SAVE_INTERVAL = 1.0
+
+# Shared so segments and retries reuse connections; its timings go to the transfer record
+_http = mount_instrumented(requests.Session(), pool_maxsize=16)
+# Sizes, byte ranges and checksums all refer to the file's own bytes, not a compressed encoding of them
+_http.headers['Accept-Encoding'] = 'identity'
+
+
+class RemoteChangedError(Exception):
+    """The remote file no longer matches the validators a partial download was started with"""
+
+
+def probe_remote(url, timeout=10):
+    """
+    Find out the size, validators and range support of a remote file.
+
+    Tries a HEAD request first and falls back to a one-byte Range GET for
+    servers that don't answer HEAD properly.
+
+    :return: A dict with size, supports_ranges, etag and last_modified.
+    """
+    info = {"size": 0, "supports_ranges": False, "etag": None, "last_modified": None}
+    try:
+        head = _http.head(url, allow_redirects=True, timeout=timeout)
+        if head.ok:
+            info["size"] = int(head.headers.get('content-length', 0))
+            info["etag"] = head.headers.get('etag')
+            info["last_modified"] = head.headers.get('last-modified')
+            if head.headers.get('accept-ranges', '').lower() == 'bytes' and info["size"] > 0:
+                info["supports_ranges"] = True
+                return info
+    except requests.exceptions.RequestException:
+        pass
+
+    with _http.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as probe:
+        content_range = probe.headers.get('content-range', '')
+        if probe.status_code == 206 and '/' in content_range:
+            size = content_range.rsplit('/', 1)[1]
+            if size.isdigit():
+                info["size"] = int(size)
+                info["supports_ranges"] = True
+                info["etag"] = probe.headers.get('etag') or info["etag"]
+                info["last_modified"] = probe.headers.get('last-modified') or info["last_modified"]
+    return info
+
+
+def split_ranges(total_size, segments):
+    """Split [0, total_size) into inclusive (start, end) byte ranges"""
+    segment_size = -(-total_size // segments)
+    return [
+        (start, min(start + segment_size, total_size) - 1)
+        for start in range(0, total_size, segment_size)
+    ]
+
+
+def range_validator(etag, last_modified):
+    """Value for the If-Range header (strong ETag preferred over Last-Modified)"""
+    if etag and not etag.startswith('W/'):
+        return etag
+    return last_modified
+
+
+class ResumeManifest:
+    """
+    Sidecar file (<target>.part.json) describing a partial download.
+
+    Stores the URL, the remote validators and, for every segment, how many
+    bytes from its start are already on disk in <target>.part.
+    """
+
+    def __init__(self, path, url, size, etag=None, last_modified=None, segments=None):
+        self.path = path
+        self.url = url
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.segments = segments or []
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def load(cls, path):
+        """Load a manifest from disk, or return None if it is missing or unreadable"""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return cls(path, data["url"], data["size"], data.get("etag"),
+                       data.get("last_modified"), [list(seg) for seg in data["segments"]])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def matches(self, url, info):
+        """True if this manifest belongs to the same URL and the same version of the remote file"""
+        if self.url != url or self.size != info["size"]:
+            return False
+        if self.etag and info["etag"]:
+            return self.etag == info["etag"]
+        if self.last_modified and info["last_modified"]:
+            return self.last_modified == info["last_modified"]
+        return False
+
+    @property
+    def validator(self):
+        return range_validator(self.etag, self.last_modified)
+
+    @property
+    def completed_bytes(self):
+        return sum(seg[2] for seg in self.segments)
+
+    def advance(self, index, nbytes):
+        with self._lock:
+            self.segments[index][2] += nbytes
+            if time.monotonic() - self._last_save >= MANIFEST_SAVE_INTERVAL:
+                self._save_locked()
+
+    def split(self, index, at):
+        """
+        Cut segment index at byte offset at; [at, end] becomes a new, empty segment.
+
+        at must lie past everything already fetched for the segment.
+
+        :return: Index of the new segment.
+        """
+        with self._lock:
+            start, end, done = self.segments[index]
+            if not start + done < at <= end:
+                raise ValueError(f"Can't split segment {start}-{end} at {at}")
+            self.segments[index][1] = at - 1
+            self.segments.append([at, end, 0])
+            return len(self.segments) - 1
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        data = {
+            "url": self.url,
+            "size": self.size,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "segments": self.segments,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _download_range(url, pipeline, manifest, index, stop):
+    """Fetch the missing tail of one segment and queue it for writing at its offset in the .part file"""
+    start, end, done = manifest.segments[index]
+    if start + done > end:
+        return
+
+    headers = {'Range': f'bytes={start + done}-{end}'}
+    if manifest.validator:
+        headers['If-Range'] = manifest.validator
+
+    with _http.get(url, headers=headers, stream=True, timeout=10) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            if manifest.validator:
+                raise RemoteChangedError("Remote file changed since the partial download was started")
+            raise IOError(f"Server ignored range request for bytes {start + done}-{end}")
+
+        # The manifest only advances once data is on disk, so a crash never marks unwritten bytes as done
+        received = pipeline.copy(response, start + done, on_written=lambda n: manifest.advance(index, n), stop=stop)
+
+    if received != end - (start + done) + 1:
+        raise IncompleteTransfer(f"Incomplete segment {start}-{end}: got {received} of {end - (start + done) + 1} bytes")
+
+
+def _download_segmented(url, part_path, manifest, task, hasher=None):
+    stop = threading.Event()
+    pipeline = WritePipeline(part_path, on_progress=task.advance, hasher=hasher)
+    try:
+        with ThreadPoolExecutor(max_workers=len(manifest.segments)) as executor:
+            # Each segment runs in a copy of this context, so it shares the transfer's throttle and metrics
+            futures = [
+                executor.submit(contextvars.copy_context().run, _download_range, url, pipeline, manifest, index, stop)
+                for index in range(len(manifest.segments))
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+    finally:
+        try:
+            pipeline.close()
+        finally:
+            manifest.save()
+
+
+def body_length(headers):
+    """
+    Bytes a response body takes on disk, as announced by its headers.
+
+    :return: Content-Length, or None if it is missing or a Content-Encoding
+             makes it the size of the compressed body rather than the file.
+    """
+    if headers.get('content-encoding', 'identity').lower() != 'identity':
+        return None
+    length = headers.get('content-length')
+    return int(length) if length and length.isdigit() else None
+
+
+def _download_single(response, output_path, task, hasher=None):
+    """:return: Bytes written"""
+    total_size = body_length(response.headers)
+    with WritePipeline(output_path, size=total_size, create=True, on_progress=task.advance, hasher=hasher) as pipeline:
+        received = pipeline.copy(response, 0)
+    if total_size and received != total_size:
+        # Drop any preallocated tail past the data that actually arrived
+        os.truncate(output_path, received)
+    return received
+
+
+def _prepare_manifest(url, part_path, manifest_path, info, connections):
+    """Reuse a matching manifest for resume, or start a fresh .part file and manifest"""
+    manifest = ResumeManifest.load(manifest_path)
+    if manifest and manifest.matches(url, info) and os.path.exists(part_path):
+        return manifest
+
+    segments = max(1, min(connections, info["size"] // MIN_SEGMENT_SIZE))
+    manifest = ResumeManifest(
+        manifest_path, url, info["size"], info["etag"], info["last_modified"],
+        [[start, end, 0] for start, end in split_ranges(info["size"], segments)]
+    )
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        preallocate(fd, info["size"])
+    finally:
+        os.close(fd)
+    manifest.save()
+    return manifest
+
+
+def resolve_output_path(project_root, url, output_path=None):
+    """Work out where a download goes (relative names land in downloads/)"""
     download_dir = os.path.join(project_root, "downloads")
     os.makedirs(download_dir, exist_ok=True)
     
@@ -37,38 +300,226 @@ def download_file(project_root, url, output_path=None):
         output_path = os.path.join(download_dir, filename)
     elif not os.path.isabs(output_path):
         output_path = os.path.join(download_dir, output_path)
+    return output_path
 
-    try:
-        response = requests.get(url, stream=True, timeout=10)
-        response.raise_for_status()
 
-        total_size = int(response.headers.get('content-length', 0))
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-        with Progress(
-            BarColumn(),
-            DownloadColumn(),
-            TransferSpeedColumn(),
-            TimeRemainingColumn(),
-            console=console
-        ) as progress:
-            task = progress.add_task(f"[cyan]Downloading {os.path.basename(output_path)}", total=total_size)
-            
-            with open(output_path, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        file.write(chunk)
-                        progress.update(task, advance=len(chunk))
+async def download_file_async(engine, project_root, url, output_path=None, on_progress=None, config=None,
+                              expected_digest=None):
+    """
+    Download a file on an AsyncTransferEngine (no resume).
+
+    Meant for running many small downloads concurrently on one event loop;
+    data goes to <target>.part and is renamed into place when complete.
+    Hashing and the checksum manifest work as in download_file().
+
+    :param config: Config dict for the bandwidth limits (default: read from project_root).
+    :param expected_digest: Optional "sha256:<hex>" or "blake2b:<hex>" the file must match.
+    :return: The output path.
+    :raises IntegrityError: If the file doesn't match expected_digest (it is deleted).
+    """
+    output_path = resolve_output_path(project_root, url, output_path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    part_path = f"{output_path}.part"
+
+    config = config or get_config(project_root)
+    host = urlparse(url).hostname or url
+    algorithm = hash_algorithm(config, expected_digest)
+    hasher = None
+
+    async def attempt():
+        nonlocal hasher
+        hasher = new_hash(algorithm) if algorithm else None
+        response = await engine.download(url, part_path, on_progress=on_progress, hasher=hasher)
+        expected = body_length(response.headers)
+        if expected is not None and expected != os.path.getsize(part_path):
+            raise IncompleteTransfer(f"Incomplete download: got {os.path.getsize(part_path)} of {expected} bytes")
+
+    name = os.path.basename(output_path)
+    with transfer("download", host, name, project_root, config), limited(config, host), \
+            track(f"Downloading {name}"):
+        await call_async(attempt, host, RetryPolicy.from_config(config), config)
+
+    if hasher:
+        try:
+            _finish_checksum(project_root, config, output_path, algorithm, hasher.hexdigest(), expected_digest)
+        except IntegrityError:
+            os.remove(part_path)
+            raise
+    os.replace(part_path, output_path)
+    return output_path
+
+
+def _finish_checksum(project_root, config, output_path, algorithm, digest, expected_digest):
+    """Check a finished download's digest, then note it in the checksum manifest"""
+    if expected_digest:
+        verify(algorithm, digest, expected_digest)
+    if config.get("checksum_manifest", True):
+        record_checksum(project_root, output_path, algorithm, digest)
+
+
+def download_file(project_root, url, output_path=None, connections=None, expected_digest=None, mirrors=None):
+    """
+    Download a file into the downloads directory.
+
+    Data is written to <target>.part and only renamed into place once
+    complete. When the server supports byte ranges, a <target>.part.json
+    manifest records progress so an interrupted download of the same URL
+    resumes where it stopped (guarded by If-Range), and large files are
+    fetched over several connections at once. Transient failures are
+    retried with backoff, resuming from the bytes already on disk, and a
+    host that keeps failing trips its circuit breaker.
+
+    With download_hash_algorithm set in config, or an expected_digest, the
+    file is hashed as it is written and recorded in downloads.checksums; a
+    file that doesn't match expected_digest is deleted instead of being
+    renamed into place. Bytes that arrive ahead of the hash frontier (other
+    segments, or what a resumed download already has) are read back from
+    disk to be hashed.
+
+    With mirrors, the file is fetched from url and the mirrors at once
+    (see modules.mirrors); the resume manifest is the same as for url alone.
+
+    :param connections: Parallel connections for segmented mode (default: download_connections from config).
+    :param expected_digest: Optional "sha256:<hex>" or "blake2b:<hex>" the file must match.
+    :param mirrors: Optional further URLs serving the same file.
+    :return: The output path on success, otherwise None.
+    """
+    output_path = resolve_output_path(project_root, url, output_path)
+
+    config = get_config(project_root)
+    if connections is None:
+        connections = config.get("download_connections", 4)
+    algorithm = hash_algorithm(config, expected_digest)
+    digest = None
+
+    part_path = f"{output_path}.part"
+    manifest_path = f"{part_path}.json"
+
+    host = urlparse(url).hostname or url
+    policy = RetryPolicy.from_config(config)
+
+    def on_retry(error, delay):
+        console.print(f"[bold yellow]↻ {error} - retrying in {delay:.1f}s[/bold yellow]")
+
+    with transfer("download", host, os.path.basename(output_path), project_root, config) as record:
+        try:
+            if mirrors:
+                from .mirrors import download_mirrored
+
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                with track(f"Downloading {os.path.basename(output_path)}") as task:
+                    manifest, hasher = download_mirrored(
+                        [url, *mirrors], part_path, manifest_path, config, task,
+                        hasher_factory=(lambda manifest: _resume_hasher(algorithm, part_path, manifest)) if algorithm else None,
+                        log=lambda message: console.print(f"[bold yellow]{message}[/bold yellow]"),
+                    )
+                    if hasher:
+                        digest = hasher.hexdigest(manifest.size)
+                    manifest.remove()
+            else:
+                digest = _download_from(url, output_path, config, connections, algorithm, host, policy, on_retry)
+
+            if digest:
+                _finish_checksum(project_root, config, output_path, algorithm, digest, expected_digest)
+            os.replace(part_path, output_path)
         
-        console.print(f"\n[bold green]✓ File downloaded successfully[/bold green]")
-        console.print(f"[bold white]Location: {output_path}[/bold white]")
+            console.print(f"\n[bold green]✓ File downloaded successfully[/bold green]")
+            console.print(f"[bold white]Location: {output_path}[/bold white]")
+            if digest:
+                verified = " (verified)" if expected_digest else ""
+                console.print(f"[bold white]{ALGORITHMS[algorithm][0]}: {digest}{verified}[/bold white]")
+            return output_path
         
-    except requests.exceptions.Timeout:
-        console.print("[bold red]✗ Error: Request timeout[/bold red]")
-    except requests.exceptions.RequestException as e:
-        console.print(f"[bold red]✗ Error downloading file: {e}[/bold red]")
-    except Exception as e:
-        console.print(f"[bold red]✗ An unexpected error occurred: {e}[/bold red]")
+        except IntegrityError as e:
+            error = str(e)
+            console.print(f"[bold red]✗ {e}[/bold red]")
+            # A corrupt file must not be resumed or mistaken for a good one
+            for path in (part_path, manifest_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        except CircuitOpenError as e:
+            error = str(e)
+            console.print(f"[bold red]✗ Error: {e}[/bold red]")
+        except requests.exceptions.Timeout:
+            error = "Request timeout"
+            console.print("[bold red]✗ Error: Request timeout[/bold red]")
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+            console.print(f"[bold red]✗ Error downloading file: {e}[/bold red]")
+        except Exception as e:
+            error = str(e)
+            console.print(f"[bold red]✗ An unexpected error occurred: {e}[/bold red]")
+        record.finish("error", error)
+    if os.path.exists(manifest_path):
+        console.print(f"[bold yellow]↻ Partial download kept, run it again to resume.[/bold yellow]")
+    return None
+
+
+def _resume_hasher(algorithm, part_path, manifest):
+    """OrderedHasher for a .part file; bytes a resumed download already has are hashed from disk when the frontier reaches them"""
+    hasher = OrderedHasher(algorithm, part_path)
+    for start, _, done in manifest.segments:
+        hasher.mark_written(start, start + done)
+    return hasher
+
+
+def _download_from(url, output_path, config, connections, algorithm, host, policy, on_retry):
+    """
+    Fetch one URL into <output_path>.part: segmented and resumable with range support, otherwise in one stream.
+
+    :return: The file's digest, or None if algorithm is None.
+    """
+    part_path = f"{output_path}.part"
+    manifest_path = f"{part_path}.json"
+    digest = None
+    info = call(lambda: probe_remote(url), host, policy, config, on_retry)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    with limited(config, host), track(f"Downloading {os.path.basename(output_path)}") as task:
+        if info["supports_ranges"]:
+            manifest = _prepare_manifest(url, part_path, manifest_path, info, connections)
+            if manifest.completed_bytes:
+                console.print(f"[bold yellow]↻ Resuming at {manifest.completed_bytes} of {manifest.size} bytes[/bold yellow]")
+
+            def new_hasher():
+                return _resume_hasher(algorithm, part_path, manifest)
+
+            hasher = new_hasher() if algorithm else None
+
+            def segmented_attempt():
+                # Each retry picks up from what the manifest says is on disk
+                task.update(completed=manifest.completed_bytes, total=manifest.size)
+                _download_segmented(url, part_path, manifest, task, hasher)
+
+            try:
+                call(segmented_attempt, host, policy, config, on_retry)
+            except RemoteChangedError:
+                console.print("[bold yellow]⚠ Remote file changed, restarting download[/bold yellow]")
+                manifest.remove()
+                info = call(lambda: probe_remote(url), host, policy, config, on_retry)
+                manifest = _prepare_manifest(url, part_path, manifest_path, info, connections)
+                hasher = new_hasher() if algorithm else None
+                call(segmented_attempt, host, policy, config, on_retry)
+            if hasher:
+                digest = hasher.hexdigest(manifest.size)
+            manifest.remove()
+        else:
+            def single_attempt():
+                # Without range support a retry has to start over
+                nonlocal digest
+                hasher = OrderedHasher(algorithm, part_path) if algorithm else None
+                with _http.get(url, stream=True, timeout=10) as response:
+                    response.raise_for_status()
+                    total_size = body_length(response.headers)
+                    task.update(completed=0, total=total_size)
+                    received = _download_single(response, part_path, task, hasher)
+                    if total_size is not None and received != total_size:
+                        raise IncompleteTransfer(f"Incomplete download: got {received} of {total_size} bytes")
+                if hasher:
+                    digest = hasher.hexdigest(os.path.getsize(part_path))
+
+            call(single_attempt, host, policy, config, on_retry)
+    return digest
 
 
 # Keep old function for compatibility
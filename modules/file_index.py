@@ -0,0 +1,139 @@
+"""Index of the files in a directory, kept up to date without rescanning unchanged directories"""
+
+import os
+import threading
+import time
+
+SORT_KEYS = ("name", "size", "age")
+# A directory changed this recently may change again within the same mtime tick
+MTIME_SETTLE_NS = 2 * 10**9
+# Leftovers of unfinished downloads (data, resume manifest, and the manifest's temp file while it is saved)
+INCOMPLETE_SUFFIXES = (".part", ".part.json", ".part.json.tmp")
+
+
+class FileEntry:
+    """
+    One regular file of an indexed directory.
+
+    key is the (device, inode) pair, which stays the same while the file
+    exists even if another file gets the same name or label.
+    """
+
+    __slots__ = ("name", "path", "size", "mtime", "key")
+
+    def __init__(self, name, path, size, mtime, key):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.key = key
+
+    def __repr__(self):
+        return f"FileEntry({self.name!r}, size={self.size})"
+
+
+class FileIndex:
+    """
+    Regular files directly inside a directory, from a single os.scandir pass.
+
+    The listing is kept until the directory's mtime changes (a file was
+    added, removed or renamed), so showing a menu again costs one stat.
+    On a rescan, entries whose inode, size and mtime are unchanged are
+    reused. Files that are rewritten in place don't touch the directory
+    mtime; refresh(force=True) picks those up. Unfinished downloads
+    (INCOMPLETE_SUFFIXES) are left out, so they can't be picked for upload.
+
+    :param directory: Directory to index; a missing directory is an empty index.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._entries = {}
+        self._sorted = {}
+
+    def refresh(self, force=False):
+        """
+        Rescan the directory if it changed since the last scan.
+
+        :return: True if the directory was rescanned.
+        """
+        with self._lock:
+            try:
+                mtime_ns = os.stat(self.directory).st_mtime_ns
+            except OSError:
+                self._mtime_ns = None
+                self._entries, self._sorted = {}, {}
+                return True
+            if not force and mtime_ns == self._mtime_ns:
+                return False
+
+            entries = {}
+            with os.scandir(self.directory) as scan:
+                for item in scan:
+                    if item.name.endswith(INCOMPLETE_SUFFIXES):
+                        continue
+                    try:
+                        if not item.is_file():
+                            continue
+                        stat = item.stat()
+                    except OSError:
+                        # Removed between listing and stat
+                        continue
+                    key = (stat.st_dev, stat.st_ino)
+                    known = self._entries.get(item.name)
+                    if known is not None and known.key == key and known.size == stat.st_size \
+                            and known.mtime == stat.st_mtime:
+                        entries[item.name] = known
+                    else:
+                        entries[item.name] = FileEntry(item.name, item.path, stat.st_size, stat.st_mtime, key)
+
+            self._entries, self._sorted = entries, {}
+            # Changes in the same mtime tick as the scan would go unnoticed, so don't trust a fresh mtime yet
+            self._mtime_ns = mtime_ns if time.time_ns() - mtime_ns > MTIME_SETTLE_NS else None
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self, search=None, sort="name"):
+        """
+        Indexed files, refreshed first if the directory changed.
+
+        :param search: Only names containing this text (case-insensitive).
+        :param sort: "name" (A-Z), "size" (largest first) or "age" (newest first).
+        :return: List of FileEntry.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort '{sort}' (expected one of {', '.join(SORT_KEYS)})")
+        self.refresh()
+        with self._lock:
+            ordered = self._sorted.get(sort)
+            if ordered is None:
+                values = list(self._entries.values())
+                if sort == "name":
+                    ordered = sorted(values, key=lambda e: (e.name.lower(), e.name))
+                elif sort == "size":
+                    ordered = sorted(values, key=lambda e: (-e.size, e.name.lower()))
+                else:
+                    ordered = sorted(values, key=lambda e: (-e.mtime, e.name.lower()))
+                self._sorted[sort] = ordered
+        if search:
+            needle = search.lower()
+            return [entry for entry in ordered if needle in entry.name.lower()]
+        return list(ordered)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(directory):
+    """The FileIndex shared by everything that lists this directory"""
+    path = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = FileIndex(path)
+        return index
@@ -0,0 +1,270 @@
+"""Checksums computed while data streams, digest verification, and the downloads checksum manifest"""
+
+import hashlib
+import os
+import random
+import threading
+import requests
+
+# name -> (tag used in the manifest, constructor, hex digest length)
+ALGORITHMS = {
+    "sha256": ("SHA256", hashlib.sha256, 64),
+    "blake2b": ("BLAKE2b", hashlib.blake2b, 128),
+}
+MANIFEST_NAME = "downloads.checksums"
+CATCH_UP_BLOCK = 1024 * 1024
+SPOT_CHECK_BYTES = 64 * 1024
+
+_manifest_lock = threading.Lock()
+
+
+class IntegrityError(IOError):
+    """Data on disk or at the remote end doesn't match what was expected"""
+
+
+def parse_digest(value):
+    """
+    Split a user-supplied digest into (algorithm, hex).
+
+    Accepts "sha256:<hex>", "blake2b:<hex>" or a bare hex digest, whose
+    algorithm is taken from its length.
+
+    :raises ValueError: For an unknown algorithm or malformed hex.
+    """
+    value = value.strip()
+    algorithm, _, digest = value.rpartition(":")
+    algorithm = algorithm.lower().replace("-", "")
+    digest = digest.lower()
+    if not algorithm:
+        algorithm = next((name for name, (_, _, length) in ALGORITHMS.items() if length == len(digest)), None)
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unrecognised digest '{value}' (expected sha256:<hex> or blake2b:<hex>)")
+    if len(digest) != ALGORITHMS[algorithm][2] or any(c not in "0123456789abcdef" for c in digest):
+        raise ValueError(f"Malformed {algorithm} digest '{digest}'")
+    return algorithm, digest
+
+
+def new_hash(algorithm):
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown hash algorithm '{algorithm}' (expected one of {', '.join(ALGORITHMS)})")
+    return ALGORITHMS[algorithm][1]()
+
+
+def _pread(fd, size, offset):
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+class OrderedHasher:
+    """
+    Hash of a file in file order, fed by writes that may arrive out of order.
+
+    Data written at the hash frontier is hashed straight from the write
+    buffer, so a sequential stream is hashed without reading anything back.
+    Data that lands ahead of the frontier (another segment of a segmented
+    download, or bytes already on disk when a download resumes) is read
+    back from the file once the frontier reaches it: usually from the page
+    cache it was just written to, but a second read of those bytes all the
+    same. The read-back runs on a catch-up thread of its own, behind the
+    frontier, so the thread doing the writes never waits on it.
+
+    written() and mark_written() are called from a single writer thread.
+
+    :param path: File being written; opened read-only when data has to be read back.
+    """
+
+    def __init__(self, algorithm, path):
+        self.algorithm = algorithm
+        self.path = path
+        self.position = 0
+        self._hash = new_hash(algorithm)
+        self._ahead = []
+        self._cond = threading.Condition()
+        # Catch-up thread while one runs; it owns the hash until it exits
+        self._reader = None
+        self._error = None
+
+    def update(self, data):
+        """Hash data that directly follows what was hashed so far"""
+        with self._cond:
+            self._hash.update(data)
+            self.position += len(data)
+
+    def written(self, offset, data):
+        """Report data that has just been written to the file at offset"""
+        with self._cond:
+            if offset == self.position and self._reader is None:
+                self._hash.update(data)
+                self.position += len(data)
+            elif offset >= self.position:
+                self._mark(offset, offset + len(data))
+            self._start_catch_up()
+
+    def mark_written(self, start, end):
+        """Record that bytes [start, end) are on disk, to be hashed when the frontier gets there"""
+        with self._cond:
+            self._mark(start, end)
+            self._start_catch_up()
+
+    def _mark(self, start, end):
+        if end <= start:
+            return
+        ranges = sorted(self._ahead + [[start, end]])
+        merged = [ranges[0]]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        self._ahead = merged
+
+    def _reachable(self):
+        while self._ahead and self._ahead[0][1] <= self.position:
+            self._ahead.pop(0)
+        return bool(self._ahead) and self._ahead[0][0] <= self.position
+
+    def _start_catch_up(self):
+        # Called with _cond held
+        if self._reader is None and self._error is None and self._reachable():
+            self._reader = threading.Thread(target=self._catch_up, name="download-hasher", daemon=True)
+            self._reader.start()
+
+    def _catch_up(self):
+        """Hash ranges the frontier has reached from disk, then exit until there are more"""
+        fd = None
+        try:
+            while True:
+                with self._cond:
+                    if not self._reachable():
+                        self._reader = None
+                        self._cond.notify_all()
+                        return
+                    _, end = self._ahead.pop(0)
+                    position = self.position
+                if fd is None:
+                    fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+                while position < end:
+                    data = _pread(fd, min(CATCH_UP_BLOCK, end - position), position)
+                    if not data:
+                        raise IntegrityError(f"{self.path} is shorter than the data written to it")
+                    self._hash.update(data)
+                    position += len(data)
+                    with self._cond:
+                        self.position = position
+        except BaseException as e:
+            with self._cond:
+                self._error = e
+                self._reader = None
+                self._cond.notify_all()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def hexdigest(self, size):
+        """
+        Digest of the first size bytes, once all of them have been written.
+
+        Waits for the catch-up thread to hash what is still behind the frontier.
+
+        :raises IntegrityError: If part of the file was never written.
+        """
+        with self._cond:
+            self._start_catch_up()
+            while self._reader is not None:
+                self._cond.wait()
+            error = self._error
+        if error is not None:
+            raise error
+        if self.position != size:
+            raise IntegrityError(f"Only {self.position} of {size} bytes could be hashed in order")
+        return self._hash.hexdigest()
+
+
+def verify(algorithm, digest, expected):
+    """
+    Compare a computed digest with an expected one.
+
+    :param expected: Value accepted by parse_digest().
+    :raises IntegrityError: On a mismatch.
+    """
+    expected_algorithm, expected_digest = parse_digest(expected)
+    if expected_algorithm != algorithm:
+        raise IntegrityError(f"Can't check a {expected_algorithm} digest against a {algorithm} hash")
+    if digest != expected_digest:
+        raise IntegrityError(f"Checksum mismatch: expected {algorithm}:{expected_digest}, got {algorithm}:{digest}")
+
+
+def hash_algorithm(config, expected=None):
+    """
+    Algorithm to hash a download with, or None if hashing is off.
+
+    Hashing is off unless download_hash_algorithm is set, since segmented
+    downloads read part of the file back to hash it in order. An expected
+    digest always turns hashing on, with the digest's algorithm.
+    """
+    if expected:
+        return parse_digest(expected)[0]
+    return config.get("download_hash_algorithm") or None
+
+
+def record_checksum(project_root, path, algorithm, digest):
+    """
+    Add or replace a file's line in downloads.checksums in the project root.
+
+    Lines use the tagged format ("SHA256 (downloads/name) = <hex>") that
+    sha256sum -c and b2sum -c read from the project root; files outside it
+    are listed by absolute path.
+    """
+    name = os.path.relpath(os.path.abspath(path), os.path.abspath(project_root))
+    if name.startswith(os.pardir):
+        name = os.path.abspath(path)
+    line = f"{ALGORITHMS[algorithm][0]} ({name}) = {digest}\n"
+    manifest_path = os.path.join(project_root, MANIFEST_NAME)
+
+    with _manifest_lock:
+        lines = []
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                lines = [existing for existing in f if f" ({name}) = " not in existing]
+        lines.append(line)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def spot_check(url, file_path, samples, session=None, sample_bytes=SPOT_CHECK_BYTES, timeout=30):
+    """
+    Fetch sampled byte ranges of an uploaded file and compare them with the local copy.
+
+    The first and last bytes are always among the samples; the rest are
+    picked at random.
+
+    :param url: Direct download URL of the uploaded file.
+    :param samples: Number of ranges to check.
+    :return: A tuple (ok: bool, message: str).
+    """
+    http = session or requests
+    size = os.path.getsize(file_path)
+    if size == 0 or samples <= 0:
+        return (True, "nothing to check")
+    length = min(sample_bytes, size)
+    offsets = {0, size - length}
+    while len(offsets) < min(samples, size - length + 1):
+        offsets.add(random.randrange(0, size - length + 1))
+
+    with open(file_path, "rb") as f:
+        for offset in sorted(offsets):
+            f.seek(offset)
+            local = f.read(length)
+            headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+            with http.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code != 206:
+                    return (False, f"server answered {response.status_code} to a range request")
+                remote = response.raw.read(length + 1, decode_content=True)
+            if remote != local:
+                return (False, f"bytes {offset}-{offset + length - 1} differ from the local file")
+    return (True, f"{len(offsets)} ranges match")
@@ -0,0 +1,393 @@
+"""Per-transfer instrumentation: phase timings, bytes, retries, exported as JSON lines and Prometheus text"""
+
+import contextlib
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+METRICS_DIR = "metrics"
+JSONL_NAME = "transfers.jsonl"
+PROM_NAME = "demux.prom"
+PHASES = ("dns", "connect", "tls", "ttfb")
+RECENT_LIMIT = 1000
+
+_current_record = contextvars.ContextVar("transfer_record", default=None)
+
+
+class TransferRecord:
+    """
+    Everything measured about one transfer.
+
+    Connection phases are summed over the connections the transfer had to
+    open (a reused keep-alive connection costs nothing), and ttfb is the
+    wait between a request being fully sent and its response headers.
+    """
+
+    def __init__(self, kind, target, name):
+        self.kind = kind
+        self.target = target
+        self.name = name
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.bytes = 0
+        self.retries = 0
+        self.status = None
+        self.error = None
+        self.connections = 0
+        self.phases = {phase: 0.0 for phase in PHASES}
+        self.requests = []
+        self.parts = []
+        self._lock = threading.Lock()
+
+    def add_bytes(self, nbytes):
+        with self._lock:
+            self.bytes += nbytes
+
+    def add_connection(self, dns, connect, tls=0.0):
+        with self._lock:
+            self.connections += 1
+            self.phases["dns"] += dns
+            self.phases["connect"] += connect
+            self.phases["tls"] += tls
+
+    def add_response(self, method, host, status, ttfb):
+        with self._lock:
+            self.phases["ttfb"] += ttfb
+            self.requests.append({"method": method, "host": host, "status": status, "ttfb": round(ttfb, 6)})
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def add_part(self, part_number, nbytes, seconds, attempts):
+        with self._lock:
+            self.parts.append({"part": part_number, "bytes": nbytes, "seconds": round(seconds, 6), "attempts": attempts})
+
+    def finish(self, status, error=None):
+        self.duration = time.perf_counter() - self._started
+        self.status = status
+        self.error = error
+
+    @property
+    def throughput(self):
+        """Bytes per second over the whole transfer"""
+        return self.bytes / self.duration if self.duration else 0.0
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "target": self.target,
+                "name": self.name,
+                "started_at": self.started_at,
+                "duration": round(self.duration or 0.0, 6),
+                "bytes": self.bytes,
+                "throughput": round(self.throughput, 1),
+                "retries": self.retries,
+                "status": self.status,
+                "error": self.error,
+                "connections": self.connections,
+                "phases": {phase: round(value, 6) for phase, value in self.phases.items()},
+                "requests": list(self.requests),
+                "parts": sorted(self.parts, key=lambda part: part["part"]),
+            }
+
+
+class MetricsExporter:
+    """
+    Writes finished transfers to <project>/metrics.
+
+    transfers.jsonl gets one JSON object per transfer; demux.prom is a
+    Prometheus textfile (for node_exporter's textfile collector) with
+    counters aggregated per kind/target since this process started.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._recent = []
+        self._finished = 0
+
+    def mark(self):
+        """Position to pass to since() later"""
+        with self._lock:
+            return self._finished
+
+    def since(self, mark):
+        """Records finished after mark (within the last RECENT_LIMIT)"""
+        with self._lock:
+            return list(self._recent[max(0, len(self._recent) - (self._finished - mark)):])
+
+    def publish(self, record, project_root=None):
+        with self._lock:
+            self._finished += 1
+            self._recent.append(record)
+            del self._recent[:-RECENT_LIMIT]
+            self._aggregate(record)
+            if project_root is None:
+                return
+            directory = os.path.join(project_root, METRICS_DIR)
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, JSONL_NAME), "a") as f:
+                f.write(json.dumps(record.to_dict()) + "\n")
+            self._write_prometheus(os.path.join(directory, PROM_NAME))
+
+    def _aggregate(self, record):
+        key = (record.kind, record.target)
+        counters = self._counters.setdefault(key, {
+            "statuses": {}, "bytes": 0, "seconds": 0.0, "retries": 0,
+            "phases": {phase: 0.0 for phase in PHASES}, "throughput": 0.0,
+        })
+        counters["statuses"][record.status] = counters["statuses"].get(record.status, 0) + 1
+        counters["bytes"] += record.bytes
+        counters["seconds"] += record.duration or 0.0
+        counters["retries"] += record.retries
+        for phase, value in record.phases.items():
+            counters["phases"][phase] += value
+        if record.status == "ok":
+            counters["throughput"] = record.throughput
+
+    def _write_prometheus(self, path):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        items = sorted(self._counters.items())
+        metric("demux_transfers_total", "counter", "Finished transfers by final status.", [
+            ((("kind", kind), ("target", target), ("status", status)), count)
+            for (kind, target), c in items for status, count in sorted(c["statuses"].items())
+        ])
+        metric("demux_transfer_bytes_total", "counter", "Body bytes sent or received.", [
+            ((("kind", kind), ("target", target)), c["bytes"]) for (kind, target), c in items
+        ])
+        metric("demux_transfer_seconds_total", "counter", "Wall time spent in transfers.", [
+            ((("kind", kind), ("target", target)), round(c["seconds"], 6)) for (kind, target), c in items
+        ])
+        metric("demux_transfer_retries_total", "counter", "Retried attempts.", [
+            ((("kind", kind), ("target", target)), c["retries"]) for (kind, target), c in items
+        ])
+        metric("demux_transfer_phase_seconds_total", "counter", "Time spent per connection/request phase.", [
+            ((("kind", kind), ("target", target), ("phase", phase)), round(c["phases"][phase], 6))
+            for (kind, target), c in items for phase in PHASES
+        ])
+        metric("demux_transfer_last_throughput_bytes", "gauge", "Throughput of the last successful transfer in bytes/s.", [
+            ((("kind", kind), ("target", target)), round(c["throughput"], 1)) for (kind, target), c in items
+        ])
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_exporter = MetricsExporter()
+
+
+def get_exporter():
+    return _exporter
+
+
+def current_record():
+    """Record of the transfer running in this context (or None)"""
+    return _current_record.get()
+
+
+@contextlib.contextmanager
+def transfer(kind, target, name, project_root=None, config=None):
+    """
+    Measure a transfer; everything in this context reports into its record.
+
+    The record ends as "error" if the block raises. Callers that report
+    failures as values set it themselves with record.finish() before leaving.
+
+    :param kind: "upload" or "download".
+    :param target: Service name or hostname.
+    :param config: Config dict; metrics_enabled: false keeps records in memory only.
+    """
+    record = TransferRecord(kind, target, name)
+    token = _current_record.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        if record.status is None:
+            record.finish("cancelled" if isinstance(e, KeyboardInterrupt) else "error", str(e) or type(e).__name__)
+        raise
+    finally:
+        _current_record.reset(token)
+        if record.status is None:
+            record.finish("ok")
+        enabled = (config or {}).get("metrics_enabled", True)
+        _exporter.publish(record, project_root if enabled else None)
+
+
+def finish_outcome(record, outcome):
+    """Set a record's status from a (success, message) tuple"""
+    success, message = outcome
+    if success:
+        record.finish("ok")
+    else:
+        record.finish("cancelled" if message == "Cancelled" else "error", message)
+    return outcome
+
+
+def count_bytes(nbytes):
+    """Add body bytes to the transfer running in this context"""
+    record = _current_record.get()
+    if record is not None:
+        record.add_bytes(nbytes)
+
+
+def note_retry():
+    record = _current_record.get()
+    if record is not None:
+        record.add_retry()
+
+
+def record_part(part_number, nbytes, seconds, attempts):
+    record = _current_record.get()
+    if record is not None:
+        record.add_part(part_number, nbytes, seconds, attempts)
+
+
+class _TimedConnectionMixin:
+    """Times DNS, TCP connect, TLS and time-to-first-byte for the transfer in context"""
+
+    _connect_phases = None
+
+    def _new_conn(self):
+        record = _current_record.get()
+        if record is None:
+            return super()._new_conn()
+        started = time.perf_counter()
+        try:
+            address = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            # Let urllib3 raise its usual resolution error
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        hostname, self._dns_host = self._dns_host, address
+        try:
+            sock = super()._new_conn()
+        except OSError:
+            # The first address didn't answer: fall back to urllib3 trying all of them
+            self._dns_host = hostname
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = hostname
+        self._connect_phases = (resolved - started, time.perf_counter() - resolved)
+        return sock
+
+    def connect(self):
+        started = time.perf_counter()
+        self._connect_phases = None
+        super().connect()
+        record = _current_record.get()
+        if record is not None and self._connect_phases:
+            dns, connect = self._connect_phases
+            tls = max(0.0, time.perf_counter() - started - dns - connect) if self.scheme == "https" else 0.0
+            record.add_connection(dns, connect, tls)
+
+    def getresponse(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = super().getresponse(*args, **kwargs)
+        record = _current_record.get()
+        if record is not None:
+            record.add_response(getattr(self, "_method", None) or "", self.host, response.status,
+                                time.perf_counter() - started)
+        return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    scheme = "http"
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    scheme = "https"
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """requests adapter whose connections report their phase timings"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def mount_instrumented(session, pool_maxsize=10):
+    """Mount an InstrumentedAdapter on a requests.Session for http and https"""
+    adapter = InstrumentedAdapter(pool_connections=4, pool_maxsize=max(1, int(pool_maxsize)))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def trace_config():
+    """aiohttp TraceConfig that reports the same phases for requests on an AsyncTransferEngine"""
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        ctx.record = _current_record.get()
+        ctx.sent = ctx.dns = ctx.connect = None
+
+    async def on_dns_start(session, ctx, params):
+        ctx.dns = time.perf_counter()
+
+    async def on_dns_end(session, ctx, params):
+        if ctx.record is not None and ctx.dns is not None:
+            ctx.dns = time.perf_counter() - ctx.dns
+
+    async def on_connection_start(session, ctx, params):
+        ctx.connect = time.perf_counter()
+
+    async def on_connection_end(session, ctx, params):
+        if ctx.record is not None and ctx.connect is not None:
+            elapsed = time.perf_counter() - ctx.connect
+            dns = ctx.dns if ctx.dns is not None and ctx.dns < elapsed else 0.0
+            # aiohttp doesn't split TCP connect and TLS; both are reported as connect
+            ctx.record.add_connection(dns, elapsed - dns)
+
+    async def on_sent(session, ctx, params):
+        ctx.sent = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        if ctx.record is not None and ctx.sent is not None:
+            ctx.record.add_response(params.method, params.url.host, params.response.status,
+                                    time.perf_counter() - ctx.sent)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_dns_resolvehost_start.append(on_dns_start)
+    config.on_dns_resolvehost_end.append(on_dns_end)
+    config.on_connection_create_start.append(on_connection_start)
+    config.on_connection_create_end.append(on_connection_end)
+    config.on_request_headers_sent.append(on_sent)
+    config.on_request_chunk_sent.append(on_sent)
+    config.on_request_end.append(on_request_end)
+    return config
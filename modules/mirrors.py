@@ -0,0 +1,417 @@
+"""Downloading one file from several mirrors at once: probe them, race them, then stripe byte ranges across them"""
+
+import contextvars
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from .bandwidth import limited
+from .downloader import MIN_SEGMENT_SIZE, RemoteChangedError, _http, _prepare_manifest, probe_remote, range_validator
+from .metrics import note_retry
+from .resilience import CircuitOpenError, IncompleteTransfer, RetryPolicy, classify, get_breaker
+from .write_pipeline import WritePipeline
+
+RACE_BYTES = 1024 * 1024
+RACE_READ_SIZE = 64 * 1024
+# Once the first mirror has finished the race, the rest get this many times its time
+RACE_GRACE = 1.0
+MAX_STRIPE_SIZE = 32 * 1024 * 1024
+# Stripes per connection, so there is still work to hand out when fast mirrors finish early
+STRIPES_PER_CONNECTION = 4
+# Smaller than the default so a reader whose stripe was cut short notices after little wasted data
+BUFFER_SIZE = 256 * 1024
+BUFFER_COUNT = 32
+# Room left to the current reader of a stripe for the buffer it is filling, which the cut would waste
+STEAL_MARGIN = BUFFER_SIZE
+MIN_STEAL = 2 * BUFFER_SIZE
+IDLE_WAIT = 0.2
+RATE_SMOOTHING = 0.5
+
+
+class Mirror:
+    """
+    One URL of a mirrored download and how it has been doing.
+
+    :param info: probe_remote() result for the URL.
+    """
+
+    def __init__(self, url, info):
+        self.url = url
+        parts = urlparse(url)
+        self.host = f"{parts.hostname}:{parts.port}" if parts.port else (parts.hostname or url)
+        self.info = info
+        self.rate = None
+        self.failures = 0
+        self.retired = None
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def validator(self):
+        """If-Range value that pins this mirror's copy (its own ETag or Last-Modified)"""
+        return range_validator(self.info["etag"], self.info["last_modified"])
+
+    def retire(self, reason):
+        """Stop using this mirror; True for the caller that actually retired it"""
+        with self._lock:
+            if self.retired:
+                return False
+            self.retired = reason
+            return True
+
+    def observe(self, nbytes, seconds):
+        """Fold a finished request into the smoothed throughput estimate (bytes/s)"""
+        self.bytes += nbytes
+        if nbytes <= 0 or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        self.rate = rate if self.rate is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rate
+
+    def __repr__(self):
+        return f"Mirror({self.host!r}, rate={self.rate})"
+
+
+def probe_mirrors(urls, config, log=None):
+    """
+    Probe every URL in parallel and keep the ones that can take part.
+
+    A mirror needs byte-range support and a closed circuit breaker. The
+    size most mirrors agree on wins (ties go to the earliest URL); mirrors
+    that report another size are dropped.
+
+    :param log: Optional callable(message) for mirrors that are left out.
+    :return: List of Mirror in the order given.
+    :raises IOError: If no mirror is usable.
+    """
+    log = log or (lambda message: None)
+
+    def probe(url):
+        mirror = Mirror(url, None)
+        try:
+            get_breaker(mirror.host, config).before_call()
+            mirror.info = probe_remote(url)
+        except Exception as e:
+            mirror.retire(str(e) or type(e).__name__)
+            return mirror
+        if not mirror.info["supports_ranges"]:
+            mirror.retire("no byte-range support")
+        return mirror
+
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        probed = list(executor.map(lambda url: contextvars.copy_context().run(probe, url), urls))
+
+    usable = [mirror for mirror in probed if not mirror.retired]
+    sizes = [mirror.info["size"] for mirror in usable]
+    if sizes:
+        size = max(sizes, key=lambda candidate: (sizes.count(candidate), -sizes.index(candidate)))
+        for mirror in usable:
+            if mirror.info["size"] != size:
+                mirror.retire(f"size {mirror.info['size']} differs from the other mirrors ({size})")
+    for mirror in probed:
+        if mirror.retired:
+            log(f"⚠ Skipping mirror {mirror.host}: {mirror.retired}")
+    usable = [mirror for mirror in probed if not mirror.retired]
+    if not usable:
+        raise IOError("No usable mirror")
+    return usable
+
+
+def race_mirrors(mirrors, config, log=None):
+    """
+    Fetch the same leading range from every mirror at once.
+
+    The timings rank the mirrors and seed their throughput estimates.
+    Once the first mirror is through, the others get RACE_GRACE times its
+    time to finish, so one slow mirror doesn't hold up the start; they are
+    ranked by what they managed. The bytes must match: a mirror serving
+    different data than the majority of finishers (ties go to the earliest
+    URL) is dropped, and so is one that sent nothing in time.
+
+    :return: The surviving mirrors, fastest first.
+    """
+    log = log or (lambda message: None)
+    length = min(RACE_BYTES, mirrors[0].info["size"])
+    lock = threading.Lock()
+    deadline = [None]
+
+    def race(mirror):
+        headers = {"Range": f"bytes=0-{length - 1}"}
+        if mirror.validator:
+            headers["If-Range"] = mirror.validator
+        started = time.perf_counter()
+        data = bytearray()
+        try:
+            with _http.get(mirror.url, headers=headers, stream=True, timeout=10) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise RemoteChangedError("Remote file changed since it was probed")
+                while len(data) < length and (deadline[0] is None or time.perf_counter() < deadline[0]):
+                    chunk = response.raw.read(min(RACE_READ_SIZE, length - len(data)), decode_content=True)
+                    if not chunk:
+                        break
+                    data += chunk
+        except Exception as e:
+            mirror.retire(str(e) or type(e).__name__)
+            return None
+        elapsed = time.perf_counter() - started
+        if len(data) == length:
+            with lock:
+                if deadline[0] is None:
+                    deadline[0] = time.perf_counter() + RACE_GRACE * elapsed
+        mirror.observe(len(data), elapsed)
+        return bytes(data)
+
+    with ThreadPoolExecutor(max_workers=len(mirrors)) as executor:
+        results = list(executor.map(lambda mirror: contextvars.copy_context().run(race, mirror), mirrors))
+
+    finished = [hashlib.sha256(data).digest() for data in results if data is not None and len(data) == length]
+    if finished:
+        agreed_digest = max(finished, key=lambda digest: (finished.count(digest), -finished.index(digest)))
+        agreed = next(data for data in results if data and hashlib.sha256(data).digest() == agreed_digest)
+        for mirror, data in zip(mirrors, results):
+            if mirror.retired:
+                continue
+            if not data:
+                mirror.retire("sent nothing while the other mirrors finished")
+            elif agreed[:len(data)] != data:
+                mirror.retire("its data differs from the other mirrors")
+    for mirror in mirrors:
+        if mirror.retired:
+            log(f"⚠ Skipping mirror {mirror.host}: {mirror.retired}")
+    racing = [mirror for mirror in mirrors if not mirror.retired and mirror.rate]
+    if not finished or not racing:
+        raise IOError("No mirror finished the race")
+    return sorted(racing, key=lambda mirror: -mirror.rate)
+
+
+def stripe_size_for(size, connections):
+    """Stripe size giving every connection a few stripes, within sensible bounds"""
+    stripe = size // max(1, connections * STRIPES_PER_CONNECTION)
+    return max(MIN_SEGMENT_SIZE, min(MAX_STRIPE_SIZE, stripe))
+
+
+class StripeScheduler:
+    """
+    Hands the segments of a ResumeManifest out to mirror connections.
+
+    Connections pull the next unclaimed stripe, so faster mirrors simply
+    take more of them. Once nothing is left to hand out, an idle connection
+    takes over the tail of the in-flight stripe that would otherwise finish
+    last, sized so both sides end at about the same time; a slow or stalled
+    mirror then can't hold up the end of the download. A failed stripe goes
+    back to the front of the queue for whoever is free.
+    """
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self._lock = threading.Condition()
+        # Offset up to which each segment's data has been handed to the writer
+        self._claimed = {index: start + done for index, (start, _, done) in enumerate(manifest.segments)}
+        self._pending = deque(index for index, (start, end, done) in enumerate(manifest.segments)
+                              if start + done <= end)
+        self._owners = {}
+
+    @property
+    def finished(self):
+        with self._lock:
+            return not self._pending and not self._owners
+
+    def next(self, mirror):
+        """
+        Segment index for mirror's connection to fetch next, or None if there is nothing to do now.
+        """
+        with self._lock:
+            if self._pending:
+                index = self._pending.popleft()
+            else:
+                index = self._steal(mirror)
+            if index is not None:
+                self._owners[index] = mirror
+            return index
+
+    def _steal(self, mirror):
+        best = None
+        for index, owner in self._owners.items():
+            end = self.manifest.segments[index][1] + 1
+            remaining = end - self._claimed[index] - STEAL_MARGIN
+            if remaining < MIN_STEAL:
+                continue
+            own_rate, owner_rate = mirror.rate or 1.0, owner.rate or 0.0
+            # Take the share that makes both ends finish together
+            share = int(remaining * own_rate / (own_rate + owner_rate))
+            if share >= MIN_STEAL and (best is None or share > best[1]):
+                best = (index, share)
+        if best is None:
+            return None
+        index, share = best
+        at = self.manifest.segments[index][1] + 1 - share
+        new_index = self.manifest.split(index, at)
+        self._claimed[new_index] = at
+        return new_index
+
+    def start_offset(self, index):
+        with self._lock:
+            return self._claimed[index]
+
+    def claim(self, index, offset, nbytes):
+        """How much of nbytes at offset still belongs to segment index (WritePipeline.copy claim hook)"""
+        with self._lock:
+            end = self.manifest.segments[index][1] + 1
+            allowed = max(0, min(nbytes, end - offset))
+            self._claimed[index] = offset + allowed
+            return allowed
+
+    def complete(self, index):
+        """:return: True if the segment is fully claimed, False if it went back on the queue"""
+        with self._lock:
+            del self._owners[index]
+            done = self._claimed[index] > self.manifest.segments[index][1]
+            if not done:
+                self._pending.appendleft(index)
+            self._lock.notify_all()
+            return done
+
+    def wait(self):
+        with self._lock:
+            self._lock.wait(IDLE_WAIT)
+
+
+def _fetch_stripe(mirror, index, scheduler, pipeline, manifest, stop):
+    """Fetch whatever of a segment hasn't been claimed yet from one mirror"""
+    start = scheduler.start_offset(index)
+    end = manifest.segments[index][1]
+    headers = {"Range": f"bytes={start}-{end}"}
+    if mirror.validator:
+        headers["If-Range"] = mirror.validator
+
+    with _http.get(mirror.url, headers=headers, stream=True, timeout=10) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RemoteChangedError("Remote file changed since it was probed")
+        return pipeline.copy(
+            response, start, on_written=lambda n: manifest.advance(index, n), stop=stop,
+            claim=lambda offset, nbytes: scheduler.claim(index, offset, nbytes),
+        )
+
+
+def _mirror_worker(mirror, scheduler, pipeline, manifest, stop, config, policy, log):
+    """One connection to a mirror: fetch stripes until the download is done or the mirror is given up on"""
+    breaker = get_breaker(mirror.host, config)
+
+    def retire(reason):
+        if mirror.retire(reason) and not stop.is_set():
+            log(f"⚠ Dropping mirror {mirror.host}: {reason}")
+
+    with limited(config, mirror.host):
+        while not stop.is_set() and not mirror.retired:
+            index = scheduler.next(mirror)
+            if index is None:
+                if scheduler.finished:
+                    return
+                scheduler.wait()
+                continue
+
+            started = time.perf_counter()
+            try:
+                breaker.before_call()
+                received = _fetch_stripe(mirror, index, scheduler, pipeline, manifest, stop)
+            except (CircuitOpenError, RemoteChangedError) as e:
+                scheduler.complete(index)
+                retire(str(e))
+            except Exception as e:
+                scheduler.complete(index)
+                if stop.is_set():
+                    return
+                breaker.record_failure()
+                mirror.failures += 1
+                retryable, retry_after = classify(e)
+                delay = policy.delay(mirror.failures - 1, retry_after) if retryable else None
+                if delay is None:
+                    retire(str(e) or type(e).__name__)
+                else:
+                    log(f"↻ Mirror {mirror.host}: {e} - retrying in {delay:.1f}s")
+                    note_retry()
+                    stop.wait(delay)
+            else:
+                mirror.observe(received, time.perf_counter() - started)
+                if scheduler.complete(index):
+                    breaker.record_success()
+                    mirror.failures = 0
+                else:
+                    # The response ended early; the rest of the stripe is back on the queue
+                    mirror.failures += 1
+                    breaker.record_failure()
+                    if policy.delay(mirror.failures - 1) is None:
+                        retire(str(IncompleteTransfer(f"Incomplete stripe from {mirror.host}")))
+
+
+def download_mirrored(urls, part_path, manifest_path, config, task, hasher_factory=None, log=None):
+    """
+    Fetch one file from several mirrors into part_path.
+
+    The mirrors are probed (size and range support must agree), raced on
+    the same leading range (which ranks them and checks they serve the
+    same bytes) and then striped: every mirror gets mirror_connections
+    connections from config, fastest mirrors first, and the file is cut
+    into stripes that the connections pull as they become free. Work moves
+    away from slow mirrors by stealing the tails of their stripes and away
+    from failing ones by requeueing their stripes; a mirror that keeps
+    failing (per the retry policy) is dropped for the rest of the download.
+
+    Progress is kept in the usual <target>.part.json manifest under the
+    first URL, so an interrupted download resumes, with or without mirrors.
+
+    :param urls: Mirror URLs of the same file; the first one names the resume manifest.
+    :param task: Progress task to advance.
+    :param hasher_factory: Optional callable(manifest) -> OrderedHasher for the file.
+    :param log: Optional callable(message) for mirror events.
+    :return: A tuple (manifest, hasher); the manifest is complete on return.
+    :raises IOError: If every mirror dropped out before the file was complete.
+    """
+    log = log or (lambda message: None)
+    mirrors = probe_mirrors(urls, config, log)
+    per_mirror = max(1, int(config.get("mirror_connections", 2)))
+    primary = next((mirror for mirror in mirrors if mirror.url == urls[0]), mirrors[0])
+    size = primary.info["size"]
+    stripes = max(1, size // stripe_size_for(size, per_mirror * len(mirrors)))
+    manifest = _prepare_manifest(primary.url, part_path, manifest_path, primary.info, stripes)
+    hasher = hasher_factory(manifest) if hasher_factory else None
+
+    mirrors = race_mirrors(mirrors, config, log)
+    log("→ Mirrors, fastest first: " + ", ".join(
+        f"{mirror.host} ({mirror.rate / 1024 / 1024:.1f} MB/s)" for mirror in mirrors
+    ))
+
+    task.update(completed=manifest.completed_bytes, total=size)
+    scheduler = StripeScheduler(manifest)
+    policy = RetryPolicy.from_config(config)
+    stop = threading.Event()
+    pipeline = WritePipeline(part_path, on_progress=task.advance, buffer_size=BUFFER_SIZE, buffer_count=BUFFER_COUNT,
+                             hasher=hasher)
+    try:
+        # Fastest mirror's connections go first, so they pick up the leading stripes
+        workers = [mirror for _ in range(per_mirror) for mirror in mirrors]
+        with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, _mirror_worker, mirror, scheduler, pipeline,
+                                manifest, stop, config, policy, log)
+                for mirror in workers
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+    finally:
+        try:
+            pipeline.close()
+        finally:
+            manifest.save()
+
+    if manifest.completed_bytes != size:
+        reasons = "; ".join(f"{mirror.host}: {mirror.retired}" for mirror in mirrors if mirror.retired)
+        raise IOError(f"All mirrors failed with {size - manifest.completed_bytes} bytes to go ({reasons})")
+    return manifest, hasher
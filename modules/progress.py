@@ -0,0 +1,265 @@
+"""
+One progress display for every transfer.
+
+Transfers only bump byte counters (advance() is an add under a lock);
+a single background thread renders all of them at a fixed rate, as a
+rich live display on a terminal, as JSON lines on stderr, or not at all.
+"""
+
+import contextlib
+import contextvars
+import json
+import sys
+import threading
+import time
+
+MODES = ("auto", "live", "json", "quiet")
+DEFAULT_REFRESH_HZ = 4
+DEFAULT_JSON_INTERVAL = 5.0
+# Finished bars kept on screen while other transfers are still running
+KEEP_FINISHED = 8
+
+_current_task = contextvars.ContextVar("progress_task", default=None)
+_task_sink = contextvars.ContextVar("progress_sink", default=None)
+
+
+class ProgressTask:
+    """Byte counter of one transfer, read by the display thread"""
+
+    def __init__(self, description, total=None, completed=0):
+        self.description = description
+        self.total = total
+        self.completed = completed
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def advance(self, nbytes):
+        with self._lock:
+            self.completed += nbytes
+
+    def update(self, completed=None, total=None):
+        with self._lock:
+            if completed is not None:
+                self.completed = completed
+            if total is not None:
+                self.total = total
+
+    def snapshot(self):
+        with self._lock:
+            return self.completed, self.total
+
+
+class ProgressDisplay:
+    """
+    Renders all open ProgressTasks from one thread.
+
+    The thread starts with the first task and stops once every task has
+    closed, leaving the last frame on screen.
+    """
+
+    def __init__(self):
+        self.mode = "auto"
+        self.refresh_hz = DEFAULT_REFRESH_HZ
+        self.json_interval = DEFAULT_JSON_INTERVAL
+        self._tasks = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def configure(self, mode=None, refresh_hz=None, json_interval=None):
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"Unknown progress mode '{mode}' (expected one of {', '.join(MODES)})")
+            self.mode = mode
+        if refresh_hz:
+            self.refresh_hz = max(0.5, float(refresh_hz))
+        if json_interval:
+            self.json_interval = max(0.5, float(json_interval))
+
+    @property
+    def effective_mode(self):
+        """live on a terminal, quiet otherwise, unless a mode was set explicitly"""
+        if self.mode != "auto":
+            return self.mode
+        return "live" if sys.stdout.isatty() else "quiet"
+
+    def add(self, task):
+        with self._lock:
+            self._tasks.append(task)
+            if self._thread is None and self.effective_mode != "quiet":
+                self._thread = threading.Thread(target=self._run, args=(self.effective_mode,),
+                                                name="progress-display", daemon=True)
+                self._thread.start()
+
+    def close(self, task):
+        with self._lock:
+            task.finished = time.monotonic()
+            if task in self._tasks and self._thread is None:
+                self._tasks.remove(task)
+            if all(t.finished for t in self._tasks):
+                self._wake.set()
+
+    def wait_idle(self):
+        """Block until the display thread has drawn its last frame"""
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self, mode):
+        renderer = _LiveRenderer() if mode == "live" else _JsonRenderer()
+        interval = 1 / self.refresh_hz if mode == "live" else self.json_interval
+        try:
+            while True:
+                self._wake.wait(interval)
+                with self._lock:
+                    self._wake.clear()
+                    tasks = list(self._tasks)
+                    done = all(t.finished for t in tasks)
+                    if done:
+                        # Anything added from here on starts a new thread
+                        self._tasks.clear()
+                        self._thread = None
+                    else:
+                        finished = [t for t in tasks if t.finished]
+                        for task in finished[:-KEEP_FINISHED or None]:
+                            self._tasks.remove(task)
+                renderer.render(tasks)
+                if done:
+                    return
+        finally:
+            renderer.stop()
+
+
+class _LiveRenderer:
+    def __init__(self):
+        # rich is only needed when there is a terminal to draw on
+        from rich.console import Console
+        from rich.progress import Progress, BarColumn, DownloadColumn, TextColumn, TransferSpeedColumn, TimeRemainingColumn
+
+        self._progress = Progress(
+            TextColumn("[cyan]{task.description}"),
+            BarColumn(),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+            TimeRemainingColumn(),
+            console=Console(),
+            auto_refresh=False,
+        )
+        self._ids = {}
+        self._progress.start()
+
+    def render(self, tasks):
+        seen = set()
+        for task in tasks:
+            completed, total = task.snapshot()
+            task_id = self._ids.get(task)
+            if task_id is None:
+                task_id = self._ids[task] = self._progress.add_task(task.description, total=total)
+            self._progress.update(task_id, completed=completed, total=total)
+            seen.add(task)
+        for task in [t for t in self._ids if t not in seen]:
+            self._progress.remove_task(self._ids.pop(task))
+        self._progress.refresh()
+
+    def stop(self):
+        self._progress.stop()
+
+
+class _JsonRenderer:
+    """One JSON line per open transfer each interval, plus one when it finishes"""
+
+    def __init__(self):
+        self._last = {}
+        self._reported = set()
+
+    def render(self, tasks):
+        now = time.monotonic()
+        for task in tasks:
+            if task in self._reported:
+                continue
+            completed, total = task.snapshot()
+            last_time, last_completed = self._last.get(task, (task.started, 0))
+            line = {"event": "done" if task.finished else "progress", "task": task.description,
+                    "completed": completed, "total": total}
+            if task.finished:
+                elapsed = task.finished - task.started
+                line["seconds"] = round(elapsed, 3)
+                line["rate"] = round(completed / elapsed) if elapsed > 0 else None
+                self._reported.add(task)
+                self._last.pop(task, None)
+            else:
+                line["rate"] = round((completed - last_completed) / (now - last_time)) if now > last_time else None
+                self._last[task] = (now, completed)
+            sys.stderr.write(json.dumps(line) + "\n")
+        sys.stderr.flush()
+
+    def stop(self):
+        pass
+
+
+_display = ProgressDisplay()
+
+
+def get_display():
+    return _display
+
+
+def configure_from_config(config):
+    """Apply progress_mode and progress_refresh_hz from a config dict"""
+    _display.configure(config.get("progress_mode") or "auto", config.get("progress_refresh_hz"))
+    return _display
+
+
+@contextlib.contextmanager
+def track(description, total=None, completed=0):
+    """
+    Show a transfer on the progress display for the duration of the block.
+
+    Byte counts reported with advance() in this context go to its task.
+    """
+    task = ProgressTask(description, total, completed)
+    sink = _task_sink.get()
+    if sink is not None:
+        sink.append(task)
+    _display.add(task)
+    token = _current_task.set(task)
+    try:
+        yield task
+    finally:
+        _current_task.reset(token)
+        _display.close(task)
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Gather the tasks tracked in this context, e.g. everything one daemon job shows.
+
+    Yields the list, which keeps growing while the block runs.
+    """
+    tasks = []
+    token = _task_sink.set(tasks)
+    try:
+        yield tasks
+    finally:
+        _task_sink.reset(token)
+
+
+def current_task():
+    """Progress task of the transfer running in this context (or None)"""
+    return _current_task.get()
+
+
+def advance(nbytes):
+    """Count nbytes towards the transfer running in this context"""
+    task = _current_task.get()
+    if task is not None:
+        task.advance(nbytes)
+
+
+def update(completed=None, total=None):
+    """Set the progress of the transfer running in this context"""
+    task = _current_task.get()
+    if task is not None:
+        task.update(completed, total)
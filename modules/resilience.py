@@ -0,0 +1,388 @@
+"""Classified retries with backoff, and per-service circuit breakers"""
+
+import asyncio
+import contextvars
+import email.utils
+import http.client
+import random
+import sys
+import threading
+import time
+import requests
+import urllib3
+from .metrics import mount_instrumented, note_retry
+
+# Statuses worth another try: the request may well succeed later
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+
+_current_attempt = contextvars.ContextVar("transfer_attempt", default=None)
+
+
+class IncompleteTransfer(IOError):
+    """The connection ended before all announced bytes arrived"""
+
+
+class HTTPStatusError(IOError):
+    """
+    A request answered with a 4xx/5xx status, outside of requests.
+
+    Carries status, headers, url and the response itself like requests'
+    HTTPError, so classify() and the services' error messages treat
+    failures from the async engine the same way.
+    """
+
+    def __init__(self, response):
+        kind = "Client" if response.status < 500 else "Server"
+        reason = f": {response.reason}" if getattr(response, "reason", None) else ""
+        super().__init__(f"{response.status} {kind} Error{reason} for url: {response.url}")
+        self.response = response
+        self.status = response.status
+        self.headers = response.headers
+        self.url = response.url
+
+
+class CircuitOpenError(Exception):
+    """A service or host failed repeatedly and is not being contacted for a while"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} is unavailable after repeated failures, not retrying for {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value):
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _status_of(error):
+    response = getattr(error, "response", None)
+    if response is not None:
+        return getattr(response, "status_code", None)
+    return getattr(error, "status", None)
+
+
+def classify(failure):
+    """
+    Decide whether a failed request is worth retrying.
+
+    :param failure: An exception, or a response (requests or TransferResponse) with an error status.
+    :return: A tuple (retryable: bool, retry_after: seconds or None).
+    """
+    if isinstance(failure, BaseException):
+        status = _status_of(failure)
+        if status is not None:
+            headers = getattr(getattr(failure, "response", None), "headers", None) or getattr(failure, "headers", None) or {}
+            return status in RETRYABLE_STATUS, parse_retry_after(headers.get("Retry-After"))
+        transient = (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            urllib3.exceptions.ProtocolError,
+            http.client.IncompleteRead,
+            asyncio.TimeoutError,
+            ConnectionError,
+            TimeoutError,
+            IncompleteTransfer,
+        )
+        # aiohttp is only loaded by the async engine; its errors can't exist before that
+        aiohttp = sys.modules.get("aiohttp")
+        if aiohttp is not None:
+            transient += (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+        return isinstance(failure, transient), None
+    status = getattr(failure, "status_code", None) or getattr(failure, "status", None)
+    return status in RETRYABLE_STATUS, parse_retry_after(failure.headers.get("Retry-After"))
+
+
+def is_request_error(error):
+    """Whether an exception is a failed HTTP request, from requests or from the async engine"""
+    errors = (requests.exceptions.RequestException, HTTPStatusError, asyncio.TimeoutError)
+    aiohttp = sys.modules.get("aiohttp")
+    if aiohttp is not None:
+        errors += (aiohttp.ClientError,)
+    return isinstance(error, errors)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    A Retry-After from the server replaces the computed delay; if it asks
+    for longer than max_delay the request is not retried at all.
+    """
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("max_retries", DEFAULT_MAX_RETRIES),
+            config.get("retry_base_delay", DEFAULT_BASE_DELAY),
+            config.get("retry_max_delay", DEFAULT_MAX_DELAY),
+        )
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt+1, or None to give up"""
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a service or host is down.
+
+    After `threshold` transient failures in a row the breaker opens and
+    every call is refused for `cooldown` seconds. After that, calls are
+    let through again (half-open): a success closes the breaker, while a
+    single failure opens it for another cooldown.
+    """
+
+    def __init__(self, name, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return "open"
+            return "half-open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through right now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._opened_at is not None or self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, config=None):
+    """Shared breaker for a service name or hostname (case-insensitive)"""
+    config = config or {}
+    with _breakers_lock:
+        breaker = _breakers.get(name.lower())
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                config.get("breaker_failure_threshold", DEFAULT_BREAKER_THRESHOLD),
+                config.get("breaker_cooldown", DEFAULT_BREAKER_COOLDOWN),
+            )
+            _breakers[name.lower()] = breaker
+        return breaker
+
+
+class Attempt:
+    """What the HTTP layer saw while one upload attempt ran"""
+
+    def __init__(self):
+        self.transient = False
+        self.retry_after = None
+
+
+def note_failure(failure):
+    """
+    Report a failed request to the attempt running in this context.
+
+    Called by the HTTP layer (ResilientSession, AsyncTransferEngine), so
+    services that turn errors into (False, message) tuples can still be
+    retried on the right failures only.
+    """
+    attempt = _current_attempt.get()
+    if attempt is None:
+        return
+    retryable, retry_after = classify(failure)
+    if retryable:
+        attempt.transient = True
+        attempt.retry_after = retry_after
+
+
+class ResilientSession(requests.Session):
+    """requests.Session that reports transient failures to the running attempt and timings to its transfer record"""
+
+    def __init__(self):
+        super().__init__()
+        mount_instrumented(self)
+
+    def request(self, method, url, *args, **kwargs):
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            note_failure(e)
+            raise
+        if response.status_code in RETRYABLE_STATUS:
+            note_failure(response)
+        return response
+
+
+def _wait(delay):
+    # Local import: the uploader package imports this module
+    from .uploader.engine import current_cancel_event
+    event = current_cancel_event()
+    if event is not None:
+        return not event.wait(delay)
+    time.sleep(delay)
+    return True
+
+
+def retry_outcome(func, name, policy=None, config=None):
+    """
+    Run an upload returning (success, message), retrying transient failures.
+
+    Only failures the HTTP layer classified as transient are retried;
+    anything else (bad credentials, 4xx, a cancelled upload) is returned
+    at once. The service's circuit breaker is consulted before every try.
+    """
+    policy = policy or RetryPolicy()
+    breaker = get_breaker(name, config)
+    attempt_number = 0
+    while True:
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            return (False, f"Error: {e}")
+        attempt = Attempt()
+        token = _current_attempt.set(attempt)
+        try:
+            outcome = func()
+        finally:
+            _current_attempt.reset(token)
+        if outcome[0] or not attempt.transient:
+            breaker.record_success()
+            return outcome
+        breaker.record_failure()
+        delay = policy.delay(attempt_number, attempt.retry_after)
+        if delay is None or not _wait(delay):
+            return outcome
+        note_retry()
+        attempt_number += 1
+
+
+async def retry_outcome_async(coro_func, name, policy=None, config=None):
+    """Coroutine version of retry_outcome()"""
+    policy = policy or RetryPolicy()
+    breaker = get_breaker(name, config)
+    attempt_number = 0
+    while True:
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            return (False, f"Error: {e}")
+        attempt = Attempt()
+        token = _current_attempt.set(attempt)
+        try:
+            outcome = await coro_func()
+        finally:
+            _current_attempt.reset(token)
+        if outcome[0] or not attempt.transient:
+            breaker.record_success()
+            return outcome
+        breaker.record_failure()
+        delay = policy.delay(attempt_number, attempt.retry_after)
+        if delay is None:
+            return outcome
+        await asyncio.sleep(delay)
+        note_retry()
+        attempt_number += 1
+
+
+def call(func, name, policy=None, config=None, on_retry=None):
+    """
+    Call func(), retrying when it raises a transient error.
+
+    :param on_retry: Optional callable(error, delay) fired before each retry.
+    :raises CircuitOpenError: If the breaker for name is open.
+    """
+    policy = policy or RetryPolicy()
+    breaker = get_breaker(name, config)
+    attempt_number = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            retryable, retry_after = classify(e)
+            if not retryable:
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            delay = policy.delay(attempt_number, retry_after)
+            if delay is None:
+                raise
+            if on_retry:
+                on_retry(e, delay)
+            time.sleep(delay)
+            note_retry()
+            attempt_number += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+async def call_async(coro_func, name, policy=None, config=None):
+    """Coroutine version of call()"""
+    policy = policy or RetryPolicy()
+    breaker = get_breaker(name, config)
+    attempt_number = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = await coro_func()
+        except Exception as e:
+            retryable, retry_after = classify(e)
+            if not retryable:
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            delay = policy.delay(attempt_number, retry_after)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            note_retry()
+            attempt_number += 1
+            continue
+        breaker.record_success()
+        return result
@@ -38,3 +38,54 @@ def select_multiple(items, title="Select items:", indicator="►"):
         selected = [item[0] for item in selected]
     
     return selected
+
+
+PAGE_SIZE = 50
+
+
+def select_page(items, title="Select an item:", label=str, actions=(), page_size=PAGE_SIZE, indicator="►"):
+    """
+    Selection over a long list, one page at a time
+    
+    Args:
+        items: List of items to select from
+        title: Selection prompt title
+        label: Callable giving the text shown for an item
+        actions: (key, text) pairs listed below every page
+        page_size: Items per page
+        indicator: Indicator character (default: ►)
+    
+    Returns:
+        (item, None) for a picked item or (None, key) for an action. The
+        item is returned by position, so items with the same label can't
+        be mixed up.
+    """
+    pages = max(1, -(-len(items) // page_size))
+    page = 0
+    while True:
+        start = page * page_size
+        options = [("item", item) for item in items[start:start + page_size]]
+        if page > 0:
+            options.append(("page", page - 1))
+        if page + 1 < pages:
+            options.append(("page", page + 1))
+        options.extend(("action", key) for key, _ in actions)
+
+        texts = dict(actions)
+        labels = []
+        for kind, value in options:
+            if kind == "item":
+                labels.append(label(value))
+            elif kind == "page":
+                labels.append("‹ Previous page" if value < page else "Next page ›")
+            else:
+                labels.append(texts[value])
+
+        page_title = f"{title} (page {page + 1} of {pages})" if pages > 1 else title
+        _, index = pick_lib(labels, page_title, indicator=indicator)
+        kind, value = options[index]
+        if kind == "item":
+            return value, None
+        if kind == "action":
+            return None, value
+        page = value
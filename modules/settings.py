@@ -1,23 +1,50 @@
 import json
 import os
-from rich.console import Console
-from rich.panel import Panel
-from .selection import select_item
-
-console = Console()
 
 def get_config(project_root):
     config_path = os.path.join(project_root, "config.json")
     if not os.path.exists(config_path):
+        from .uploader.registry import get_services
+
         default_config = {
-            "gofile_api_key": None,
-            "vikingfiles_api_key": None,
-            "pixeldrain_api_key": None,
-            "catbox_api_key": None,
-            "buzzheavier_api_key": None,
-            "mixdrop_email": None,
-            "mixdrop_api_key": None
+            field["key"]: None
+            for service in get_services()
+            for field in service.config_schema
         }
+        default_config.update({
+            "max_concurrent_uploads": 4,
+            "vikingfiles_part_concurrency": 4,
+            "download_connections": 4,
+            "upload_dedup": True,
+            "transload_buffer_mb": 16,
+            "bandwidth_limit_kbps": 0,
+            "bandwidth_limits_kbps": {},
+            "transfer_priority": "normal",
+            "max_retries": 3,
+            "retry_base_delay": 1.0,
+            "retry_max_delay": 60.0,
+            "breaker_failure_threshold": 5,
+            "breaker_cooldown": 30.0,
+            "metrics_enabled": True,
+            "progress_mode": "auto",
+            "progress_refresh_hz": 4,
+            "gofile_server_ttl": 600,
+            "gofile_probe_servers": False,
+            "daemon_port": 8765,
+            "daemon_jobs": 8,
+            "daemon_transload_jobs": 2,
+            "daemon_keep_jobs": 1000,
+            # "sha256" or "blake2b" to hash every download and list it in downloads.checksums.
+            # Off by default: besides ~1 s of CPU per GB, a segmented or mirrored download reads
+            # the bytes that arrive ahead of the hash frontier back from disk (about (N-1)/N of
+            # the file for N connections). An expected digest turns hashing on for that download.
+            "download_hash_algorithm": None,
+            "checksum_manifest": True,
+            "upload_spot_check": 0,
+            "upload_size_limits_mb": {},
+            "split_volume_mb": 0,
+            "mirror_connections": 2
+        })
         save_config(project_root, default_config)
         return default_config
     with open(config_path, 'r') as f:
@@ -30,23 +57,22 @@ def save_config(project_root, config):
 
 def handle_settings_cli(project_root):
     """Handles API key settings (CLI version)"""
+    # Loaded here so scripted runs that only read the config skip the UI and service imports
+    from rich.console import Console
+    from rich.panel import Panel
+    from .selection import select_item
+    from .uploader.registry import get_services
+
+    console = Console()
     console.print(Panel("Configure API Keys", style="bold cyan", expand=False))
     
     config = get_config(project_root)
     
     try:
-        services = [
-            "Gofile",
-            "Vikingfiles",
-            "Pixeldrain",
-            "Catbox",
-            "Buzzheavier",
-            "Mixdrop",
-            "Back"
-        ]
-        
-        selected_service, _ = select_item(
-            services,
+        services = get_services()
+
+        selected_service, index = select_item(
+            [service.name for service in services] + ["Back"],
             "Select a service to configure:",
             indicator="►"
         )
@@ -54,41 +80,23 @@ def handle_settings_cli(project_root):
         if selected_service == "Back":
             return
 
-        if selected_service == "Mixdrop":
-            current_email = config.get("mixdrop_email") or "Not set"
-            new_email = input(f"Enter API E-Mail for Mixdrop (current: {current_email}): ").strip()
-            
-            current_key = config.get("mixdrop_api_key") or "Not set"
-            if isinstance(current_key, str) and len(current_key) > 4:
-                current_key = f"****{current_key[-4:]}"
-            
-            new_key = input(f"Enter API Key for Mixdrop (current: {current_key}): ").strip()
-
-            if new_email:
-                config["mixdrop_email"] = new_email
-            if new_key:
-                config["mixdrop_api_key"] = new_key
-            
-            if new_email or new_key:
-                save_config(project_root, config)
-                console.print(f"[bold green]✓ Settings for {selected_service} updated.[/bold green]")
-            else:
-                console.print("[bold yellow]⚠ No changes made.[/bold yellow]")
-        else:
-            api_key_name = f"{selected_service.lower()}_api_key"
-            
-            current_key = config.get(api_key_name) or "Not set"
-            if isinstance(current_key, str) and len(current_key) > 4:
-                current_key = f"****{current_key[-4:]}"
+        service = services[index]
+        changed = False
+        for field in service.config_schema:
+            current_value = config.get(field["key"]) or "Not set"
+            if field.get("secret") and isinstance(current_value, str) and len(current_value) > 4:
+                current_value = f"****{current_value[-4:]}"
 
-            new_key = input(f"Enter API key for {selected_service} (current: {current_key}): ").strip()
+            new_value = input(f"Enter {field['label']} for {service.name} (current: {current_value}): ").strip()
+            if new_value:
+                config[field["key"]] = new_value
+                changed = True
 
-            if new_key:
-                config[api_key_name] = new_key
-                save_config(project_root, config)
-                console.print(f"[bold green]✓ API key for {selected_service} updated.[/bold green]")
-            else:
-                console.print("[bold yellow]⚠ No changes made.[/bold yellow]")
+        if changed:
+            save_config(project_root, config)
+            console.print(f"[bold green]✓ Settings for {service.name} updated.[/bold green]")
+        else:
+            console.print("[bold yellow]⚠ No changes made.[/bold yellow]")
 
     except KeyboardInterrupt:
         console.print("[bold red]\n✗ Operation cancelled.[/bold red]")
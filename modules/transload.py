@@ -0,0 +1,284 @@
+"""Transload: stream a remote file straight into upload services without saving it first"""
+
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import requests
+from urllib.parse import urlparse
+from rich.console import Console
+from rich.panel import Panel
+from .settings import get_config
+from .selection import select_multiple
+from .bandwidth import limited, bind_throttle, throttle
+from .metrics import count_bytes, get_exporter, transfer
+from .resilience import RetryPolicy, call
+from .downloader import _http, body_length
+from .progress import advance, track
+from .uploader.engine import UploadEngine, check_cancelled
+from .uploader.registry import get_services, get_service
+from .uploader.core import print_upload_summary
+
+console = Console()
+
+TEE_CHUNK_SIZE = 1024 * 1024
+FEED_POLL_INTERVAL = 0.5
+
+_EOF = object()
+
+
+class TransloadAborted(Exception):
+    """Every consumer of a transload has gone away, so the source is no longer read"""
+
+
+class TeeStream:
+    """
+    One consumer's read-once view of the source download.
+
+    Chunks arrive through a bounded queue, so a slow uploader holds back
+    the source instead of piling data up in memory. The len attribute is
+    the number of bytes still to come, which is what requests and
+    MultipartBody size a body by.
+    """
+
+    def __init__(self, size, max_chunks):
+        self._queue = queue.Queue(max(1, max_chunks))
+        self._chunk = b""
+        self._offset = 0
+        self._eof = False
+        self._remaining = size
+        self.closed = False
+
+    @property
+    def len(self):
+        return self._remaining
+
+    def feed(self, item, stop):
+        """Queue a chunk (or _EOF / an exception); returns False once the reader is gone"""
+        while not self.closed and not stop.is_set():
+            try:
+                self._queue.put(item, timeout=FEED_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _next_chunk(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=FEED_POLL_INTERVAL)
+                break
+            except queue.Empty:
+                check_cancelled()
+        if item is _EOF:
+            self._eof = True
+            if self._remaining:
+                raise IOError(f"Source ended {self._remaining} bytes early")
+            return False
+        if isinstance(item, BaseException):
+            raise item
+        self._chunk, self._offset = item, 0
+        return True
+
+    def read(self, size=-1):
+        check_cancelled()
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(TEE_CHUNK_SIZE), b""))
+        while self._offset >= len(self._chunk):
+            if self._eof or not self._next_chunk():
+                return b""
+        if self._offset == 0 and size >= len(self._chunk):
+            data = self._chunk
+        else:
+            data = self._chunk[self._offset:self._offset + size]
+        self._offset += len(data)
+        self._remaining -= len(data)
+        throttle(len(data))
+        count_bytes(len(data))
+        advance(len(data))
+        return data
+
+    def close(self):
+        # The tee checks this flag and stops feeding us
+        self.closed = True
+
+
+class _Tee(threading.Thread):
+    """Reads the source response once and hands every chunk to all consumers"""
+
+    def __init__(self, response, streams, spill_path=None, throttle=None, record_args=None):
+        super().__init__(name="transload-tee", daemon=True)
+        self._response = response
+        self._record_args = record_args
+        self._streams = streams
+        self._spill_path = spill_path
+        self._throttle = throttle
+        self.on_progress = None
+        self.stop = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+
+    def _broadcast(self, item):
+        for stream in self._streams:
+            stream.feed(item, self.stop)
+
+    def run(self):
+        bind_throttle(self._throttle)
+        with transfer("download", *self._record_args) as record:
+            self._run(record)
+
+    def _run(self, record):
+        spill = open(self._spill_path, 'wb') if self._spill_path else None
+        try:
+            for chunk in self._response.iter_content(TEE_CHUNK_SIZE):
+                if self.stop.is_set():
+                    raise TransloadAborted("Transload stopped")
+                throttle(len(chunk))
+                count_bytes(len(chunk))
+                self._broadcast(chunk)
+                if spill:
+                    spill.write(chunk)
+                elif all(stream.closed for stream in self._streams):
+                    raise TransloadAborted("All uploads stopped reading the source")
+                if self.on_progress:
+                    self.on_progress(len(chunk))
+            self._broadcast(_EOF)
+        except BaseException as e:
+            self.error = e
+            record.finish("cancelled" if isinstance(e, TransloadAborted) else "error", str(e))
+            self._broadcast(e if isinstance(e, Exception) else TransloadAborted("Transload stopped"))
+        finally:
+            if spill:
+                spill.close()
+            self._response.close()
+            self.finished.set()
+
+
+def _stream_job(service, stream, file_name, config, project_root):
+    try:
+        return service.upload_stream_file(stream, file_name, config, project_root)
+    finally:
+        stream.close()
+
+
+def _spill_job(service, tee, spill_path, config, project_root):
+    while not tee.finished.wait(FEED_POLL_INTERVAL):
+        check_cancelled()
+    if tee.error is not None:
+        return (False, f"Error: Source download failed: {tee.error}")
+    return service.upload_file(spill_path, config, project_root)
+
+
+def transload(project_root, url, service_names, file_name=None, on_result=None):
+    """
+    Mirror a URL to upload services while it downloads.
+
+    The source is fetched once; services with an upload_stream() read it
+    as it arrives, each through a bounded buffer (transload_buffer_mb from
+    config). Services that need a file on disk (Vikingfiles multipart, a
+    file over the service's size limit, or every service when the source
+    doesn't send Content-Length) get a temp copy that is uploaded once the
+    download finishes and deleted afterwards.
+
+    :param service_names: Display names of the services to upload to.
+    :param file_name: Name for the uploaded file (default: taken from the URL).
+    :param on_result: Optional callable(result_dict) fired as each service finishes.
+    :return: List of {"service", "success", "message"} dicts in service order.
+    """
+    config = get_config(project_root)
+    file_name = file_name or os.path.basename(url.split('?')[0]) or "downloaded_file"
+    max_chunks = int(config.get("transload_buffer_mb", 16) * 1024 * 1024) // TEE_CHUNK_SIZE
+
+    host = urlparse(url).hostname or url
+
+    def fetch():
+        response = _http.get(url, stream=True, timeout=10)
+        try:
+            response.raise_for_status()
+        except BaseException:
+            response.close()
+            raise
+        return response
+
+    # The source is fetched like any download: asking for the file's own bytes, with retries and the host's breaker
+    with call(fetch, host, RetryPolicy.from_config(config), config) as response:
+        size = body_length(response.headers)
+
+        services = [get_service(name) for name in service_names]
+        # A file over a service's size limit goes up as volumes, which are cut from the temp copy
+        streaming = [s for s in services if s and s.upload_stream and size is not None
+                     and size <= (s.max_file_size(config) or size)]
+        spilling = [s for s in services if s and s not in streaming]
+
+        spill_dir = tempfile.mkdtemp(prefix="demux-transload-") if spilling else None
+        try:
+            spill_path = os.path.join(spill_dir, file_name) if spill_dir else None
+            streams = {service.name: TeeStream(size, max_chunks) for service in streaming}
+            with limited(config, host) as source_throttle:
+                tee = _Tee(response, list(streams.values()), spill_path, source_throttle,
+                           record_args=(host, file_name, project_root, config))
+
+            # Every streaming consumer must be running at once or the tee would block on an idle one
+            engine = UploadEngine(max_workers=len(service_names))
+            for name, service in zip(service_names, services):
+                if service is None:
+                    engine.submit(name, lambda: (False, "Service not implemented or unknown error."))
+                elif service.name in streams:
+                    engine.submit(name, _stream_job, service, streams[service.name], file_name, config, project_root)
+                else:
+                    engine.submit(name, _spill_job, service, tee, spill_path, config, project_root)
+
+            with track(f"Transloading {file_name}", size) as task:
+                tee.on_progress = task.advance
+                tee.start()
+                try:
+                    results = engine.run(on_result=on_result)
+                finally:
+                    tee.stop.set()
+                    tee.join()
+        finally:
+            if spill_dir:
+                shutil.rmtree(spill_dir, ignore_errors=True)
+    return results
+
+
+def handle_transload_cli(project_root):
+    """Handles the transload flow (CLI version)"""
+    console.print(Panel("Transload URL", style="bold cyan", expand=False))
+
+    try:
+        url = input("\nEnter the direct URL of the file to transload: ").strip()
+        if not url:
+            console.print("[bold red]✗ URL cannot be empty.[/bold red]")
+            return
+
+        default_filename = os.path.basename(url.split('?')[0]) or "downloaded_file"
+        custom_filename = input(f"Enter custom filename (or press Enter for '{default_filename}'): ").strip()
+
+        selected_services = select_multiple(
+            [service.name for service in get_services()],
+            f"Select services to transload '{custom_filename or default_filename}' to (Space to select, Enter to confirm):",
+            indicator="►"
+        )
+        if not selected_services:
+            console.print("[bold yellow]⚠ No services selected.[/bold yellow]")
+            return
+
+        console.print(f"[bold]→ Transloading to {', '.join(selected_services)}...[/bold]")
+        mark = get_exporter().mark()
+        results = transload(
+            project_root, url, selected_services, custom_filename or None,
+            on_result=lambda res: console.print(
+                f"[bold]{'✓' if res['success'] else '✗'} {res['service']} finished.[/bold]"
+            )
+        )
+        print_upload_summary(results, get_exporter().since(mark))
+        console.print("[bold green]✓ Transload complete.[/bold green]")
+
+    except KeyboardInterrupt:
+        console.print("[bold red]\n✗ Operation cancelled by user.[/bold red]")
+    except requests.exceptions.RequestException as e:
+        console.print(f"[bold red]✗ Error fetching source: {e}[/bold red]")
+    except Exception as e:
+        console.print(f"[bold red]✗ Error: {e}[/bold red]")
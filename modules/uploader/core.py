@@ -1,65 +1,62 @@
 import os
-from .services import gofile
-from .services import vikingfiles
-from .services import pixeldrain
-from .services import catbox
-from .services import buzzheavier
-from .services import mixdrop
+from .engine import UploadEngine
+from .registry import get_services, get_service
+from .dedup import UploadIndex
 from ..settings import get_config
-from ..selection import select_item, select_multiple
+from ..metrics import get_exporter
+from ..selection import select_multiple, select_page
+from ..file_index import SORT_KEYS, get_index
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
-from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
 
 console = Console()
 
+SORT_LABELS = {"name": "name", "size": "largest first", "age": "newest first"}
+
 def handle_upload_cli(project_root):
     """Handles the file upload flow (CLI version)"""
     console.print(Panel("Upload File", style="bold cyan", expand=False))
     
     try:
         download_dir = os.path.join(project_root, "downloads")
-        
-        # Get files from downloads directory
-        files_in_downloads = []
-        if os.path.exists(download_dir) and os.path.isdir(download_dir):
-            files_in_downloads = sorted([f for f in os.listdir(download_dir) if os.path.isfile(os.path.join(download_dir, f))])
-        
-        # File selection with arrow keys
-        file_options = []
-        
-        if files_in_downloads:
-            for f in files_in_downloads:
-                file_size = os.path.getsize(os.path.join(download_dir, f))
-                size_str = format_file_size(file_size)
-                file_options.append((f, f"{f} ({size_str})"))
-        
-        file_options.append(("browse", "Browse for another file..."))
-        
-        if not file_options:
-            console.print("[bold red]✗ No files available.[/bold red]")
-            return
-        
-        selected_file, _ = select_item(
-            [opt[1] for opt in file_options],
-            "Select a file to upload:",
-            indicator="►"
-        )
-        
-        selected_idx = next(i for i, opt in enumerate(file_options) if opt[1] == selected_file)
-        
-        if file_options[selected_idx][0] == "browse":
-            file_to_upload_path = input("Enter path to file: ").strip()
-        else:
-            file_to_upload_path = os.path.join(download_dir, file_options[selected_idx][0])
+        files = get_index(download_dir)
+        search, sort = "", "name"
+
+        # File selection with arrow keys, a page at a time
+        while True:
+            entries = files.entries(search=search, sort=sort)
+            next_sort = SORT_KEYS[(SORT_KEYS.index(sort) + 1) % len(SORT_KEYS)]
+            actions = [("search", "Search by name..."), ("sort", f"Sort by {SORT_LABELS[next_sort]}")]
+            if search:
+                actions.append(("clear", f"Clear search '{search}'"))
+            actions.append(("browse", "Browse for another file..."))
+
+            title = f"Select a file to upload ({len(entries)} files, {SORT_LABELS[sort]}):"
+            entry, action = select_page(
+                entries, title, label=lambda e: f"{e.name} ({format_file_size(e.size)})",
+                actions=actions, indicator="►"
+            )
+
+            if entry is not None:
+                file_to_upload_path = entry.path
+                break
+            elif action == "search":
+                search = input("Show files whose name contains: ").strip()
+            elif action == "clear":
+                search = ""
+            elif action == "sort":
+                sort = next_sort
+            else:
+                file_to_upload_path = input("Enter path to file: ").strip()
+                break
         
         if not file_to_upload_path or not os.path.exists(file_to_upload_path):
             console.print("[bold red]✗ Error: File not found.[/bold red]")
             return
 
         # Service selection with arrow keys
-        available_services = ["Gofile", "Vikingfiles", "Pixeldrain", "Catbox", "Buzzheavier", "Mixdrop"]
+        available_services = [service.name for service in get_services()]
         
         selected_services_raw = select_multiple(
             available_services,
@@ -74,46 +71,26 @@ def handle_upload_cli(project_root):
             return
 
         config = get_config(project_root)
-        results = []
-
-        for service in selected_services:
-            console.print(f"[bold]→ Uploading to {service}...[/bold]")
-            success, message = (False, "Service not implemented or unknown error.")
-            
-            if service == "Gofile":
-                success, message = gofile.upload(file_to_upload_path, config.get("gofile_api_key"))
-            elif service == "Vikingfiles":
-                success, message = vikingfiles.upload(file_to_upload_path, config.get("vikingfiles_api_key"))
-            elif service == "Pixeldrain":
-                success, message = pixeldrain.upload(file_to_upload_path, config.get("pixeldrain_api_key"))
-            elif service == "Catbox":
-                success, message = catbox.upload(file_to_upload_path, config.get("catbox_api_key"))
-            elif service == "Buzzheavier":
-                success, message = buzzheavier.upload(file_to_upload_path, config.get("buzzheavier_api_key"))
-            elif service == "Mixdrop":
-                mixdrop_email = config.get("mixdrop_email")
-                mixdrop_api_key = config.get("mixdrop_api_key")
-                success, message = mixdrop.upload(file_to_upload_path, mixdrop_email, mixdrop_api_key)
-            
-            results.append({"service": service, "success": success, "message": message})
-
-        # Print summary table
-        console.print(Panel("Upload Summary", style="bold yellow", expand=False))
-        
-        if results:
-            table = Table(show_header=True, header_style="bold white")
-            table.add_column("Service", style="cyan", width=15)
-            table.add_column("Status", style="magenta", width=10)
-            table.add_column("Result", style="white", width=50)
-            
-            for res in results:
-                status = "✓ Success" if res['success'] else "✗ Failed"
-                status_style = "green" if res['success'] else "red"
-                msg = res['message'][:50] + "..." if len(res['message']) > 50 else res['message']
-                table.add_row(res['service'], status, msg, style=status_style)
-            
-            console.print(table)
-        
+        engine = UploadEngine(max_workers=config.get("max_concurrent_uploads", 4))
+        index = UploadIndex.for_project(project_root) if config.get("upload_dedup", True) else None
+
+        for name in selected_services:
+            service = get_service(name)
+            if service:
+                engine.submit(name, service.upload_file, file_to_upload_path, config, project_root, index)
+            else:
+                engine.submit(name, lambda: (False, "Service not implemented or unknown error."))
+
+        console.print(f"[bold]→ Uploading to {', '.join(selected_services)} "
+                      f"(up to {engine.max_workers} at a time)...[/bold]")
+        mark = get_exporter().mark()
+        results = engine.run(
+            on_result=lambda res: console.print(
+                f"[bold]{'✓' if res['success'] else '✗'} {res['service']} finished.[/bold]"
+            )
+        )
+
+        print_upload_summary(results, get_exporter().since(mark))
         console.print("[bold green]✓ All uploads complete.[/bold green]")
 
     except KeyboardInterrupt:
@@ -122,6 +99,53 @@ def handle_upload_cli(project_root):
         console.print(f"[bold red]✗ Error: {e}[/bold red]")
 
 
+def print_upload_summary(results, records=None):
+    """
+    Print the per-service results table of an upload run.
+
+    :param records: Optional metrics.TransferRecord list for the run; adds
+                    time, speed, retries and the slowest phase (dns, connect,
+                    tls or ttfb) per service.
+    """
+    console.print(Panel("Upload Summary", style="bold yellow", expand=False))
+    
+    if results:
+        by_service = {record.target: record for record in records or () if record.kind == "upload"}
+        # Leave room for the metrics columns
+        result_width = 30 if by_service else 50
+        table = Table(show_header=True, header_style="bold white")
+        table.add_column("Service", style="cyan", width=15)
+        table.add_column("Status", style="magenta", width=10)
+        table.add_column("Result", style="white", width=result_width)
+        if by_service:
+            table.add_column("Time", justify="right", width=7)
+            table.add_column("Speed", justify="right", width=10)
+            table.add_column("Retries", justify="right", width=7)
+            table.add_column("Slowest", width=12)
+        
+        for res in results:
+            status = "✓ Success" if res['success'] else "✗ Failed"
+            status_style = "green" if res['success'] else "red"
+            msg = res['message'][:result_width] + "..." if len(res['message']) > result_width else res['message']
+            row = [res['service'], status, msg]
+            if by_service:
+                record = by_service.get(res['service'])
+                row += _record_columns(record) if record else ["-"] * 4
+            table.add_row(*row, style=status_style)
+        
+        console.print(table)
+
+
+def _record_columns(record):
+    phase, seconds = max(record.phases.items(), key=lambda item: item[1])
+    return [
+        f"{record.duration:.1f}s",
+        f"{format_file_size(record.throughput)}/s",
+        str(record.retries),
+        f"{phase} {seconds * 1000:.0f}ms" if seconds else "-",
+    ]
+
+
 def format_file_size(bytes_size):
     """Format bytes to human readable size"""
     for unit in ['B', 'KB', 'MB', 'GB']:
@@ -0,0 +1,245 @@
+"""Content-hash index of finished uploads, so the same file isn't pushed twice"""
+
+import asyncio
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+_current_hasher = contextvars.ContextVar("upload_hasher", default=None)
+# Appended to the link when an upload is answered from the index
+REUSED_NOTE = " (reused from an earlier upload)"
+HASH_BLOCK = 1024 * 1024
+
+
+class StreamHasher:
+    """
+    SHA-256 of a file computed from the bytes an upload streams anyway.
+
+    Data must arrive in file order starting at offset 0. Out-of-order data
+    (e.g. parallel multipart parts) invalidates the hash instead of
+    producing a wrong one. A stream that starts over at offset 0 (a retried
+    upload) starts the hash over too.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._hash = hashlib.sha256()
+        self.position = 0
+        self.valid = True
+
+    def update_at(self, offset, data):
+        if offset == 0 and self.position:
+            self.reset()
+        if not self.valid:
+            return
+        if offset != self.position:
+            self.valid = False
+            return
+        self._hash.update(data)
+        self.position += len(data)
+
+    def hexdigest(self, expected_size):
+        """The digest, or None if the stream didn't cover the whole file in order"""
+        if self.valid and self.position == expected_size:
+            return self._hash.hexdigest()
+        return None
+
+
+def detach_hasher():
+    """
+    Stop feeding this context's upload body to the dedup hasher.
+
+    For bodies that are sent in parallel pieces (split uploads), whose data
+    can't arrive in file order; the hash is then computed from the file.
+    """
+    _current_hasher.set(None)
+
+
+def feed_hasher(offset, data):
+    """Report bytes read for an upload body to the hasher bound to this context, if any"""
+    hasher = _current_hasher.get()
+    if hasher is not None:
+        hasher.update_at(offset, data)
+
+
+class UploadIndex:
+    """
+    SQLite index of uploads keyed by content hash and service.
+
+    File hashes are cached by (path, size, mtime), so a file that was
+    uploaded or hashed before is looked up without reading it. A file
+    with no cached hash is only read and hashed when an earlier upload to
+    the service had the same size, which is what lets a copy at another
+    path be found by content. Uploads whose hash could not be computed
+    in-stream are still found by file identity.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "service TEXT, sha256 TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, "
+                "link TEXT, uploaded_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS uploads_by_hash ON uploads (sha256, service)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS uploads_by_path ON uploads (path, service)")
+
+    @classmethod
+    def for_project(cls, project_root):
+        return cls(os.path.join(project_root, "upload_index.sqlite3"))
+
+    @staticmethod
+    def _identity(file_path):
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+    def cached_hash(self, file_path):
+        """SHA-256 of a file if it was already computed for its current size and mtime"""
+        path, size, mtime_ns = self._identity(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns)
+            ).fetchone()
+        return row[0] if row else None
+
+    def store_hash(self, file_path, sha256):
+        path, size, mtime_ns = self._identity(file_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (path, size, mtime_ns, sha256)
+            )
+            self._conn.execute(
+                "UPDATE uploads SET sha256 = ? WHERE sha256 IS NULL AND path = ? AND size = ? AND mtime_ns = ?",
+                (sha256, path, size, mtime_ns)
+            )
+
+    def _same_size_uploaded(self, service, path, size):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM uploads WHERE service = ? AND size = ? AND sha256 IS NOT NULL AND path != ? LIMIT 1",
+                (service, size, path)
+            ).fetchone() is not None
+
+    def find_upload(self, service, file_path):
+        """
+        Link of an earlier upload of this file's content to a service.
+
+        Reads the file to hash it only if its hash isn't cached and an
+        upload of the same size to this service exists.
+
+        :return: A tuple (link, uploaded_at) or None.
+        """
+        path, size, mtime_ns = self._identity(file_path)
+        sha256 = self.cached_hash(file_path)
+        if sha256 is None and self._same_size_uploaded(service, path, size):
+            sha256 = hash_file(file_path)
+            self.store_hash(file_path, sha256)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT link, uploaded_at FROM uploads WHERE service = ? AND "
+                "((sha256 IS NOT NULL AND sha256 = ?) OR (path = ? AND size = ? AND mtime_ns = ?)) "
+                "ORDER BY uploaded_at DESC LIMIT 1",
+                (service, sha256, path, size, mtime_ns)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def record_upload(self, service, file_path, link, sha256=None):
+        path, size, mtime_ns = self._identity(file_path)
+        if sha256:
+            self.store_hash(file_path, sha256)
+        else:
+            sha256 = self.cached_hash(file_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO uploads (service, sha256, path, size, mtime_ns, link, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (service, sha256, path, size, mtime_ns, link, time.time())
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def hash_file(file_path):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def reused_link(message):
+    """Split an upload's success message into (link, whether it is an earlier upload's link)"""
+    if message.endswith(REUSED_NOTE):
+        return message[:-len(REUSED_NOTE)], True
+    return message, False
+
+
+def _begin(index, service, file_path):
+    found = index.find_upload(service, file_path)
+    if found:
+        return found, None, None
+    hasher = StreamHasher()
+    return None, hasher, _current_hasher.set(hasher)
+
+
+def _finish(index, service, file_path, hasher, token, outcome):
+    _current_hasher.reset(token)
+    success, message = outcome
+    if success:
+        index.record_upload(service, file_path, message, hasher.hexdigest(os.path.getsize(file_path)))
+    return outcome
+
+
+def upload_deduplicated(index, service, file_path, upload_call):
+    """
+    Run upload_call() unless this content was already uploaded to service.
+
+    While the upload runs, its body stream feeds a hasher, so the content
+    hash is recorded without an extra read of the file.
+
+    :param upload_call: Callable returning (success, message).
+    :return: A tuple (success, message); for a known file, the earlier link
+             followed by REUSED_NOTE (see reused_link()).
+    """
+    found, hasher, token = _begin(index, service, file_path)
+    if found:
+        return (True, found[0] + REUSED_NOTE)
+    outcome = (False, "Upload did not complete")
+    try:
+        outcome = upload_call()
+    finally:
+        _finish(index, service, file_path, hasher, token, outcome)
+    return outcome
+
+
+async def upload_deduplicated_async(index, service, file_path, upload_coro_func):
+    """Coroutine version of upload_deduplicated() for an AsyncTransferEngine"""
+    # The lookup may have to hash the file, which must not hold up the event loop
+    found = await asyncio.get_running_loop().run_in_executor(None, index.find_upload, service, file_path)
+    if found:
+        return (True, found[0] + REUSED_NOTE)
+    hasher = StreamHasher()
+    token = _current_hasher.set(hasher)
+    outcome = (False, "Upload did not complete")
+    try:
+        outcome = await upload_coro_func()
+    finally:
+        _finish(index, service, file_path, hasher, token, outcome)
+    return outcome
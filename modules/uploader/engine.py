@@ -0,0 +1,117 @@
+"""Concurrent upload engine that fans one file out to several services"""
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class UploadCancelled(Exception):
+    """Raised inside a running upload once its job has been cancelled"""
+
+
+_local = threading.local()
+
+
+def current_cancel_event():
+    """Return the cancel event of the upload running on this thread (or None)"""
+    return getattr(_local, "cancel_event", None)
+
+
+def bind_cancel_event(event):
+    """Attach a cancel event to the current thread (used by helper threads)"""
+    _local.cancel_event = event
+
+
+def check_cancelled():
+    """
+    Raise UploadCancelled if the upload running on this thread was cancelled.
+
+    Services call this from their read/progress hooks so a cancelled job
+    aborts its request body instead of streaming to the end.
+    """
+    event = current_cancel_event()
+    if event is not None and event.is_set():
+        raise UploadCancelled("Upload cancelled")
+
+
+class UploadEngine:
+    """
+    Runs per-service upload() calls in parallel on a bounded thread pool.
+
+    Each submitted job gets its own cancel event, so a single service can be
+    cancelled without affecting the others. Results come back in submission
+    order as dicts compatible with the upload summary table.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max(1, int(max_workers or 1))
+        self._jobs = []
+        self._events = {}
+
+    def submit(self, service, func, *args, **kwargs):
+        """Queue an upload job; func must return a (success, message) tuple"""
+        event = threading.Event()
+        self._events[service] = event
+        self._jobs.append((service, event, func, args, kwargs))
+
+    def cancel(self, service):
+        """Cancel one service; pending jobs are skipped, running ones abort on their next read"""
+        event = self._events.get(service)
+        if event is not None:
+            event.set()
+
+    def cancel_all(self):
+        for event in self._events.values():
+            event.set()
+
+    def _run_job(self, service, event, func, args, kwargs):
+        if event.is_set():
+            return (False, "Cancelled")
+        bind_cancel_event(event)
+        try:
+            success, message = func(*args, **kwargs)
+        except UploadCancelled:
+            return (False, "Cancelled")
+        except Exception as e:
+            return (False, f"An unexpected error occurred: {e}")
+        finally:
+            bind_cancel_event(None)
+        if event.is_set() and not success:
+            return (False, "Cancelled")
+        return (success, message)
+
+    def run(self, on_result=None):
+        """
+        Run all submitted jobs and wait for them.
+
+        :param on_result: Optional callback(result_dict) fired as each job finishes.
+        :return: List of {"service", "success", "message"} dicts in submission order.
+
+        Ctrl-C cancels every job that is still pending or running; the jobs
+        unwind on their own and are reported as cancelled.
+        """
+        results = [None] * len(self._jobs)
+        if not self._jobs:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self._jobs))) as executor:
+            futures = {
+                # Jobs run in a copy of the caller's context, so e.g. progress.collect() sees their tasks
+                executor.submit(contextvars.copy_context().run, self._run_job, service, event, func, args, kwargs): (idx, service)
+                for idx, (service, event, func, args, kwargs) in enumerate(self._jobs)
+            }
+            pending = set(futures)
+            while pending:
+                try:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                except KeyboardInterrupt:
+                    self.cancel_all()
+                    continue
+                for future in done:
+                    idx, service = futures[future]
+                    success, message = future.result()
+                    results[idx] = {"service": service, "success": success, "message": message}
+                    if on_result:
+                        on_result(results[idx])
+
+        return results
@@ -0,0 +1,111 @@
+"""Persisted journals for resumable multipart uploads"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_URL_TTL = 3600
+
+
+def presigned_expiry(url, default_ttl=DEFAULT_URL_TTL):
+    """
+    Return the UNIX time at which a presigned URL stops working.
+
+    Understands S3-style (X-Amz-Date + X-Amz-Expires) and legacy (Expires)
+    query strings; anything else is assumed to live for default_ttl seconds.
+    """
+    query = {k.lower(): v[0] for k, v in parse_qs(urlparse(url).query).items()}
+    try:
+        if "x-amz-date" in query and "x-amz-expires" in query:
+            signed_at = datetime.strptime(query["x-amz-date"], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            return signed_at.timestamp() + int(query["x-amz-expires"])
+        if "expires" in query:
+            return float(query["expires"])
+    except ValueError:
+        pass
+    return time.time() + default_ttl
+
+
+def file_identity(file_path):
+    """Identity of a file on disk: absolute path, size and modification time"""
+    stat = os.stat(file_path)
+    return {"path": os.path.abspath(file_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class UploadJournal:
+    """
+    On-disk record of an in-progress multipart upload.
+
+    One JSON file per (service, file identity) holds the upload session
+    (uploadId, key, part size, part URLs) and the ETag of every part that
+    has already been accepted, so a rerun can skip straight to the missing
+    parts. The journal expires together with the earliest presigned URL.
+    """
+
+    def __init__(self, journal_dir, service, file_path):
+        self.identity = file_identity(file_path)
+        digest = hashlib.sha1(json.dumps(self.identity, sort_keys=True).encode("utf-8")).hexdigest()
+        self.path = os.path.join(journal_dir, service, f"{digest}.json")
+        self.data = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load a still-valid session for this file.
+
+        :return: The session dict, or None if there is nothing to resume.
+        """
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("identity") != self.identity or data.get("expires_at", 0) <= time.time():
+            self.discard()
+            return None
+
+        self.data = data
+        return data
+
+    def start(self, session, part_urls):
+        """Begin a new journal for a fresh upload session"""
+        expires_at = min((presigned_expiry(url) for url in part_urls), default=time.time() + DEFAULT_URL_TTL)
+        self.data = {
+            "identity": self.identity,
+            "session": session,
+            "urls": part_urls,
+            "parts": {},
+            "created_at": time.time(),
+            "expires_at": expires_at,
+        }
+        self._save()
+
+    @property
+    def completed_parts(self):
+        """Mapping of part number -> ETag for parts already uploaded"""
+        if not self.data:
+            return {}
+        return {int(number): etag for number, etag in self.data["parts"].items()}
+
+    def record_part(self, part_number, etag):
+        with self._lock:
+            self.data["parts"][str(part_number)] = etag
+            self._save()
+
+    def discard(self):
+        """Forget this upload session"""
+        self.data = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,375 @@
+"""Registry of upload services and their shared HTTP sessions"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import importlib
+import os
+import pkgutil
+import threading
+from .dedup import upload_deduplicated, upload_deduplicated_async
+from ..bandwidth import limited
+from ..metrics import finish_outcome, mount_instrumented, transfer
+from ..progress import track
+from ..resilience import ResilientSession, RetryPolicy, is_request_error, retry_outcome, retry_outcome_async
+
+DEFAULT_POOL_SIZE = 4
+
+
+def error_outcome(error, details=None):
+    """
+    (False, message) for an upload that raised, on either transport.
+
+    A failed request (requests, aiohttp, an error status from the async
+    engine or a timeout) becomes "Error: ..."; anything else is reported
+    as unexpected. Services map errors through this in both upload() and
+    upload_async(), so the two report a failure the same way.
+
+    :param details: Optional callable(response) -> str appended when the failed request got an answer.
+    """
+    if isinstance(error, asyncio.TimeoutError) and not str(error):
+        return (False, "Error: Request timeout")
+    if not is_request_error(error):
+        return (False, f"An unexpected error occurred: {error}")
+    message = f"Error: {error}"
+    response = getattr(error, "response", None)
+    if details is not None and response is not None:
+        message += details(response)
+    return (False, message)
+
+
+class Capabilities:
+    """
+    What a service's server side accepts, as far as uploads are concerned.
+
+    :param max_file_size: Largest file in bytes the service takes in one
+                          upload, or None for no known limit. Larger files
+                          are uploaded as volumes (see uploader.split).
+    :param multipart: The service's own API takes a file in parts (e.g. presigned part URLs).
+    :param resumable: An interrupted upload can be resumed instead of restarted.
+    """
+
+    def __init__(self, max_file_size=None, multipart=False, resumable=False):
+        self.max_file_size = max_file_size
+        self.multipart = multipart
+        self.resumable = resumable
+
+
+class UploaderService:
+    """
+    An upload service as seen by the CLI.
+
+    Each module in modules/uploader/services declares one of these as its
+    module-level SERVICE. The config schema lists the config.json keys the
+    service needs, in the order they are passed to its upload() function,
+    so settings and upload flows don't need to know about any service.
+
+    :param name: Display name (e.g. "Gofile").
+    :param upload: upload(file_path, *config_values, session=None, **options) -> (success, message)
+    :param upload_async: Optional coroutine upload_async(engine, file_path, *config_values, **options)
+                         for running on an AsyncTransferEngine.
+    :param upload_stream: Optional upload_stream(stream, file_name, *config_values, session=None, **stream_options)
+                          that sends a sized, read-once stream instead of a file on disk.
+    :param config_schema: List of {"key", "label", "secret"} dicts.
+    :param options: Optional callable(config, project_root) -> dict of extra upload() kwargs.
+    :param stream_options: Optional callable(config, project_root) -> dict of extra upload_stream() kwargs.
+    :param pool_size_key: Config key holding how many requests this service runs at once.
+    :param direct_link: Optional callable(link) -> URL that serves the raw file bytes and byte
+                        ranges, for the post-upload spot check (upload_spot_check in config).
+    :param capabilities: Capabilities of the service (default: no known limits).
+    :param order: Position in menus.
+    """
+
+    def __init__(self, name, upload, upload_async=None, upload_stream=None, config_schema=(), options=None,
+                 stream_options=None, pool_size_key="max_concurrent_uploads", direct_link=None, capabilities=None, order=100):
+        self.name = name
+        self.upload = upload
+        self.upload_async = upload_async
+        self.upload_stream = upload_stream
+        self.config_schema = list(config_schema)
+        self.options = options
+        self.stream_options = stream_options
+        self.pool_size_key = pool_size_key
+        self.direct_link = direct_link
+        self.capabilities = capabilities or Capabilities()
+        self.order = order
+        self._session = None
+        self._lock = threading.Lock()
+
+    def get_session(self, config=None):
+        """
+        Shared keep-alive session for this service.
+
+        The connection pool is sized to the service's concurrency so parallel
+        requests reuse warm connections instead of doing a new TCP+TLS
+        handshake each time.
+        """
+        with self._lock:
+            if self._session is None:
+                pool_size = (config or {}).get(self.pool_size_key) or DEFAULT_POOL_SIZE
+                self._session = mount_instrumented(ResilientSession(), pool_size)
+            return self._session
+
+    def max_file_size(self, config):
+        """
+        Largest single upload in bytes, or None for no limit.
+
+        upload_size_limits_mb in config overrides the built-in limit per
+        service name (e.g. for a premium account); 0 means no limit.
+        """
+        limits = config.get("upload_size_limits_mb") or {}
+        if self.name in limits:
+            return int(limits[self.name] * 1024 * 1024) or None
+        return self.capabilities.max_file_size
+
+    def needs_split(self, file_path, config):
+        """
+        Whether the file is too large to go up in one piece.
+
+        :raises ValueError: If it is too large and the service can't take volumes.
+        """
+        limit = self.max_file_size(config)
+        if not limit or os.path.getsize(file_path) <= limit:
+            return False
+        if self.upload_stream is None:
+            raise ValueError(f"{self.name} accepts files up to {limit} bytes")
+        return True
+
+    def spot_check(self, outcome, file_path, config):
+        """
+        Read back sampled ranges of a successful upload and compare them with the file.
+
+        Only runs for services with a direct_link and upload_spot_check > 0.
+
+        :param outcome: (success, link) from an upload.
+        :return: outcome, or (False, reason) if the remote copy differs.
+        """
+        samples = config.get("upload_spot_check", 0)
+        success, link = outcome
+        if not success or not samples or self.direct_link is None:
+            return outcome
+        from ..integrity import spot_check
+
+        try:
+            ok, reason = spot_check(self.direct_link(link), file_path, samples, session=self.get_session(config))
+        except Exception as e:
+            ok, reason = False, str(e)
+        if not ok:
+            return (False, f"Spot check failed for {link}: {reason}")
+        return outcome
+
+    def upload_file(self, file_path, config, project_root=None, index=None, **kwargs):
+        """
+        Upload a file using this service's settings from config.
+
+        Transient failures (connection errors, 5xx, 429) are retried with
+        backoff, and the service's circuit breaker fails the upload fast
+        while the service is down. Each transfer is recorded in modules.metrics
+        and shown on the progress display, and is spot-checked afterwards
+        if upload_spot_check is set.
+
+        A file over the service's size limit is uploaded as parallel volumes
+        instead (uploader.split); the message then lists their links in order.
+
+        :param index: Optional UploadIndex; content already uploaded to this
+                      service returns the earlier link without a transfer.
+        """
+        args = [config.get(field["key"]) for field in self.config_schema]
+        options = self.options(config, project_root) if self.options else {}
+        options.update(kwargs)
+
+        file_name = os.path.basename(file_path)
+
+        def attempt(task):
+            task.update(completed=0)
+            return self.upload(file_path, *args, session=self.get_session(config), **options)
+
+        def call():
+            with transfer("upload", self.name, file_name, project_root, config) as record, \
+                    limited(config, self.name), \
+                    track(f"{self.name}: {file_name}", os.path.getsize(file_path)) as task:
+                outcome = retry_outcome(lambda: attempt(task), self.name, RetryPolicy.from_config(config), config)
+                return finish_outcome(record, self.spot_check(outcome, file_path, config))
+
+        try:
+            if self.needs_split(file_path, config):
+                from .split import upload_split
+
+                call = lambda: upload_split(self, file_path, config, project_root)
+        except ValueError as e:
+            return (False, f"Error: {e}")
+
+        if index is None:
+            return call()
+        return upload_deduplicated(index, self.name, file_path, call)
+
+    def upload_stream_file(self, stream, file_name, config, project_root=None):
+        """
+        Upload a stream that is read exactly once, front to back.
+
+        A read-once stream can't be sent again, so there are no retries,
+        but an open circuit breaker still fails the upload fast.
+
+        :param stream: File-like object whose len attribute gives the bytes left to read.
+        """
+        args = [config.get(field["key"]) for field in self.config_schema]
+        options = self.stream_options(config, project_root) if self.stream_options else {}
+        with transfer("upload", self.name, file_name, project_root, config) as record, \
+                limited(config, self.name), track(f"{self.name}: {file_name}", stream.len):
+            return finish_outcome(record, retry_outcome(
+                lambda: self.upload_stream(stream, file_name, *args, session=self.get_session(config), **options),
+                self.name, RetryPolicy(max_retries=0), config
+            ))
+
+    async def upload_file_async(self, engine, file_path, config, project_root=None, index=None, **kwargs):
+        """Coroutine version of upload_file() for an AsyncTransferEngine"""
+        args = [config.get(field["key"]) for field in self.config_schema]
+        options = self.options(config, project_root) if self.options else {}
+        options.update(kwargs)
+
+        file_name = os.path.basename(file_path)
+
+        async def attempt(task):
+            task.update(completed=0)
+            return await self.upload_async(engine, file_path, *args, **options)
+
+        async def call():
+            with transfer("upload", self.name, file_name, project_root, config) as record, \
+                    limited(config, self.name), \
+                    track(f"{self.name}: {file_name}", os.path.getsize(file_path)) as task:
+                outcome = await retry_outcome_async(
+                    lambda: attempt(task), self.name, RetryPolicy.from_config(config), config
+                )
+                if outcome[0] and config.get("upload_spot_check", 0) and self.direct_link is not None:
+                    loop = asyncio.get_running_loop()
+                    outcome = await loop.run_in_executor(None, self.spot_check, outcome, file_path, config)
+                return finish_outcome(record, outcome)
+
+        async def call_split():
+            # Volumes go up on their own threads; a cancelled job stops the ones not yet started
+            from .split import upload_split
+
+            abort = threading.Event()
+            context = contextvars.copy_context()
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(
+                    None, context.run, upload_split, self, file_path, config, project_root, None, abort
+                )
+            except asyncio.CancelledError:
+                abort.set()
+                raise
+
+        try:
+            if self.needs_split(file_path, config):
+                call = call_split
+        except ValueError as e:
+            return (False, f"Error: {e}")
+
+        if index is None:
+            return await call()
+        return await upload_deduplicated_async(index, self.name, file_path, call)
+
+    def run_async(self, file_path, config, project_root=None, engine=None, timeout=None, index=None, **kwargs):
+        """
+        Synchronous wrapper that runs upload_file_async() on an engine.
+
+        Keeps the usual (success, message) contract, so callers can switch
+        between the thread-based and event-loop based uploaders freely.
+        """
+        if engine is None:
+            from ..async_transfer import get_engine
+            engine = get_engine()
+
+        async def run(engine):
+            return await self.upload_file_async(engine, file_path, config, project_root, index, **kwargs)
+
+        try:
+            return engine.run(run, timeout=timeout)
+        except asyncio.TimeoutError:
+            return (False, "Error: Request timeout")
+        except concurrent.futures.CancelledError:
+            return (False, "Cancelled")
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_services = None
+_services_lock = threading.Lock()
+
+
+def get_services():
+    """Discover all upload services, in menu order"""
+    global _services
+    with _services_lock:
+        if _services is None:
+            from . import services as services_pkg
+
+            found = []
+            for module_info in pkgutil.iter_modules(services_pkg.__path__):
+                module = importlib.import_module(f"{services_pkg.__name__}.{module_info.name}")
+                service = getattr(module, "SERVICE", None)
+                if isinstance(service, UploaderService):
+                    found.append(service)
+            _services = sorted(found, key=lambda s: (s.order, s.name))
+        return _services
+
+
+def _import_service(module_name):
+    """SERVICE of services/<module_name>.py, or None if there is no such module"""
+    if not module_name.isidentifier():
+        return None
+    full_name = f"{__package__}.services.{module_name}"
+    try:
+        module = importlib.import_module(full_name)
+    except ModuleNotFoundError as e:
+        if e.name != full_name:
+            raise
+        return None
+    service = getattr(module, "SERVICE", None)
+    return service if isinstance(service, UploaderService) else None
+
+
+def get_service(name):
+    """
+    Look up a service by display name (case-insensitive).
+
+    Services live in a module named after them (Gofile in services/gofile.py),
+    so that module is tried first and a job that uses one service doesn't
+    import all of them; anything else falls back to full discovery.
+    """
+    if _services is None:
+        service = _import_service(name.lower())
+        if service is not None and service.name.lower() == name.lower():
+            return service
+    for service in get_services():
+        if service.name.lower() == name.lower():
+            return service
+    return None
+
+
+def capabilities_table(config=None):
+    """
+    One row per service describing what it can do, in menu order.
+
+    :return: List of dicts with name, max_file_size (bytes or None, after
+             config overrides), multipart, resumable, split (oversized files
+             go up as volumes), async and spot_check.
+    """
+    config = config or {}
+    return [
+        {
+            "name": service.name,
+            "max_file_size": service.max_file_size(config),
+            "multipart": service.capabilities.multipart,
+            "resumable": service.capabilities.resumable,
+            "split": service.upload_stream is not None,
+            "async": service.upload_async is not None,
+            "spot_check": service.direct_link is not None,
+        }
+        for service in get_services()
+    ]
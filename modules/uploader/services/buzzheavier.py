@@ -1,47 +1,90 @@
 import os
 import requests
-from ...utils import TqdmUploadWrapper
+from ...utils import MmapUploadBody, DEFAULT_BLOCK_SIZE
+from ..registry import UploaderService, error_outcome
 
-def upload(file_path, api_key=None):
+def upload(file_path, api_key=None, session=None, block_size=DEFAULT_BLOCK_SIZE):
     """
     Uploads a file to Buzzheavier with a progress bar.
     
     :param file_path: Path to the file to upload.
     :param api_key: Optional Buzzheavier API key (ACCOUNT_ID) for authenticated upload.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :param block_size: Size of the blocks the file is sent in.
     :return: A tuple (success: bool, message: str)
     """
     file_name = os.path.basename(file_path)
-    
-    upload_url = f"https://w.buzzheavier.com/{file_name}"
-    headers = {}
+    body = MmapUploadBody(file_path, block_size=block_size)
+    return upload_stream(body, file_name, api_key, session=session)
+
+
+def _upload_url(file_name):
+    return f"https://w.buzzheavier.com/{file_name}"
+
 
-    if api_key:
-        headers["Authorization"] = f"Bearer {api_key}"
+def _headers(api_key):
+    return {"Authorization": f"Bearer {api_key}"} if api_key else {}
 
+
+def _result(response):
+    """(success, message) for Buzzheavier's answer to an upload, from either transport"""
+    response.raise_for_status()
+    if response.status_code not in (200, 201):
+        return (False, f"Upload failed. Status: {response.status_code}. Response: {response.text}")
     try:
-        with open(file_path, 'rb') as f:
-            wrapped_file = TqdmUploadWrapper(f, os.path.getsize(file_path), f"Uploading {file_name}")
-            response = requests.put(upload_url, data=wrapped_file, headers=headers)
-        
-        response.raise_for_status()
-        
-        if response.status_code in [200, 201]:
-            try:
-                upload_data = response.json()
-                file_id = upload_data.get("data", {}).get("id")
-                if file_id:
-                    return (True, f"https://buzzheavier.com/f/{file_id}")
-                else:
-                    return (False, f"Success, but couldn't parse ID. Full response: {upload_data}")
-            except ValueError:
-                return (False, response.text.strip() if response.text else "Success, but no URL found.")
-        else:
-            return (False, f"Upload failed. Status: {response.status_code}. Response: {response.text}")
-
-    except requests.exceptions.RequestException as e:
-        error_message = f"Error: {e}"
-        if e.response:
-            error_message += f" - Status: {e.response.status_code}, Body: {e.response.text}"
-        return (False, error_message)
+        upload_data = response.json()
+    except ValueError:
+        return (False, response.text.strip() if response.text else "Success, but no URL found.")
+    file_id = upload_data.get("data", {}).get("id")
+    if file_id:
+        return (True, f"https://buzzheavier.com/f/{file_id}")
+    return (False, f"Success, but couldn't parse ID. Full response: {upload_data}")
+
+
+def _error_details(response):
+    return f" - Status: {response.status_code}, Body: {response.text}"
+
+
+def upload_stream(stream, file_name, api_key=None, session=None):
+    """
+    Uploads a sized body (file-like or iterable, with len()) to Buzzheavier.
+
+    :param stream: Request body; len(stream) must give its size.
+    :param file_name: Name the file gets on Buzzheavier.
+    :param api_key: Optional Buzzheavier API key (ACCOUNT_ID) for authenticated upload.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :return: A tuple (success: bool, message: str)
+    """
+    http = session or requests
+    try:
+        return _result(http.put(_upload_url(file_name), data=stream, headers=_headers(api_key)))
     except Exception as e:
-        return (False, f"An unexpected error occurred: {e}")
+        return error_outcome(e, _error_details)
+
+
+async def upload_async(engine, file_path, api_key=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Uploads a file to Buzzheavier on an AsyncTransferEngine.
+
+    :param engine: modules.async_transfer.AsyncTransferEngine to run on.
+    :param file_path: Path to the file to upload.
+    :param api_key: Optional Buzzheavier API key (ACCOUNT_ID) for authenticated upload.
+    :param block_size: Size of the chunks the file is sent in.
+    :return: A tuple (success: bool, message: str)
+    """
+    try:
+        return _result(await engine.put_file(_upload_url(os.path.basename(file_path)), file_path,
+                                             headers=_headers(api_key), chunk_size=block_size))
+    except Exception as e:
+        return error_outcome(e, _error_details)
+
+
+SERVICE = UploaderService(
+    name="Buzzheavier",
+    upload=upload,
+    upload_async=upload_async,
+    upload_stream=upload_stream,
+    options=lambda config, project_root: {"block_size": config.get("upload_block_size", DEFAULT_BLOCK_SIZE)},
+    config_schema=[{"key": "buzzheavier_api_key", "label": "API key", "secret": True}],
+    order=5,
+)
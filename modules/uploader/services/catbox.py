@@ -1,42 +1,84 @@
 import os
 import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder, MultipartEncoderMonitor
-from tqdm import tqdm
+from ..registry import Capabilities, UploaderService, error_outcome
+from ...utils import MultipartBody, DEFAULT_BLOCK_SIZE
 
-def upload(file_path, api_key=None):
+UPLOAD_URL = "https://catbox.moe/user/api.php"
+
+
+def upload(file_path, api_key=None, session=None, block_size=DEFAULT_BLOCK_SIZE):
     """
     Uploads a file to Catbox.moe with a progress bar.
     
     :param file_path: Path to the file to upload.
     :param api_key: Optional Catbox.moe userhash for authenticated upload.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :param block_size: Size of the blocks the file is sent in.
     :return: A tuple (success: bool, message: str)
     """
-    upload_url = "https://catbox.moe/user/api.php"
-    file_name = os.path.basename(file_path)
+    return _upload(file_path, os.path.basename(file_path), api_key, session, block_size)
 
-    fields = {
-        'reqtype': 'fileupload',
-        'fileToUpload': (file_name, open(file_path, 'rb'), 'application/octet-stream')
-    }
-    
-    if api_key:
-        fields['userhash'] = api_key
 
-    encoder = MultipartEncoder(fields=fields)
-    
-    with tqdm(total=encoder.len, unit='B', unit_scale=True, desc=f"Uploading {file_name}") as pbar:
-        monitor = MultipartEncoderMonitor(encoder, lambda mon: pbar.update(mon.bytes_read - pbar.n))
-        
-        try:
-            response = requests.post(upload_url, data=monitor, headers={'Content-Type': monitor.content_type})
-            response.raise_for_status()
-            
-            if response.text and response.text.startswith('http'):
-                return (True, response.text)
-            else:
-                return (False, f"Upload failed. Response: {response.text}")
-
-        except requests.exceptions.RequestException as e:
-            return (False, f"Error: {e}")
-        except Exception as e:
-            return (False, f"An unexpected error occurred: {e}")
+def upload_stream(stream, file_name, api_key=None, session=None):
+    """
+    Uploads a sized, read-once stream to Catbox.moe.
+
+    :param stream: File-like body; its len attribute must give the bytes left to read.
+    :param file_name: Name the file gets on Catbox.moe.
+    :param api_key: Optional Catbox.moe userhash for authenticated upload.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :return: A tuple (success: bool, message: str)
+    """
+    return _upload(stream, file_name, api_key, session)
+
+
+def _fields(api_key):
+    return {'reqtype': 'fileupload', 'userhash': api_key or None}
+
+
+def _result(response):
+    """(success, message) for Catbox's answer to an upload, from either transport"""
+    response.raise_for_status()
+    if response.text and response.text.startswith('http'):
+        return (True, response.text)
+    return (False, f"Upload failed. Response: {response.text}")
+
+
+def _upload(source, file_name, api_key=None, session=None, block_size=DEFAULT_BLOCK_SIZE):
+    """Shared by upload() and upload_stream(); source is a file path or a stream"""
+    http = session or requests
+    try:
+        body = MultipartBody(_fields(api_key), 'fileToUpload', file_name, source, block_size)
+        return _result(http.post(UPLOAD_URL, data=body, headers={'Content-Type': body.content_type}))
+    except Exception as e:
+        return error_outcome(e)
+
+
+async def upload_async(engine, file_path, api_key=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Uploads a file to Catbox.moe on an AsyncTransferEngine.
+
+    :param engine: modules.async_transfer.AsyncTransferEngine to run on.
+    :param file_path: Path to the file to upload.
+    :param api_key: Optional Catbox.moe userhash for authenticated upload.
+    :param block_size: Size of the chunks the file is sent in.
+    :return: A tuple (success: bool, message: str)
+    """
+    try:
+        return _result(await engine.post_multipart(UPLOAD_URL, _fields(api_key), 'fileToUpload', file_path,
+                                                   chunk_size=block_size))
+    except Exception as e:
+        return error_outcome(e)
+
+
+SERVICE = UploaderService(
+    name="Catbox",
+    upload=upload,
+    upload_async=upload_async,
+    upload_stream=upload_stream,
+    options=lambda config, project_root: {"block_size": config.get("upload_block_size", DEFAULT_BLOCK_SIZE)},
+    config_schema=[{"key": "catbox_api_key", "label": "API key", "secret": True}],
+    direct_link=lambda link: link,
+    capabilities=Capabilities(max_file_size=200 * 1000 * 1000),
+    order=4,
+)
@@ -1,49 +1,385 @@
 import os
+import json
+import time
+import atexit
+import asyncio
+import threading
+import contextvars
 import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder, MultipartEncoderMonitor
-from tqdm import tqdm
+from ..registry import UploaderService, error_outcome
+from ...resilience import classify, is_request_error
+from ...utils import MultipartBody, DEFAULT_BLOCK_SIZE
 
-def upload(file_path, api_key=None):
+SERVER_LOOKUP_URL = "https://api.gofile.io/getServer"
+DEFAULT_UPLOAD_URL = "https://upload.gofile.io/uploadfile"
+SERVER_CACHE_NAME = "gofile_servers.json"
+DEFAULT_SERVER_TTL = 600
+PROBE_TIMEOUT = 3
+# How often an async caller checks on a lookup another caller is making
+LOOKUP_POLL = 0.05
+# Throughput updates are written out at most this often (and at exit)
+STATS_SAVE_INTERVAL = 60
+# Weight of the newest upload in a server's running throughput average
+THROUGHPUT_SMOOTHING = 0.3
+
+
+class ServerCache:
+    """
+    Gofile upload server, looked up once and reused until the TTL runs out.
+
+    Every upload in the process shares one cache per project, so a batch
+    pays for the getServer round trip once instead of once per file. The
+    choice is saved to gofile_servers.json in the project root and reused
+    by the next run while it is still fresh. A server that fails with a
+    transient error is dropped, so the retry looks up a new one.
+
+    When probing is on and the lookup offers several servers, each gets a
+    short GET and the fastest to answer wins, unless earlier uploads have
+    shown another candidate to be faster.
+
+    Only one lookup runs at a time; the state lock is held just long
+    enough to read or update the choice, so fresh() never waits for a
+    lookup or probe in progress.
+
+    :param path: JSON file to persist to, or None to keep the choice in memory.
+    :param ttl: Seconds a lookup stays valid (0 looks up before every upload).
+    :param probe: Whether to measure candidate servers before choosing.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_SERVER_TTL, probe=False):
+        self.path = path
+        self.ttl = ttl
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._lookup_lock = threading.Lock()
+        self._server = None
+        self._expires = 0.0
+        self._stats = {}
+        self._stats_dirty = False
+        self._saved_at = 0.0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._server = data.get("server")
+            self._expires = float(data.get("expires", 0))
+            self._stats = data.get("servers", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def _save(self):
+        self._stats_dirty = False
+        self._saved_at = time.monotonic()
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"server": self._server, "expires": self._expires, "servers": self._stats}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def fresh(self):
+        """The cached server if its TTL hasn't run out, else None"""
+        with self._lock:
+            if self._server and time.time() < self._expires:
+                return self._server
+            return None
+
+    def get(self, http):
+        """
+        The server to upload to, looking one up if the cache is stale.
+
+        Concurrent callers wait for a single lookup instead of each making one.
+
+        :param http: requests.Session (or the requests module) for the lookup and probes.
+        :return: A tuple (server or None, message) - message explains a failed lookup.
+        """
+        server = self.fresh()
+        if server:
+            return server, ""
+        with self._lookup_lock:
+            # Another caller may have finished a lookup while this one waited
+            server = self.fresh()
+            if server:
+                return server, ""
+            candidates, message = _lookup_result(http.get(SERVER_LOOKUP_URL))
+            if candidates is None:
+                return None, message
+            if self.probe and len(candidates) > 1:
+                for name in candidates:
+                    self._record_rtt(name, _probe(http, name))
+            return self._choose(candidates), ""
+
+    async def get_async(self, engine):
+        """
+        Coroutine version of get() for an AsyncTransferEngine.
+
+        A lookup already in progress (on any thread) is waited for by
+        polling, so the event loop is never blocked on it.
+        """
+        while True:
+            server = self.fresh()
+            if server:
+                return server, ""
+            if self._lookup_lock.acquire(blocking=False):
+                break
+            await asyncio.sleep(LOOKUP_POLL)
+        try:
+            server = self.fresh()
+            if server:
+                return server, ""
+            candidates, message = _lookup_result(await engine.request('GET', SERVER_LOOKUP_URL))
+            if candidates is None:
+                return None, message
+            if self.probe and len(candidates) > 1:
+                for name in candidates:
+                    self._record_rtt(name, await _probe_async(engine, name))
+            return self._choose(candidates), ""
+        finally:
+            self._lookup_lock.release()
+
+    def _record_rtt(self, name, rtt):
+        with self._lock:
+            self._stats.setdefault(name, {})["rtt"] = rtt
+
+    def _choose(self, candidates):
+        def score(name):
+            stats = self._stats.get(name, {})
+            # Measured upload speed beats probe latency; unmeasured servers rank by latency
+            rtt = stats.get("rtt")
+            return (-stats.get("bytes_per_second", 0), float("inf") if rtt is None else rtt)
+
+        with self._lock:
+            self._server = min(candidates, key=score) if candidates else None
+            self._expires = time.time() + self.ttl
+            self._save()
+            return self._server
+
+    def record_upload(self, server, nbytes, seconds):
+        """Fold a finished upload into the server's throughput average"""
+        if not server or seconds <= 0:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(server, {})
+            rate = nbytes / seconds
+            previous = stats.get("bytes_per_second")
+            stats["bytes_per_second"] = rate if previous is None else (
+                THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * previous
+            )
+            # One write per upload would cost a batch of small files as much as the lookups saved
+            self._stats_dirty = True
+            if time.monotonic() - self._saved_at >= STATS_SAVE_INTERVAL:
+                self._save()
+
+    def flush(self):
+        """Write out throughput updates that haven't been saved yet"""
+        with self._lock:
+            if self._stats_dirty:
+                self._save()
+
+    def invalidate(self, server):
+        """Forget a server that just failed, so the next upload looks up another"""
+        with self._lock:
+            if self._server == server:
+                self._server = None
+                self._expires = 0.0
+                self._save()
+
+
+def _probe(http, name):
+    """
+    Seconds until a server answers a GET, or None if it doesn't within PROBE_TIMEOUT.
+
+    The probe runs in an empty context: a slow or failing candidate must not
+    count as a transient failure of the upload attempt (which would retry a
+    4xx), and its timings don't belong in the upload's transfer record.
+    """
+    started = time.perf_counter()
+    try:
+        contextvars.Context().run(
+            lambda: http.get(f"https://{name}.gofile.io/", timeout=PROBE_TIMEOUT, stream=True).close()
+        )
+        return time.perf_counter() - started
+    except requests.exceptions.RequestException:
+        return None
+
+
+async def _probe_async(engine, name):
+    """Coroutine version of _probe()"""
+    started = time.perf_counter()
+    # A task copies the context it is created in, so this one starts from an empty one
+    probe = contextvars.Context().run(asyncio.ensure_future, engine.request('GET', f"https://{name}.gofile.io/"))
+    try:
+        await asyncio.wait_for(probe, PROBE_TIMEOUT)
+        return time.perf_counter() - started
+    except Exception as e:
+        if not is_request_error(e):
+            raise
+        return None
+
+
+def _lookup_result(response):
+    """
+    Candidate servers from a getServer answer, from either transport.
+
+    :return: A tuple (server names or None, message) - message explains a failed lookup.
+    """
+    response.raise_for_status()
+    data = response.json()
+    if data.get("status") != "ok":
+        return None, data.get("message", "")
+    return _candidates(data.get("data", {})), ""
+
+
+def _candidates(data):
+    """Server names offered by a getServer (or newer servers-list) response"""
+    names = [entry["name"] for entry in data.get("servers", []) if isinstance(entry, dict) and entry.get("name")]
+    if data.get("server") and data["server"] not in names:
+        names.insert(0, data["server"])
+    return names
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def server_cache(config=None, project_root=None):
+    """
+    The ServerCache shared by every upload in a project.
+
+    :param config: Config dict (gofile_server_ttl, gofile_probe_servers).
+    :param project_root: Where gofile_servers.json lives; None keeps the cache in memory.
+    """
+    config = config or {}
+    path = os.path.join(project_root, SERVER_CACHE_NAME) if project_root else None
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = ServerCache(path)
+            atexit.register(cache.flush)
+    cache.ttl = max(0, float(config.get("gofile_server_ttl", DEFAULT_SERVER_TTL)))
+    cache.probe = bool(config.get("gofile_probe_servers", False))
+    return cache
+
+
+def upload(file_path, api_key=None, session=None, block_size=DEFAULT_BLOCK_SIZE, servers=None):
     """
     Uploads a file to Gofile with a progress bar.
     
     :param file_path: Path to the file to upload.
     :param api_key: Optional Gofile API key for authenticated upload.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :param block_size: Size of the blocks the file is sent in.
+    :param servers: Optional ServerCache to pick the upload server from.
     :return: A tuple (success: bool, message: str)
     """
+    return _upload(file_path, os.path.basename(file_path), api_key, session, block_size, servers)
+
+
+def upload_stream(stream, file_name, api_key=None, session=None, servers=None):
+    """
+    Uploads a sized, read-once stream to Gofile.
+
+    :param stream: File-like body; its len attribute must give the bytes left to read.
+    :param file_name: Name the file gets on Gofile.
+    :param api_key: Optional Gofile API key for authenticated upload.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :param servers: Optional ServerCache to pick the upload server from.
+    :return: A tuple (success: bool, message: str)
+    """
+    return _upload(stream, file_name, api_key, session, servers=servers)
+
+
+def _target(server_name, api_key):
+    """Upload URL and headers: the chosen server with an API key, else Gofile's default endpoint"""
+    if not api_key:
+        return DEFAULT_UPLOAD_URL, {}
+    return f"https://{server_name}.gofile.io/uploadFile", {"Authorization": f"Bearer {api_key}"}
+
+
+def _no_server(message):
+    return (False, f"Warning: Could not get best server for Gofile. Using default upload URL. {message}")
+
+
+def _result(response, servers, server_name, nbytes, started):
+    """(success, message) for Gofile's answer to an upload, from either transport"""
+    response.raise_for_status()
+    upload_data = response.json()
+    if upload_data["status"] == "ok":
+        servers.record_upload(server_name, nbytes, time.perf_counter() - started)
+        return (True, upload_data.get("data", {}).get("downloadPage", "Success, but no link found."))
+    return (False, f"Upload failed: {upload_data.get('message', 'Unknown error')}")
+
+
+def _failure(error, servers, server_name):
+    # A server that failed transiently is dropped, so the retry looks up another
+    if server_name and is_request_error(error) and classify(error)[0]:
+        servers.invalidate(server_name)
+    return error_outcome(error)
+
+
+def _upload(source, file_name, api_key=None, session=None, block_size=DEFAULT_BLOCK_SIZE, servers=None):
+    """Shared by upload() and upload_stream(); source is a file path or a stream"""
+    http = session or requests
+    servers = servers or server_cache()
+    server_name = None
     try:
-        upload_url = "https://upload.gofile.io/uploadfile"
-        headers = {}
+        if api_key:
+            server_name, message = servers.get(http)
+            if server_name is None:
+                return _no_server(message)
+        upload_url, headers = _target(server_name, api_key)
+        body = MultipartBody({}, 'file', file_name, source, block_size)
+        headers['Content-Type'] = body.content_type
+        started = time.perf_counter()
+        response = http.post(upload_url, data=body, headers=headers)
+        return _result(response, servers, server_name, len(body), started)
+    except Exception as e:
+        return _failure(e, servers, server_name)
+
 
+async def upload_async(engine, file_path, api_key=None, block_size=DEFAULT_BLOCK_SIZE, servers=None):
+    """
+    Uploads a file to Gofile on an AsyncTransferEngine.
+
+    :param engine: modules.async_transfer.AsyncTransferEngine to run on.
+    :param file_path: Path to the file to upload.
+    :param api_key: Optional Gofile API key for authenticated upload.
+    :param block_size: Size of the chunks the file is sent in.
+    :param servers: Optional ServerCache to pick the upload server from.
+    :return: A tuple (success: bool, message: str)
+    """
+    servers = servers or server_cache()
+    server_name = None
+    try:
         if api_key:
-            server_response = requests.get("https://api.gofile.io/getServer")
-            server_response.raise_for_status()
-            server_data = server_response.json()
-            if server_data["status"] == "ok":
-                server_name = server_data["data"]["server"]
-                upload_url = f"https://{server_name}.gofile.io/uploadFile"
-                headers["Authorization"] = f"Bearer {api_key}"
-            else:
-                return (False, f"Warning: Could not get best server for Gofile. Using default upload URL. {server_data.get('message', '')}")
-        
-        file_name = os.path.basename(file_path)
-
-        encoder = MultipartEncoder(fields={'file': (file_name, open(file_path, 'rb'), 'application/octet-stream')})
-        
-        with tqdm(total=encoder.len, unit='B', unit_scale=True, desc=f"Uploading {file_name}") as pbar:
-            monitor = MultipartEncoderMonitor(encoder, lambda mon: pbar.update(mon.bytes_read - pbar.n))
-            headers['Content-Type'] = monitor.content_type
-            response = requests.post(upload_url, data=monitor, headers=headers)
-        
-        response.raise_for_status()
-        
-        upload_data = response.json()
-        if upload_data["status"] == "ok":
-            return (True, upload_data.get("data", {}).get("downloadPage", "Success, but no link found."))
-        else:
-            return (False, f"Upload failed: {upload_data.get('message', 'Unknown error')}")
-
-    except requests.exceptions.RequestException as e:
-        return (False, f"Error: {e}")
+            server_name, message = await servers.get_async(engine)
+            if server_name is None:
+                return _no_server(message)
+        upload_url, headers = _target(server_name, api_key)
+        started = time.perf_counter()
+        response = await engine.post_multipart(upload_url, {}, 'file', file_path, headers=headers, chunk_size=block_size)
+        return _result(response, servers, server_name, os.path.getsize(file_path), started)
     except Exception as e:
-        return (False, f"An unexpected error occurred: {e}")
+        return _failure(e, servers, server_name)
+
+
+SERVICE = UploaderService(
+    name="Gofile",
+    upload=upload,
+    upload_async=upload_async,
+    upload_stream=upload_stream,
+    options=lambda config, project_root: {
+        "block_size": config.get("upload_block_size", DEFAULT_BLOCK_SIZE),
+        "servers": server_cache(config, project_root),
+    },
+    stream_options=lambda config, project_root: {"servers": server_cache(config, project_root)},
+    config_schema=[{"key": "gofile_api_key", "label": "API key", "secret": True}],
+    order=1,
+)
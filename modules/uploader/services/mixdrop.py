@@ -1,48 +1,94 @@
 import os
 import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder, MultipartEncoderMonitor
-from tqdm import tqdm
+from ..registry import UploaderService, error_outcome
+from ...utils import MultipartBody, DEFAULT_BLOCK_SIZE
 
-def upload(file_path, email, api_key):
+UPLOAD_URL = "https://ul.mixdrop.ag/api"
+CREDENTIALS_REQUIRED = (False, "Error: Mixdrop API E-Mail and Key are required.")
+
+
+def upload(file_path, email, api_key, session=None, block_size=DEFAULT_BLOCK_SIZE):
     """
     Uploads a file to Mixdrop.ag with a progress bar.
     
     :param file_path: Path to the file to upload.
     :param email: Mixdrop API E-Mail.
     :param api_key: Mixdrop API Key.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :param block_size: Size of the blocks the file is sent in.
     :return: A tuple (success: bool, message: str)
     """
+    return _upload(file_path, os.path.basename(file_path), email, api_key, session, block_size)
+
+
+def upload_stream(stream, file_name, email, api_key, session=None):
+    """
+    Uploads a sized, read-once stream to Mixdrop.ag.
+
+    :param stream: File-like body; its len attribute must give the bytes left to read.
+    :param file_name: Name the file gets on Mixdrop.
+    :param email: Mixdrop API E-Mail.
+    :param api_key: Mixdrop API Key.
+    :param session: Optional requests.Session to reuse pooled connections.
+    :return: A tuple (success: bool, message: str)
+    """
+    return _upload(stream, file_name, email, api_key, session)
+
+
+def _result(response):
+    """(success, message) for Mixdrop's answer to an upload, from either transport"""
+    response.raise_for_status()
+    upload_data = response.json()
+    if upload_data.get("success"):
+        return (True, upload_data.get("result", {}).get("url", "Success, but no URL found."))
+    return (False, f"Upload failed. Full response: {upload_data}")
+
+
+def _error_details(response):
+    return f" - Status: {response.status_code}, Body: {response.text}"
+
+
+def _upload(source, file_name, email, api_key, session=None, block_size=DEFAULT_BLOCK_SIZE):
+    """Shared by upload() and upload_stream(); source is a file path or a stream"""
+    http = session or requests
     if not email or not api_key:
-        return (False, "Error: Mixdrop API E-Mail and Key are required.")
+        return CREDENTIALS_REQUIRED
+    try:
+        body = MultipartBody({'email': email, 'key': api_key}, 'file', file_name, source, block_size)
+        return _result(http.post(UPLOAD_URL, data=body, headers={'Content-Type': body.content_type}))
+    except Exception as e:
+        return error_outcome(e, _error_details)
 
-    upload_url = "https://ul.mixdrop.ag/api"
-    file_name = os.path.basename(file_path)
 
-    fields = {
-        'email': email,
-        'key': api_key,
-        'file': (file_name, open(file_path, 'rb'), 'application/octet-stream')
-    }
+async def upload_async(engine, file_path, email, api_key, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Uploads a file to Mixdrop.ag on an AsyncTransferEngine.
 
-    encoder = MultipartEncoder(fields=fields)
-    
-    with tqdm(total=encoder.len, unit='B', unit_scale=True, desc=f"Uploading {file_name}") as pbar:
-        monitor = MultipartEncoderMonitor(encoder, lambda mon: pbar.update(mon.bytes_read - pbar.n))
-        
-        try:
-            response = requests.post(upload_url, data=monitor, headers={'Content-Type': monitor.content_type})
-            response.raise_for_status()
-            
-            upload_data = response.json()
-            if upload_data.get("success"):
-                return (True, upload_data.get("result", {}).get("url", "Success, but no URL found."))
-            else:
-                return (False, f"Upload failed. Full response: {upload_data}")
-
-        except requests.exceptions.RequestException as e:
-            error_message = f"Error: {e}"
-            if e.response:
-                error_message += f" - Status: {e.response.status_code}, Body: {e.response.text}"
-            return (False, error_message)
-        except Exception as e:
-            return (False, f"An unexpected error occurred: {e}")
+    :param engine: modules.async_transfer.AsyncTransferEngine to run on.
+    :param file_path: Path to the file to upload.
+    :param email: Mixdrop API E-Mail.
+    :param api_key: Mixdrop API Key.
+    :param block_size: Size of the chunks the file is sent in.
+    :return: A tuple (success: bool, message: str)
+    """
+    if not email or not api_key:
+        return CREDENTIALS_REQUIRED
+    try:
+        return _result(await engine.post_multipart(UPLOAD_URL, {'email': email, 'key': api_key}, 'file', file_path,
+                                                   chunk_size=block_size))
+    except Exception as e:
+        return error_outcome(e, _error_details)
+
+
+SERVICE = UploaderService(
+    name="Mixdrop",
+    upload=upload,
+    upload_async=upload_async,
+    upload_stream=upload_stream,
+    options=lambda config, project_root: {"block_size": config.get("upload_block_size", DEFAULT_BLOCK_SIZE)},
+    config_schema=[
+        {"key": "mixdrop_email", "label": "API E-Mail", "secret": False},
+        {"key": "mixdrop_api_key", "label": "API Key", "secret": True},
+    ],
+    order=6,
+)
@@ -1,54 +1,104 @@
 import os
 import requests
 import base64
-from ...utils import TqdmUploadWrapper
+from ...utils import MmapUploadBody, DEFAULT_BLOCK_SIZE
+from ..registry import Capabilities, UploaderService, error_outcome
 
-def upload(file_path, api_key):
+API_KEY_REQUIRED = (False, "Error: Pixeldrain API key is required.")
+
+
+def upload(file_path, api_key, session=None, block_size=DEFAULT_BLOCK_SIZE):
     """
     Uploads a file to Pixeldrain with a progress bar.
     
     :param file_path: Path to the file to upload.
     :param api_key: Pixeldrain API key (required).
+    :param session: Optional requests.Session to reuse pooled connections.
+    :param block_size: Size of the blocks the file is sent in.
     :return: A tuple (success: bool, message: str)
     """
     if not api_key:
-        return (False, "Error: Pixeldrain API key is required.")
+        return API_KEY_REQUIRED
 
     file_name = os.path.basename(file_path)
-    file_size = os.path.getsize(file_path)
-    
+    body = MmapUploadBody(file_path, block_size=block_size)
+    return upload_stream(body, file_name, api_key, session=session)
+
+
+def _upload_url(file_name):
+    return f"https://pixeldrain.com/api/file/{file_name}"
+
+
+def _headers(api_key):
     auth_string = f":{api_key}"
-    auth_header = f"Basic {base64.b64encode(auth_string.encode('utf-8')).decode('utf-8')}"
-    
-    headers = {
-        "Authorization": auth_header,
+    return {
+        "Authorization": f"Basic {base64.b64encode(auth_string.encode('utf-8')).decode('utf-8')}",
         "Content-Type": "application/octet-stream"
     }
-    
-    upload_url = f"https://pixeldrain.com/api/file/{file_name}"
 
+
+def _result(response):
+    """(success, message) for Pixeldrain's answer to an upload, from either transport"""
+    response.raise_for_status()
+    upload_data = response.json()
+    if upload_data.get("id"):
+        return (True, f"https://pixeldrain.com/u/{upload_data['id']}")
+    return (False, f"Upload failed: {upload_data.get('message', 'Unknown error')}")
+
+
+def _error_details(response):
+    try:
+        return f" - {response.json().get('message', 'No details')}"
+    except ValueError:
+        return f" - Status: {response.status_code}"
+
+
+def upload_stream(stream, file_name, api_key, session=None):
+    """
+    Uploads a sized body (file-like or iterable, with len()) to Pixeldrain.
+
+    :param stream: Request body; len(stream) must give its size.
+    :param file_name: Name the file gets on Pixeldrain.
+    :param api_key: Pixeldrain API key (required).
+    :param session: Optional requests.Session to reuse pooled connections.
+    :return: A tuple (success: bool, message: str)
+    """
+    http = session or requests
+    if not api_key:
+        return API_KEY_REQUIRED
     try:
-        with open(file_path, 'rb') as f:
-            wrapped_file = TqdmUploadWrapper(f, file_size, f"Uploading {file_name}")
-            response = requests.put(upload_url, data=wrapped_file, headers=headers)
-        
-        response.raise_for_status()
-        
-        upload_data = response.json()
-        if upload_data.get("id"):
-            file_id = upload_data.get("id")
-            return (True, f"https://pixeldrain.com/u/{file_id}")
-        else:
-            return (False, f"Upload failed: {upload_data.get('message', 'Unknown error')}")
-
-    except requests.exceptions.RequestException as e:
-        error_message = f"Error: {e}"
-        if e.response:
-            try:
-                error_body = e.response.json()
-                error_message += f" - {error_body.get('message', 'No details')}"
-            except ValueError:
-                error_message += f" - Status: {e.response.status_code}"
-        return (False, error_message)
+        return _result(http.put(_upload_url(file_name), data=stream, headers=_headers(api_key)))
     except Exception as e:
-        return (False, f"An unexpected error occurred: {e}")
+        return error_outcome(e, _error_details)
+
+
+async def upload_async(engine, file_path, api_key, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Uploads a file to Pixeldrain on an AsyncTransferEngine.
+
+    :param engine: modules.async_transfer.AsyncTransferEngine to run on.
+    :param file_path: Path to the file to upload.
+    :param api_key: Pixeldrain API key (required).
+    :param block_size: Size of the chunks the file is sent in.
+    :return: A tuple (success: bool, message: str)
+    """
+    if not api_key:
+        return API_KEY_REQUIRED
+    try:
+        return _result(await engine.put_file(_upload_url(os.path.basename(file_path)), file_path,
+                                             headers=_headers(api_key), chunk_size=block_size))
+    except Exception as e:
+        return error_outcome(e, _error_details)
+
+
+SERVICE = UploaderService(
+    name="Pixeldrain",
+    upload=upload,
+    upload_async=upload_async,
+    upload_stream=upload_stream,
+    options=lambda config, project_root: {"block_size": config.get("upload_block_size", DEFAULT_BLOCK_SIZE)},
+    config_schema=[{"key": "pixeldrain_api_key", "label": "API key", "secret": True}],
+    direct_link=lambda link: link.replace("/u/", "/api/file/", 1),
+    capabilities=Capabilities(max_file_size=20 * 1000 ** 3),
+    order=3,
+)
@@ -1,81 +1,314 @@
 import os
+import time
+import asyncio
+import threading
+import contextvars
 import requests
-from tqdm import tqdm
-import math
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from ..engine import UploadCancelled, bind_cancel_event, check_cancelled, current_cancel_event
+from ..journal import UploadJournal
+from ..registry import Capabilities, UploaderService, error_outcome
+from ...utils import FileSlice
+from ...resilience import RetryPolicy, classify, is_request_error, note_failure
+from ...metrics import note_retry, record_part
+from ... import progress
 
-def upload(file_path, api_key=None):
+API_BASE = "https://vikingfile.com/api"
+
+
+def _size_form(file_size):
+    return {'size': str(file_size)}
+
+
+def _new_session(response):
+    """
+    Upload session and part URLs from a get-upload-url answer, from either transport.
+
+    :return: A tuple (session dict, part URLs), or (None, failure message).
+    """
+    response.raise_for_status()
+    upload_info = response.json()
+    if 'urls' not in upload_info:
+        return None, f"Failed to get upload URLs. Response: {upload_info}"
+    session = {'uploadId': upload_info['uploadId'], 'key': upload_info['key'], 'partSize': upload_info['partSize']}
+    return session, upload_info['urls']
+
+
+def _plan_parts(urls, part_size, file_size):
+    """(part_number, url, offset, length) for every part the file fills"""
+    parts = []
+    for i, url in enumerate(urls):
+        offset = i * part_size
+        if offset >= file_size:
+            break
+        parts.append((i + 1, url, offset, min(part_size, file_size - offset)))
+    return parts
+
+
+def _part_etag(response, part_number):
+    response.raise_for_status()
+    etag = response.headers.get('ETag')
+    if not etag:
+        raise RuntimeError(f"ETag not found for part {part_number}")
+    return etag
+
+
+def _part_retry_delay(error, attempt, max_retries):
+    """Seconds to wait before sending a failed part again, or None to fail the upload"""
+    if not is_request_error(error):
+        return None
+    retryable, retry_after = classify(error)
+    return RetryPolicy(max_retries).delay(attempt, retry_after) if retryable else None
+
+
+def _complete_form(session, file_name, user, parts, etags):
+    # Parts are listed in part order so the ETags line up with their part numbers
+    form = {'key': session['key'], 'uploadId': session['uploadId'], 'name': file_name, 'user': user or ""}
+    for idx, (part_number, _, _, _) in enumerate(parts):
+        form[f'parts[{idx}][PartNumber]'] = str(part_number)
+        form[f'parts[{idx}][ETag]'] = etags[part_number]
+    return form
+
+
+def _result(response, journal):
+    """(success, message) for the complete-upload answer, from either transport"""
+    response.raise_for_status()
+    final_info = response.json()
+    if journal:
+        journal.discard()
+    if 'url' in final_info:
+        return (True, final_info['url'])
+    return (False, f"Upload failed: {final_info.get('error', 'Unknown error')}")
+
+
+def _failure(error, journal):
+    if is_request_error(error):
+        note_failure(error)
+        # A non-retryable 4xx means the session itself is no longer usable (expired URLs, unknown uploadId);
+        # anything transient keeps the journal so the retry resumes at the parts already acknowledged
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        if journal and status is not None and 400 <= status < 500 and not classify(error)[0]:
+            journal.discard()
+    return error_outcome(error)
+
+
+def _upload_part(http, file_path, part_number, url, offset, length, abort, cancel_event, max_retries, journal=None):
+    """
+    PUT one part to its presigned URL, retrying transient failures.
+
+    Runs in a copy of the uploading thread's context, so throttling,
+    metrics and progress count towards the upload as a whole.
+
+    :return: The ETag returned for the part.
+    """
+    bind_cancel_event(cancel_event)
+    started = time.perf_counter()
+
+    for attempt in range(max_retries + 1):
+        if abort.is_set():
+            raise UploadCancelled("Upload aborted")
+        check_cancelled()
+        sent = 0
+
+        def on_read(n):
+            nonlocal sent
+            if abort.is_set():
+                raise UploadCancelled("Upload aborted")
+            check_cancelled()
+            sent += n
+
+        try:
+            with FileSlice(file_path, offset, length, on_read=on_read) as body:
+                etag = _part_etag(http.put(url, data=body), part_number)
+        except Exception as e:
+            progress.advance(-sent)
+            delay = _part_retry_delay(e, attempt, max_retries)
+            if delay is None or abort.is_set():
+                raise
+            time.sleep(delay)
+            note_retry()
+            continue
+
+        if journal:
+            journal.record_part(part_number, etag)
+        record_part(part_number, length, time.perf_counter() - started, attempt + 1)
+        return etag
+
+
+def upload(file_path, api_key=None, max_workers=4, max_retries=3, journal_dir=None, session=None):
     """
     Uploads a file to Vikingfiles with a multi-part upload process and progress bar.
-    
+
     :param file_path: Path to the file to upload.
     :param api_key: Optional Vikingfiles API key (user's hash) for authenticated upload.
+    :param max_workers: Number of parts uploaded concurrently.
+    :param max_retries: Retries per part before the whole upload fails.
+    :param journal_dir: Directory for the resume journal; when set, a rerun after a
+                        failure only uploads the parts that are still missing.
+    :param session: Optional requests.Session to reuse pooled connections.
     :return: A tuple (success: bool, message: str)
     """
+    http = session or requests
     file_name = os.path.basename(file_path)
     file_size = os.path.getsize(file_path)
-    
-    user_hash = api_key if api_key else ""
+    journal = None
 
     try:
-        # Step 1: Get upload URL
-        print(f"[{file_name}] Requesting upload URL from Vikingfiles...")
-        get_upload_url_response = requests.post(
-            "https://vikingfile.com/api/get-upload-url",
-            data={'size': file_size}
-        )
-        get_upload_url_response.raise_for_status()
-        upload_info = get_upload_url_response.json()
-
-        if 'urls' not in upload_info:
-            return (False, f"Failed to get upload URLs. Response: {upload_info}")
-
-        upload_id = upload_info['uploadId']
-        key = upload_info['key']
-        part_size = upload_info['partSize']
-        urls = upload_info['urls']
-        
-        uploaded_parts = []
-        with open(file_path, 'rb') as f:
-            with tqdm(total=file_size, unit='B', unit_scale=True, desc=f"Uploading {file_name}") as pbar:
-                for i, url in enumerate(urls):
-                    part_number = i + 1
-                    chunk = f.read(part_size)
-                    
-                    if not chunk:
-                        break
-
-                    part_response = requests.put(url, data=chunk)
-                    part_response.raise_for_status()
-                    
-                    etag = part_response.headers.get('ETag')
-                    if not etag:
-                        return (False, f"Error: ETag not found for part {part_number}")
-
-                    uploaded_parts.append({'PartNumber': part_number, 'ETag': etag})
-                    pbar.update(len(chunk))
+        journal = UploadJournal(journal_dir, "vikingfiles", file_path) if journal_dir else None
+        saved = journal.load() if journal else None
+
+        if saved:
+            print(f"[{file_name}] Resuming upload ({len(saved['parts'])} of {len(saved['urls'])} parts done)...")
+            upload_session, urls = saved['session'], saved['urls']
+        else:
+            # Step 1: Get upload URL
+            print(f"[{file_name}] Requesting upload URL from Vikingfiles...")
+            upload_session, urls = _new_session(http.post(f"{API_BASE}/get-upload-url", data=_size_form(file_size)))
+            if upload_session is None:
+                return (False, urls)
+            if journal:
+                journal.start(upload_session, urls)
+
+        # Step 2: Upload missing parts in parallel, streaming each one from its own file slice
+        completed = journal.completed_parts if journal else {}
+        parts = _plan_parts(urls, upload_session['partSize'], file_size)
+        pending = [part for part in parts if part[0] not in completed]
+        done_bytes = sum(length for part_number, _, _, length in parts if part_number in completed)
+
+        abort = threading.Event()
+        cancel_event = current_cancel_event()
+        progress.update(completed=done_bytes, total=file_size)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending) or 1))) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, _upload_part, http, file_path, part_number, url,
+                                offset, length, abort, cancel_event, max_retries, journal)
+                for part_number, url, offset, length in pending
+            ]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            if any(future.exception() for future in done):
+                abort.set()
+                wait(futures)
+
+        # Report the part that actually failed, not the siblings aborted because of it
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            real_errors = [e for e in errors if not isinstance(e, UploadCancelled)]
+            raise (real_errors or errors)[0]
+
+        etags = dict(completed)
+        for (part_number, _, _, _), future in zip(pending, futures):
+            etags[part_number] = future.result()
 
         # Step 3: Complete upload
         print(f"[{file_name}] Completing upload...")
-        complete_upload_response = requests.post(
-            "https://vikingfile.com/api/complete-upload",
-            data={
-                'key': key,
-                'uploadId': upload_id,
-                'name': file_name,
-                'user': user_hash,
-                **{f'parts[{idx}][PartNumber]': part['PartNumber'] for idx, part in enumerate(uploaded_parts)},
-                **{f'parts[{idx}][ETag]': part['ETag'] for idx, part in enumerate(uploaded_parts)}
-            }
-        )
-        complete_upload_response.raise_for_status()
-        final_info = complete_upload_response.json()
-
-        if 'url' in final_info:
-            return (True, final_info['url'])
+        form = _complete_form(upload_session, file_name, api_key, parts, etags)
+        return _result(http.post(f"{API_BASE}/complete-upload", data=form), journal)
+
+    except UploadCancelled:
+        raise
+    except Exception as e:
+        return _failure(e, journal)
+
+
+async def _upload_part_async(engine, file_path, part_number, url, offset, length, max_retries, journal):
+    started = time.perf_counter()
+    for attempt in range(max_retries + 1):
+        sent = 0
+
+        def on_progress(n):
+            nonlocal sent
+            sent += n
+
+        try:
+            response = await engine.put_file(url, file_path, offset=offset, length=length, on_progress=on_progress)
+            etag = _part_etag(response, part_number)
+        except Exception as e:
+            progress.advance(-sent)
+            delay = _part_retry_delay(e, attempt, max_retries)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            note_retry()
+            continue
+
+        if journal:
+            journal.record_part(part_number, etag)
+        record_part(part_number, length, time.perf_counter() - started, attempt + 1)
+        return etag
+
+
+async def upload_async(engine, file_path, api_key=None, max_workers=4, max_retries=3, journal_dir=None):
+    """
+    Uploads a file to Vikingfiles on an AsyncTransferEngine.
+
+    Same multipart flow and journal as upload(), with the parts running as
+    concurrent tasks on the engine's event loop instead of threads.
+
+    :param engine: modules.async_transfer.AsyncTransferEngine to run on.
+    :param file_path: Path to the file to upload.
+    :param api_key: Optional Vikingfiles API key (user's hash) for authenticated upload.
+    :param max_workers: Number of parts uploaded concurrently.
+    :param max_retries: Retries per part before the whole upload fails.
+    :param journal_dir: Directory for the resume journal.
+    :return: A tuple (success: bool, message: str)
+    """
+    file_name = os.path.basename(file_path)
+    file_size = os.path.getsize(file_path)
+    journal = None
+
+    try:
+        journal = UploadJournal(journal_dir, "vikingfiles", file_path) if journal_dir else None
+        saved = journal.load() if journal else None
+
+        if saved:
+            upload_session, urls = saved['session'], saved['urls']
         else:
-            return (False, f"Upload failed: {final_info.get('error', 'Unknown error')}")
+            response = await engine.request('POST', f"{API_BASE}/get-upload-url", data=_size_form(file_size))
+            upload_session, urls = _new_session(response)
+            if upload_session is None:
+                return (False, urls)
+            if journal:
+                journal.start(upload_session, urls)
+
+        completed = journal.completed_parts if journal else {}
+        parts = _plan_parts(urls, upload_session['partSize'], file_size)
+        progress.update(completed=sum(length for part_number, _, _, length in parts if part_number in completed))
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def run_part(part_number, url, offset, length):
+            async with semaphore:
+                return await _upload_part_async(engine, file_path, part_number, url, offset, length, max_retries, journal)
+
+        pending = [part for part in parts if part[0] not in completed]
+        tasks = [asyncio.ensure_future(run_part(*part)) for part in pending]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        etags = dict(completed)
+        etags.update({part[0]: etag for part, etag in zip(pending, results)})
+
+        form = _complete_form(upload_session, file_name, api_key, parts, etags)
+        return _result(await engine.request('POST', f"{API_BASE}/complete-upload", data=form), journal)
 
-    except requests.exceptions.RequestException as e:
-        return (False, f"Error: {e}")
     except Exception as e:
-        return (False, f"An unexpected error occurred: {e}")
+        return _failure(e, journal)
+
+
+SERVICE = UploaderService(
+    name="Vikingfiles",
+    upload=upload,
+    upload_async=upload_async,
+    config_schema=[{"key": "vikingfiles_api_key", "label": "API key", "secret": True}],
+    options=lambda config, project_root: {
+        "max_workers": config.get("vikingfiles_part_concurrency", 4),
+        "journal_dir": os.path.join(project_root, "journals") if project_root else None,
+    },
+    pool_size_key="vikingfiles_part_concurrency",
+    capabilities=Capabilities(multipart=True, resumable=True),
+    order=2,
+)
@@ -0,0 +1,154 @@
+"""Uploading files larger than a service accepts as several volumes, in parallel"""
+
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .dedup import detach_hasher
+from .engine import UploadCancelled, bind_cancel_event, check_cancelled, current_cancel_event
+from ..bandwidth import limited
+from ..metrics import finish_outcome, transfer
+from ..progress import track
+from ..resilience import RetryPolicy, retry_outcome
+from ..utils import MmapUploadBody, DEFAULT_BLOCK_SIZE
+
+MANIFEST_DIR = "split_uploads"
+
+
+def plan_volumes(size, volume_size):
+    """
+    Cut size bytes into fixed-size volumes; the last one takes the remainder.
+
+    :return: List of (offset, length) tuples in file order.
+    """
+    if volume_size <= 0:
+        raise ValueError("volume_size must be positive")
+    return [(offset, min(volume_size, size - offset)) for offset in range(0, size, volume_size)]
+
+
+def volume_name(file_name, number, count):
+    """Name of volume number (1-based): "name.001", "name.002", ... which cat joins back in order"""
+    return f"{file_name}.{number:0{max(3, len(str(count)))}d}"
+
+
+def volume_size_for(config, max_file_size):
+    """
+    Size of the volumes a file is split into for a service.
+
+    split_volume_mb in config picks a smaller size; by default volumes are
+    as large as the service accepts, so there are as few as possible.
+    """
+    configured = int((config.get("split_volume_mb") or 0) * 1024 * 1024)
+    return min(configured, max_file_size) if configured > 0 else max_file_size
+
+
+def write_manifest(project_root, service_name, file_path, volumes):
+    """
+    Save the ordered volume list of a split upload as JSON.
+
+    :param volumes: List of {"name", "offset", "size", "link"} dicts in file order.
+    :return: Path of the manifest (<project_root>/split_uploads/<file>.<service>.json).
+    """
+    file_name = os.path.basename(file_path)
+    manifest_dir = os.path.join(project_root, MANIFEST_DIR)
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest_path = os.path.join(manifest_dir, f"{file_name}.{service_name.lower()}.json")
+    manifest = {
+        "file_name": file_name,
+        "size": os.path.getsize(file_path),
+        "service": service_name,
+        "volumes": volumes,
+        "join": f"cat {' '.join(volume['name'] for volume in volumes)} > {file_name}",
+    }
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def _upload_volume(service, file_path, name, offset, length, config, project_root, block_size, abort, cancel_event):
+    """
+    Upload one volume, streamed straight from its byte range of the file.
+
+    Runs in a copy of the caller's context; each volume is its own transfer
+    with its own retries and progress bar.
+    """
+    if abort.is_set():
+        return (False, "Cancelled")
+    bind_cancel_event(cancel_event)
+    detach_hasher()
+    args = [config.get(field["key"]) for field in service.config_schema]
+    options = service.stream_options(config, project_root) if service.stream_options else {}
+
+    def attempt(task):
+        check_cancelled()
+        task.update(completed=0)
+        body = MmapUploadBody(file_path, block_size, offset, length)
+        return service.upload_stream(body, name, *args, session=service.get_session(config), **options)
+
+    try:
+        with transfer("upload", service.name, name, project_root, config) as record, \
+                limited(config, service.name), track(f"{service.name}: {name}", length) as task:
+            return finish_outcome(record, retry_outcome(
+                lambda: attempt(task), service.name, RetryPolicy.from_config(config), config
+            ))
+    except UploadCancelled:
+        return (False, "Cancelled")
+    finally:
+        bind_cancel_event(None)
+
+
+def upload_split(service, file_path, config, project_root=None, volume_size=None, abort=None):
+    """
+    Upload a file as fixed-size volumes, several at a time.
+
+    Nothing is copied: every volume streams its byte range of the original
+    file. Up to the service's pool size (its pool_size_key in config)
+    volumes are in flight at once, and the first volume that fails stops
+    the ones that haven't started.
+
+    :param volume_size: Bytes per volume (default: volume_size_for() the service's limit).
+    :param abort: Optional threading.Event that stops the remaining volumes.
+    :return: A tuple (success, message); on success the message lists the
+             volume links in order, one per line, and the manifest is saved
+             under split_uploads/ when project_root is given.
+    """
+    if volume_size is None:
+        volume_size = volume_size_for(config, service.max_file_size(config))
+    file_name = os.path.basename(file_path)
+    plan = plan_volumes(os.path.getsize(file_path), volume_size)
+    names = [volume_name(file_name, number, len(plan)) for number in range(1, len(plan) + 1)]
+    block_size = config.get("upload_block_size", DEFAULT_BLOCK_SIZE)
+    abort = abort or threading.Event()
+    cancel_event = current_cancel_event()
+    workers = max(1, min(config.get(service.pool_size_key) or 1, len(plan)))
+
+    def run(name, offset, length):
+        outcome = _upload_volume(service, file_path, name, offset, length, config, project_root,
+                                 block_size, abort, cancel_event)
+        if not outcome[0]:
+            abort.set()
+        return outcome
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, run, name, offset, length)
+            for name, (offset, length) in zip(names, plan)
+        ]
+        outcomes = [future.result() for future in futures]
+
+    failed = [(name, message) for name, (success, message) in zip(names, outcomes) if not success]
+    if failed:
+        # Volumes skipped after the first failure say "Cancelled"; report the failure itself
+        name, message = next((item for item in failed if item[1] != "Cancelled"), failed[0])
+        return (False, message if message == "Cancelled" else f"{name}: {message}")
+
+    links = [message for _, message in outcomes]
+    if project_root:
+        write_manifest(project_root, service.name, file_path, [
+            {"name": name, "offset": offset, "size": length, "link": link}
+            for name, (offset, length), link in zip(names, plan, links)
+        ])
+    return (True, "\n".join(links))
@@ -1,11 +1,27 @@
-from tqdm import tqdm
+import os
+import mmap
+import uuid
+from urllib3.fields import format_multipart_header_param
+from .uploader.engine import check_cancelled
+from .uploader.dedup import feed_hasher
+from .bandwidth import throttle
+from .metrics import count_bytes
+from .progress import advance
 
 
 class TqdmUploadWrapper:
-    """File-like wrapper that updates tqdm progress bar on read()"""
+    """
+    File-like wrapper that updates tqdm progress bar on read().
+
+    Superseded by MmapUploadBody and modules.progress; kept as the
+    per-read baseline in benchmarks/put_body.py.
+    """
     
     def __init__(self, file_obj, total_size, description):
+        from tqdm import tqdm
+
         self._file_obj = file_obj
+        self._position = 0
         self.total_size = total_size
         self._pbar = tqdm(
             total=total_size,
@@ -16,8 +32,13 @@ class TqdmUploadWrapper:
         )
 
     def read(self, size=-1):
+        check_cancelled()
         chunk = self._file_obj.read(size)
         if chunk:
+            throttle(len(chunk))
+            count_bytes(len(chunk))
+            feed_hasher(self._position, chunk)
+            self._position += len(chunk)
             self._pbar.update(len(chunk))
         else:
             if self._pbar.n < self.total_size:
@@ -27,3 +48,165 @@ class TqdmUploadWrapper:
     
     def __len__(self):
         return self.total_size
+
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+
+class MmapUploadBody:
+    """
+    High-throughput raw request body for PUT uploads.
+
+    Instead of being read() in small chunks, the file is memory-mapped and
+    handed to the HTTP client as large memoryview blocks, so no Python-level
+    copy of the data is made and the per-chunk work (cancel check, hashing,
+    progress counter) runs once per block.
+
+    With offset/length only that byte range of the file is sent, which is
+    how a large file goes up as several volumes without copying it.
+    """
+
+    def __init__(self, file_path, block_size=DEFAULT_BLOCK_SIZE, offset=0, length=None):
+        self.file_path = file_path
+        self.offset = offset
+        self.total_size = os.path.getsize(file_path) - offset if length is None else length
+        self.block_size = max(64 * 1024, int(block_size))
+
+    def __len__(self):
+        return self.total_size
+
+    @property
+    def len(self):
+        return self.total_size
+
+    def __iter__(self):
+        if self.total_size == 0:
+            return
+        end = self.offset + self.total_size
+        with open(self.file_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                memoryview(mapped) as view:
+            for offset in range(self.offset, end, self.block_size):
+                check_cancelled()
+                block = view[offset:min(offset + self.block_size, end)]
+                length = len(block)
+                throttle(length)
+                count_bytes(length)
+                feed_hasher(offset, block)
+                try:
+                    yield block
+                finally:
+                    # Also on an aborted request, or the mmap can't be closed
+                    block.release()
+                advance(length)
+
+
+def multipart_envelope(fields, file_field, file_name, content_type="application/octet-stream"):
+    """
+    Everything of a multipart/form-data body except the file data.
+
+    Plain fields go first, so the file is the last part and the body is
+    just head + file + tail.
+
+    :param fields: Plain form fields (None values are left out).
+    :return: A tuple (content_type_header, head_bytes, tail_bytes)
+    """
+    boundary = uuid.uuid4().hex
+    head = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; {format_multipart_header_param("name", name)}'
+        f'\r\n\r\n{value}\r\n'.encode('utf-8')
+        for name, value in fields.items() if value is not None
+    )
+    head += (
+        f'--{boundary}\r\nContent-Disposition: form-data; {format_multipart_header_param("name", file_field)}; '
+        f'{format_multipart_header_param("filename", file_name)}\r\nContent-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8')
+    tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return f"multipart/form-data; boundary={boundary}", head, tail
+
+
+class MultipartBody:
+    """
+    Streaming multipart/form-data request body with one file part.
+
+    The envelope is built up front, so the exact Content-Length is known
+    before sending and requests streams the body as-is. A file on disk is
+    sent memory-mapped in large blocks (see MmapUploadBody) and opened only
+    while the body is being sent; a read-once stream is read block_size
+    bytes at a time and does its own throttling and progress counting.
+
+    :param fields: Plain form fields sent before the file.
+    :param file_field: Name of the file field.
+    :param file_name: File name sent in the file part.
+    :param source: Path of a file, an MmapUploadBody (e.g. one byte range of a
+                   file), or a stream whose len attribute gives the bytes left to read.
+    """
+
+    def __init__(self, fields, file_field, file_name, source, block_size=DEFAULT_BLOCK_SIZE):
+        self.content_type, self._head, self._tail = multipart_envelope(fields, file_field, file_name)
+        if isinstance(source, (str, os.PathLike, MmapUploadBody)):
+            self._file = source if isinstance(source, MmapUploadBody) else MmapUploadBody(source, block_size)
+            self._stream = None
+            size = len(self._file)
+        else:
+            self._file = None
+            self._stream = source
+            size = source.len
+        self.block_size = max(64 * 1024, int(block_size))
+        self.total_size = len(self._head) + size + len(self._tail)
+
+    def __len__(self):
+        return self.total_size
+
+    def __iter__(self):
+        yield self._head
+        if self._file is not None:
+            yield from self._file
+        else:
+            for block in iter(lambda: self._stream.read(self.block_size), b""):
+                yield block
+        yield self._tail
+
+
+class FileSlice:
+    """
+    Read-only file-like view over a byte range of a file.
+
+    Opens its own handle, so several slices of the same file can be streamed
+    from different threads. Data is read on demand in the sizes the HTTP
+    client asks for, so memory stays bounded no matter how large the range is.
+    """
+
+    def __init__(self, file_path, offset, length, on_read=None):
+        self._file_obj = open(file_path, 'rb')
+        self._file_obj.seek(offset)
+        self.offset = offset
+        self.length = length
+        self._remaining = length
+        self._on_read = on_read
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        chunk = self._file_obj.read(size)
+        self._remaining -= len(chunk)
+        throttle(len(chunk))
+        count_bytes(len(chunk))
+        advance(len(chunk))
+        if chunk and self._on_read:
+            self._on_read(len(chunk))
+        return chunk
+
+    def __len__(self):
+        return self.length
+
+    def close(self):
+        self._file_obj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
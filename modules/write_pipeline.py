@@ -0,0 +1,177 @@
+"""Double-buffered download write path: socket reads and disk writes overlap"""
+
+import os
+import queue
+import threading
+from .bandwidth import throttle
+from .metrics import count_bytes
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_BUFFER_COUNT = 8
+
+
+def preallocate(fd, size):
+    """Reserve size bytes for a file up front (fallocate where available, else a sparse truncate)"""
+    if size <= 0:
+        return
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
+
+
+def _pwrite_all(fd, view, offset):
+    if not hasattr(os, "pwrite"):
+        # Only the writer thread touches the file position, so seek + write is safe
+        os.lseek(fd, offset, os.SEEK_SET)
+    while len(view):
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, offset)
+        else:
+            written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+def _raw_readinto(response):
+    """
+    readinto() of the underlying socket stream, if the body can be read raw.
+
+    Reading straight into our buffers skips the per-chunk bytes objects that
+    iter_content creates. Not possible for compressed bodies, which then go
+    through the regular decoding read().
+    """
+    if response.headers.get("content-encoding", "identity").lower() != "identity":
+        return None
+    fp = getattr(response.raw, "_fp", None)
+    return getattr(fp, "readinto", None)
+
+
+class WritePipeline:
+    """
+    Writes HTTP response bodies to a file on a dedicated writer thread.
+
+    Readers fill a fixed pool of reusable bytearray buffers and hand them
+    to the writer through a bounded queue, so the network and the disk work
+    at the same time while memory stays at buffer_size x buffer_count.
+    Writes are positional, so several segments can share one pipeline.
+
+    :param path: File to write (opened read/write, never truncated unless create=True).
+    :param size: With create=True, the expected size to preallocate.
+    :param on_progress: Optional callable(nbytes) fired as data arrives.
+    :param hasher: Optional integrity.OrderedHasher told about every write, on the writer thread.
+    """
+
+    def __init__(self, path, size=None, create=False, on_progress=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE, buffer_count=DEFAULT_BUFFER_COUNT, hasher=None):
+        flags = os.O_RDWR | getattr(os, "O_BINARY", 0)
+        if create:
+            flags |= os.O_CREAT | os.O_TRUNC
+        self._fd = os.open(path, flags, 0o644)
+        if create and size:
+            preallocate(self._fd, size)
+
+        self._on_progress = on_progress
+        self._hasher = hasher
+        self._free = queue.Queue()
+        for _ in range(buffer_count):
+            self._free.put(bytearray(buffer_size))
+        self._queue = queue.Queue()
+        self._error = None
+        self._lock = threading.Lock()
+        self.end = 0
+        self._writer = threading.Thread(target=self._write_loop, name="download-writer", daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            offset, buffer, length, on_written = item
+            try:
+                if self._error is None:
+                    _pwrite_all(self._fd, memoryview(buffer)[:length], offset)
+                    if self._hasher is not None:
+                        self._hasher.written(offset, memoryview(buffer)[:length])
+                    with self._lock:
+                        self.end = max(self.end, offset + length)
+                    if on_written:
+                        on_written(length)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._free.put(buffer)
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def copy(self, response, offset, on_written=None, stop=None, claim=None):
+        """
+        Stream a response body into the file starting at offset.
+
+        :param on_written: Optional callable(nbytes) fired after data hits the file.
+        :param stop: Optional threading.Event that aborts the copy.
+        :param claim: Optional callable(offset, nbytes) -> nbytes that may be written,
+                      asked before every buffer is queued. Returning less ends the
+                      copy there, so a range can be cut short while it streams.
+        :return: Number of bytes written from the response.
+        """
+        readinto = _raw_readinto(response)
+        total = 0
+        while True:
+            if stop is not None and stop.is_set():
+                raise InterruptedError("Download interrupted")
+            self._check()
+            buffer = self._free.get()
+            view = memoryview(buffer)
+            try:
+                if readinto:
+                    length = 0
+                    while length < len(view):
+                        n = readinto(view[length:])
+                        if not n:
+                            break
+                        length += n
+                else:
+                    data = response.raw.read(len(view), decode_content=True)
+                    length = len(data)
+                    view[:length] = data
+            except BaseException:
+                self._free.put(buffer)
+                raise
+            wanted = length
+            if claim is not None and length:
+                length = max(0, min(length, claim(offset, length)))
+            if length == 0:
+                self._free.put(buffer)
+                return total
+            self._queue.put((offset, buffer, length, on_written))
+            throttle(length)
+            count_bytes(length)
+            offset += length
+            total += length
+            if self._on_progress:
+                self._on_progress(length)
+            if length < wanted:
+                return total
+
+    def close(self):
+        """Wait for pending writes, close the file and re-raise any write error"""
+        if self._fd is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        os.close(self._fd)
+        self._fd = None
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
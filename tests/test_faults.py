@@ -0,0 +1,20 @@
+"""Retry, circuit breaker and resume behaviour, checked against the local stand-ins (see benchmarks.faults)"""
+
+import pytest
+from benchmarks import daemon_api, faults
+
+
+@pytest.fixture(scope="module")
+def workspace():
+    workspace = faults.Workspace(size_mb=8)
+    yield workspace
+    workspace.close()
+
+
+@pytest.mark.parametrize("name", list(faults.SCENARIOS))
+def test_fault_scenario(workspace, name):
+    assert faults.run_scenario(name, workspace)
+
+
+def test_daemon_api_refuses_browser_requests():
+    assert daemon_api.main() == 0